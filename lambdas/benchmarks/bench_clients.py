@@ -0,0 +1,66 @@
+"""
+Warm-path latency of building boto3 clients per call versus the shared pool in clients.py.
+
+Only local work is measured (client construction, Table lookup and URL presigning),
+so no AWS credentials or network are needed:
+
+    python lambdas/benchmarks/bench_clients.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+
+import boto3  # noqa: E402
+import clients  # noqa: E402
+
+
+def per_call_s3():
+    s3 = boto3.client('s3')
+    s3.generate_presigned_url('get_object', Params={'Bucket': 'bench', 'Key': 't/d.png'}, ExpiresIn=3600)
+
+
+def pooled_s3():
+    s3 = clients.get_client('s3')
+    s3.generate_presigned_url('get_object', Params={'Bucket': 'bench', 'Key': 't/d.png'}, ExpiresIn=3600)
+
+
+def per_call_dynamodb():
+    boto3.resource('dynamodb').Table('d_diagrams_bench')
+
+
+def pooled_dynamodb():
+    clients.get_resource('dynamodb').Table('d_diagrams_bench')
+
+
+def measure(fn, iterations):
+    fn()  # primera llamada = contenedor frío
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f'{"case":<22}{"p50 ms":>10}{"p95 ms":>10}')
+    for name, fn in [
+        ('s3 per call', per_call_s3),
+        ('s3 pooled', pooled_s3),
+        ('dynamodb per call', per_call_dynamodb),
+        ('dynamodb pooled', pooled_dynamodb),
+    ]:
+        p50, p95 = measure(fn, iterations)
+        print(f'{name:<22}{p50:>10.3f}{p95:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
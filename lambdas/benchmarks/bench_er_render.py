@@ -0,0 +1,65 @@
+"""
+Latency of the local Graphviz ER renderer versus the public PlantUML server.
+
+    python lambdas/benchmarks/bench_er_render.py [--plantuml] [--sizes 10,100,1000]
+
+Graphviz is skipped when `dot` is not on PATH; PlantUML is only called with --plantuml
+because it needs internet access and is rate limited.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram-sql'))
+
+import diagram_build  # noqa: E402
+import er_parser  # noqa: E402
+import er_render  # noqa: E402
+from fixtures import make_schema  # noqa: E402
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10,100,1000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--plantuml', action='store_true')
+    args = parser.parse_args()
+
+    print(f'{"tables":>7}{"parse ms":>10}{"dot src ms":>12}{"graphviz ms":>13}{"plantuml ms":>13}{"url chars":>11}')
+    for size in [int(s) for s in args.sizes.split(',')]:
+        dsl = make_schema(size)
+        schema = er_parser.parse_schema(dsl)
+        entities, relations = schema.entities, schema.relations
+
+        parse_ms = timed(lambda: er_parser.parse_schema(dsl), args.repeat)
+        dot_ms = timed(lambda: er_render.build_dot(entities, relations), args.repeat)
+        url_chars = len(diagram_build.plantuml_encode(diagram_build.build_plantuml(entities, relations)))
+
+        graphviz = '-'
+        if er_render.graphviz_available():
+            dot_source = er_render.build_dot(entities, relations)
+            graphviz = f'{timed(lambda: er_render.render_dot(dot_source, "png"), args.repeat):.1f}'
+
+        plantuml = '-'
+        if args.plantuml:
+            try:
+                plantuml = f'{timed(lambda: diagram_build.render_plantuml(entities, relations), args.repeat):.1f}'
+            except Exception as e:
+                plantuml = type(e).__name__
+
+        print(f'{size:>7}{parse_ms:>10.1f}{dot_ms:>12.2f}{graphviz:>13}{plantuml:>13}{url_chars:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,556 @@
+"""
+Latency, allocations and memory of every lambda_handler, run offline against local stand-ins:
+moto for DynamoDB and S3, user_validate called in process for Lambda invoke, and a local
+HTTP server for the URL upload.
+
+    python lambdas/benchmarks/bench_handlers.py [--cases diagram_list,user_login] [--sizes 10,1000]
+        [--iterations 100] [--out results/$(git rev-parse --short HEAD).json] [--compare baseline.json]
+
+Each case and size runs in a fresh interpreter, so the first call is a real cold start:
+`import ms` is the handler module import (boto3 excluded, reported apart) and `first ms` the
+first invocation (clients, token cache and render caches still empty). Warm calls give
+p50/p95/p99; a shorter pass under tracemalloc gives the per-call allocation peak and the bytes
+still held after each call. Absolute numbers include the stand-ins' own cost: compare runs of
+this script with each other (--compare), not with CloudWatch.
+
+Cases that need a binary (dot, d2) or the diagrams package are skipped when it is missing.
+Requires moto (pip install moto) in addition to each function's requirements.
+"""
+import argparse
+import base64
+import contextlib
+import datetime
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import make_d2, make_form, make_payload, make_schema, make_topology  # noqa: E402
+
+LAMBDAS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+TENANT = 'bench'
+USER = 'bench-user'
+PASSWORD = 'bench-password'
+TOKEN = 'bench-token'
+BUCKET = 'bench-diagrams'
+
+BENCH_ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'S3_BUCKET_DIAGRAM': BUCKET,
+    'RENDER_CACHE_BUCKET': BUCKET,
+    'TABLE_DIAGRAM': 'd_diagrams_bench',
+    'TABLE_AUTH': 'd_auth_bench',
+    'TABLE_USER': 'd_users_bench',
+    'auth_lambda': 'user_validate_bench',
+    'ER_RENDERER': 'graphviz',
+    # Sin red: un fallo de Graphviz no debe acabar midiendo el servidor público de PlantUML
+    'PLANTUML_FALLBACK': '0',
+}
+
+TABLES = {
+    'TABLE_DIAGRAM': ('tenant_id', 'diagram_id'),
+    'TABLE_AUTH': ('token', 'tenant_id'),
+    'TABLE_USER': ('tenant_id', 'user_id'),
+}
+
+ALLOC_ITERATIONS = 20
+# Métricas comparadas con --compare: una subida mayor que --threshold es una regresión
+COMPARED = ('import_ms', 'first_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'alloc_peak_kb', 'peak_rss_mb')
+
+
+def _headers(content_type='application/json'):
+    return {'Authorization': f'Bearer {TOKEN}', 'Content-Type': content_type}
+
+
+def post(body, content_type='application/json'):
+    return {'body': json.dumps(body), 'headers': _headers(content_type)}
+
+
+def get(query):
+    return {'query': query, 'headers': _headers()}
+
+
+def form(fields, filename, data):
+    body, content_type = make_form(fields, filename, data)
+    # diagram_generate recibe el token tal cual en Authorization, sin 'Bearer '
+    return {'body': base64.b64encode(body).decode(), 'isBase64Encoded': True,
+            'headers': {'Authorization': TOKEN, 'Content-Type': content_type}}
+
+
+def put_diagram(ctx, diagram_id, data=None):
+    """
+    d_diagrams item (and its S3 object when `data` is given) owned by the bench user.
+    """
+    file_key = f'{TENANT}/{diagram_id}'
+    if data is not None:
+        ctx['s3'].put_object(Bucket=BUCKET, Key=file_key, Body=data)
+    ctx['table']('TABLE_DIAGRAM').put_item(Item={
+        'tenant_id': TENANT, 'diagram_id': diagram_id, 'user_id': USER, 'type': 'aws',
+        'object_key': file_key, 'size_bytes': len(data or b''), 'format': diagram_id.rsplit('.', 1)[-1],
+        'created_at': '2024-01-01T00:00:00'
+    })
+
+
+def has_binary(name):
+    return lambda: shutil.which(name) is not None
+
+
+def has_d2():
+    return shutil.which(os.environ.get('D2_BINARY', '/opt/bin/d2')) is not None or shutil.which('d2') is not None
+
+
+def has_diagrams():
+    try:
+        import diagrams  # noqa: F401
+    except ImportError:
+        return False
+    return shutil.which('dot') is not None
+
+
+# Preparación de cada caso (fuera de la medición)
+
+def setup_login(ctx):
+    passwords = importlib.import_module('passwords')
+    ctx['table']('TABLE_USER').put_item(Item={
+        'tenant_id': TENANT, 'user_id': USER, 'password': passwords.hash_password(PASSWORD)
+    })
+
+
+def setup_list(ctx):
+    with ctx['table']('TABLE_DIAGRAM').batch_writer() as batch:
+        for i in range(ctx['size']):
+            batch.put_item(Item={
+                'tenant_id': TENANT, 'diagram_id': f'd{i:06d}.yml', 'user_id': USER, 'type': 'aws',
+                'object_key': f'{TENANT}/d{i:06d}.yml', 'size_bytes': 1024, 'format': 'yml',
+                'created_at': '2024-01-01T00:00:00'
+            })
+
+
+def setup_url_upload(ctx):
+    payload = make_payload(ctx['size'])
+
+    class Source(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('ETag', '"bench"')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Source)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ctx['url'] = f'http://127.0.0.1:{server.server_address[1]}/source.json'
+
+
+# Evento de la llamada número i (fuera de la medición; puede dejar datos preparados)
+
+def event_logout(ctx, i):
+    token = f'logout-{i}'
+    ctx['table']('TABLE_AUTH').put_item(Item={
+        'token': token, 'tenant_id': TENANT, 'user_id': USER, 'expires_at': int(time.time()) + 3600
+    })
+    return {'body': json.dumps({'tenant_id': TENANT}), 'headers': {'Authorization': f'Bearer {token}'}}
+
+
+def event_delete(ctx, i):
+    put_diagram(ctx, f'del{i}.sql', b'create table t (id int);')
+    return post({'tenant_id': TENANT, 'diagram_id': f'del{i}.sql'})
+
+
+def event_bulk_delete(ctx, i):
+    ids = [f'bd{i}-{k}.sql' for k in range(ctx['size'])]
+    with ctx['table']('TABLE_DIAGRAM').batch_writer() as batch:
+        for diagram_id in ids:
+            batch.put_item(Item={'tenant_id': TENANT, 'diagram_id': diagram_id, 'user_id': USER,
+                                 'object_key': f'{TENANT}/{diagram_id}'})
+    for diagram_id in ids:
+        ctx['s3'].put_object(Bucket=BUCKET, Key=f'{TENANT}/{diagram_id}', Body=b'x')
+    return post({'tenant_id': TENANT, 'diagram_ids': ids})
+
+
+def event_upload_complete(ctx, i):
+    put_diagram(ctx, f'up{i}.sql')
+    ctx['s3'].put_object(Bucket=BUCKET, Key=f'{TENANT}/up{i}.sql', Body=ctx.setdefault('payload', make_payload(ctx['size'])))
+    return post({'tenant_id': TENANT, 'diagram_id': f'up{i}.sql'})
+
+
+def event_url_upload(ctx, i):
+    put_diagram(ctx, f'url{i}.json')
+    return post({'tenant_id': TENANT, 'diagram_id': f'url{i}.json', 'url': ctx['url']})
+
+
+def event_render_worker(ctx, i):
+    job_id, source_key = str(uuid.uuid4()), f'jobs/{TENANT}/{i}.d2'
+    ctx['s3'].put_object(Bucket=BUCKET, Key=source_key, Body=make_d2(ctx['size'], salt=i).encode())
+    ctx['table']('TABLE_DIAGRAM').put_item(Item={
+        'tenant_id': TENANT, 'diagram_id': f'job{i}.png', 'user_id': USER, 'job_id': job_id, 'job_status': 'queued'
+    })
+    message = {'job_id': job_id, 'tenant_id': TENANT, 'diagram_id': f'job{i}.png', 'source_key': source_key}
+    return {'Records': [{'messageId': job_id, 'body': json.dumps(message)}]}
+
+
+def d2_item(ctx, i, k=0):
+    # salt distinto por llamada: cada render es un miss de la caché, como un diagrama nuevo
+    source = make_d2(ctx['size'], salt=f'{i}-{k}')
+    return {'diagram_id': f'd2-{i}-{k}.png', 'd2_source_base64': base64.b64encode(source.encode()).decode()}
+
+
+# size: qué escala cada caso (ver 'unit'); iterations: tope para los casos caros
+CASES = [
+    {'name': 'user_register', 'dir': 'user', 'module': 'user_register', 'unit': '-', 'sizes': [1], 'iterations': 20,
+     'event': lambda ctx, i: {'body': json.dumps({'tenant_id': TENANT, 'user_id': f'u{i}', 'password': PASSWORD})}},
+    {'name': 'user_register_bulk', 'dir': 'user', 'module': 'user_register_bulk', 'unit': 'users',
+     'sizes': [10, 50], 'iterations': 3,
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'users': [
+         {'user_id': f'b{i}-{k}', 'password': PASSWORD} for k in range(ctx['size'])]})},
+    {'name': 'user_login', 'dir': 'user', 'module': 'user_login', 'unit': '-', 'sizes': [1], 'iterations': 20,
+     'setup': setup_login,
+     'event': lambda ctx, i: {'body': json.dumps({'tenant_id': TENANT, 'user_id': USER, 'password': PASSWORD})}},
+    {'name': 'user_validate', 'dir': 'user', 'module': 'user_validate', 'unit': '-', 'sizes': [1],
+     'event': lambda ctx, i: {'body': json.dumps({'token': TOKEN, 'tenant_id': TENANT})}},
+    {'name': 'user_logout', 'dir': 'user', 'module': 'user_logout', 'unit': '-', 'sizes': [1],
+     'event': event_logout},
+    {'name': 'diagram_create', 'dir': 'diagram', 'module': 'diagram_create', 'unit': '-', 'sizes': [1],
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'diagram_id': f'c{i}.yml', 'type': 'aws'})},
+    {'name': 'diagram_request', 'dir': 'diagram', 'module': 'diagram_request', 'unit': '-', 'sizes': [1],
+     'setup': lambda ctx: put_diagram(ctx, 'req.yml'),
+     'event': lambda ctx, i: get({'tenant_id': TENANT, 'diagram_id': 'req.yml'})},
+    {'name': 'diagram_list', 'dir': 'diagram', 'module': 'diagram_list', 'unit': 'items', 'sizes': [10, 200, 2000],
+     'setup': setup_list,
+     'event': lambda ctx, i: get({'tenant_id': TENANT, 'limit': '50'})},
+    {'name': 'diagram_delete', 'dir': 'diagram', 'module': 'diagram_delete', 'unit': '-', 'sizes': [1],
+     'event': event_delete},
+    {'name': 'diagram_bulk_create', 'dir': 'diagram', 'module': 'diagram_bulk_create', 'unit': 'items',
+     'sizes': [25, 100, 500], 'iterations': 20,
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'diagrams': [
+         {'diagram_id': f'bc{i}-{k}.yml', 'type': 'aws'} for k in range(ctx['size'])]})},
+    {'name': 'diagram_bulk_delete', 'dir': 'diagram', 'module': 'diagram_bulk_delete', 'unit': 'items',
+     'sizes': [25, 100, 500], 'iterations': 10,
+     'event': event_bulk_delete},
+    {'name': 'diagram_upload', 'dir': 'diagram', 'module': 'diagram_upload', 'unit': 'bytes',
+     'sizes': [1024, 1024 * 1024, 5 * 1024 * 1024], 'iterations': 20,
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'diagram_id': f'up{i}.sql', 'file_base64': ctx.setdefault(
+         'file_base64', base64.b64encode(make_payload(ctx['size'])).decode())})},
+    {'name': 'diagram_upload_presign', 'dir': 'diagram', 'module': 'diagram_upload_presign', 'unit': 'bytes',
+     'sizes': [1024 * 1024, 256 * 1024 * 1024],
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'diagram_id': f'pre{i}.sql', 'method': 'put',
+                                   'size_bytes': ctx['size']})},
+    {'name': 'diagram_upload_complete', 'dir': 'diagram', 'module': 'diagram_upload_complete', 'unit': 'bytes',
+     'sizes': [1024, 1024 * 1024], 'iterations': 50,
+     'event': event_upload_complete},
+    {'name': 'diagram_url_upload', 'dir': 'diagram', 'module': 'diagram_url_upload', 'unit': 'bytes',
+     'sizes': [64 * 1024, 8 * 1024 * 1024, 32 * 1024 * 1024], 'iterations': 10,
+     'setup': setup_url_upload,
+     'event': event_url_upload},
+    {'name': 'diagram_download', 'dir': 'diagram', 'module': 'diagram_download', 'unit': '-', 'sizes': [1],
+     'setup': lambda ctx: put_diagram(ctx, 'dl.png', make_payload(64 * 1024)),
+     'event': lambda ctx, i: get({'tenant_id': TENANT, 'diagram_id': 'dl.png'})},
+    {'name': 'diagram_generate', 'dir': 'diagram', 'module': 'diagram_generate', 'unit': 'nodes',
+     'sizes': [5, 25, 100], 'iterations': 10, 'requires': has_diagrams,
+     'event': lambda ctx, i: form({'tenant_id': TENANT, 'diagram_id': f'gen{i}.yml'}, 'topology.yml',
+                                  make_topology(ctx['size'], salt=i).encode())},
+    {'name': 'diagram_generate_d2', 'dir': 'diagram', 'module': 'diagram_generate_d2', 'unit': 'nodes',
+     'sizes': [10, 100, 1000], 'iterations': 10, 'requires': has_d2,
+     'event': lambda ctx, i: post(dict(d2_item(ctx, i), tenant_id=TENANT))},
+    {'name': 'diagram_generate_d2_batch', 'dir': 'diagram', 'module': 'diagram_generate_d2_batch', 'unit': 'nodes',
+     'sizes': [10, 100], 'iterations': 5, 'requires': has_d2,
+     'event': lambda ctx, i: post({'tenant_id': TENANT, 'items': [d2_item(ctx, i, k) for k in range(10)]})},
+    {'name': 'diagram_render_worker', 'dir': 'diagram', 'module': 'diagram_render_worker', 'unit': 'nodes',
+     'sizes': [10, 100], 'iterations': 10, 'requires': has_d2,
+     'event': event_render_worker},
+    {'name': 'diagram_build', 'dir': 'diagram-sql', 'module': 'diagram_build', 'unit': 'tables',
+     'sizes': [10, 100, 1000], 'iterations': 10, 'requires': has_binary('dot'),
+     'event': lambda ctx, i: {'body': json.dumps({'dsl': f'# {i}\n' + ctx.setdefault('dsl', make_schema(ctx['size'])),
+                                                  'renderer': 'graphviz', 'format': 'svg'})}},
+]
+
+
+class LocalLambda:
+    """
+    Stand-in for the boto3 Lambda client: invoke runs user_validate in this process.
+    """
+
+    def __init__(self):
+        self.user_validate = None
+
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse'):
+        if self.user_validate is None:
+            # lambdas/user al final del path: session_token, clients y metrics son copias idénticas
+            sys.path.append(os.path.join(LAMBDAS_DIR, 'user'))
+            self.user_validate = importlib.import_module('user_validate')
+        result = self.user_validate.lambda_handler(json.loads(Payload), None)
+        return {'StatusCode': 200, 'Payload': _Body(json.dumps(result).encode())}
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def _start_stand_ins():
+    from moto import mock_aws
+    import boto3
+
+    mock = mock_aws()
+    mock.start()
+    s3 = boto3.client('s3')
+    s3.create_bucket(Bucket=BUCKET)
+    s3.put_bucket_versioning(Bucket=BUCKET, VersioningConfiguration={'Status': 'Enabled'})
+    dynamodb = boto3.resource('dynamodb')
+    for env_name, (hash_key, range_key) in TABLES.items():
+        dynamodb.create_table(
+            TableName=os.environ[env_name],
+            KeySchema=[{'AttributeName': hash_key, 'KeyType': 'HASH'}, {'AttributeName': range_key, 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': k, 'AttributeType': 'S'} for k in (hash_key, range_key)],
+            BillingMode='PAY_PER_REQUEST'
+        )
+    dynamodb.Table(os.environ['TABLE_AUTH']).put_item(Item={
+        'token': TOKEN, 'tenant_id': TENANT, 'user_id': USER, 'expires_at': int(time.time()) + 86400
+    })
+    return {'s3': s3, 'table': lambda env_name: dynamodb.Table(os.environ[env_name])}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _status(response):
+    if isinstance(response, dict) and 'statusCode' in response:
+        return response['statusCode']
+    # El worker de SQS no devuelve statusCode: un item fallido cuenta como error
+    return 500 if isinstance(response, dict) and response.get('batchItemFailures') else 200
+
+
+def run_worker(name, size, iterations):
+    """
+    One case and size in this (fresh) interpreter. Returns the result dict.
+    """
+    case = next(c for c in CASES if c['name'] == name)
+    os.environ.update(BENCH_ENV)
+    sys.path.insert(0, os.path.join(LAMBDAS_DIR, case['dir']))
+
+    start = time.perf_counter()
+    import boto3  # noqa: F401
+    boto3_import_ms = (time.perf_counter() - start) * 1000
+
+    ctx = _start_stand_ins()
+    ctx['size'] = size
+    devnull = open(os.devnull, 'w')
+
+    with contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        module = importlib.import_module(case['module'])
+        import_ms = (time.perf_counter() - start) * 1000
+        importlib.import_module('clients').set_client('lambda', LocalLambda())
+        if case.get('setup'):
+            case['setup'](ctx)
+
+    calls = iter(range(10 ** 9))
+    errors = []
+
+    def call():
+        event = case['event'](ctx, next(calls))
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            response = module.lambda_handler(event, None)
+            elapsed = (time.perf_counter() - start) * 1000
+        status = _status(response)
+        if status >= 400 and len(errors) < 3:
+            errors.append({'status': status, 'body': str(response.get('body'))[:300]})
+        return elapsed, status
+
+    first_ms, first_status = call()
+    call()  # calentamiento
+
+    samples = []
+    for _ in range(iterations):
+        samples.append(call()[0])
+
+    # Asignaciones en una pasada aparte: tracemalloc multiplica la latencia
+    alloc_peaks, alloc_retained = [], []
+    tracemalloc.start()
+    for _ in range(min(iterations, ALLOC_ITERATIONS)):
+        event = case['event'](ctx, next(calls))
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        with contextlib.redirect_stdout(devnull):
+            module.lambda_handler(event, None)
+        current, peak = tracemalloc.get_traced_memory()
+        alloc_peaks.append(peak - before)
+        alloc_retained.append(current - before)
+    tracemalloc.stop()
+
+    return {
+        'case': name,
+        'size': size,
+        'unit': case['unit'],
+        'status': 'ok' if first_status < 400 and not errors else 'error',
+        'first_status': first_status,
+        'errors': errors,
+        'iterations': iterations,
+        'boto3_import_ms': round(boto3_import_ms, 2),
+        'import_ms': round(import_ms, 2),
+        'first_ms': round(first_ms, 2),
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(_percentile(samples, 95), 3),
+        'p99_ms': round(_percentile(samples, 99), 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'alloc_peak_kb': round(statistics.median(alloc_peaks) / 1024, 1),
+        'alloc_retained_kb': round(statistics.median(alloc_retained) / 1024, 1),
+        # ru_maxrss está en KB en Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def size_label(size, unit):
+    if unit == '-':
+        return '-'
+    if unit == 'bytes':
+        for suffix, factor in (('MB', 1024 * 1024), ('KB', 1024)):
+            if size >= factor and size % factor == 0:
+                return f'{size // factor}{suffix}'
+        return f'{size}B'
+    return f'{size} {unit}'
+
+
+def run_case(case, size, iterations):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', case['name'], str(size), str(iterations)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        return {'case': case['name'], 'size': size, 'unit': case['unit'], 'status': 'crashed',
+                'errors': [result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'no output']}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=LAMBDAS_DIR,
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=LAMBDAS_DIR,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the metrics that grew more than `threshold` against a previous results file.
+    Returns the number of regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['case'], r['size']): r for r in baseline['results'] if r.get('status') == 'ok'}
+    print(f'\ncompared with {baseline.get("revision")} ({baseline_path}), threshold +{threshold:.0%}:')
+    regressions = 0
+    for result in results:
+        old = previous.get((result['case'], result['size']))
+        if old is None or result.get('status') != 'ok':
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            if change > threshold:
+                regressions += 1
+                print(f'  REGRESSION {result["case"]}[{result["size"]}] {metric}: {before} -> {after} ({change:+.0%})')
+            elif change < -threshold:
+                print(f'  improved   {result["case"]}[{result["size"]}] {metric}: {before} -> {after} ({change:+.0%})')
+    if not regressions:
+        print('  no regressions')
+    return regressions
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == '--worker':
+        print(json.dumps(run_worker(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))))
+        return 0
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', help='comma-separated case names (default: all)')
+    parser.add_argument('--sizes', help='comma-separated sizes, replacing the defaults of sized cases')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--out', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    selected = CASES
+    if args.cases:
+        names = args.cases.split(',')
+        unknown = set(names) - {case['name'] for case in CASES}
+        if unknown:
+            parser.error(f'unknown cases: {", ".join(sorted(unknown))}')
+        selected = [case for case in CASES if case['name'] in names]
+
+    print(f'{"case":<27}{"size":>10}{"import ms":>11}{"first ms":>10}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+          f'{"alloc KB":>10}{"held KB":>9}{"RSS MB":>8}')
+    results = []
+    for case in selected:
+        if case.get('requires') and not case['requires']():
+            results.append({'case': case['name'], 'status': 'skipped'})
+            print(f'{case["name"]:<27}{"skipped (missing renderer)":>36}')
+            continue
+        sizes = case['sizes']
+        if args.sizes and case['unit'] != '-':
+            sizes = [int(s) for s in args.sizes.split(',')]
+        iterations = min(args.iterations, case.get('iterations', args.iterations))
+        for size in sizes:
+            result = run_case(case, size, iterations)
+            results.append(result)
+            label = size_label(size, case['unit'])
+            if 'p50_ms' not in result:
+                print(f'{case["name"]:<27}{label:>10}  {result["status"]}: {result["errors"]}')
+                continue
+            print(f'{case["name"]:<27}{label:>10}{result["import_ms"]:>11.1f}{result["first_ms"]:>10.1f}'
+                  f'{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                  f'{result["alloc_peak_kb"]:>10.1f}{result["alloc_retained_kb"]:>9.1f}{result["peak_rss_mb"]:>8.1f}'
+                  + ('' if result['status'] == 'ok' else f'  {result["status"]}: {result["errors"][:1]}'))
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'iterations': args.iterations,
+        'results': results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nresults written to {args.out}')
+
+    failed = sum(1 for r in results if r.get('status') in ('error', 'crashed'))
+    regressions = compare(results, args.compare, args.threshold) if args.compare else 0
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+"""
+multipart/form-data parsing: the old cgi.FieldStorage path of diagram_generate versus multipart.py.
+
+Each case starts from the API Gateway event (base64 body) and ends with the file part in hand.
+Reports wall time and peak Python heap (tracemalloc) for 1 MB to 50 MB uploads:
+
+    python lambdas/benchmarks/bench_multipart.py [sizes in MB...]
+
+cgi was removed in Python 3.13; on newer interpreters only the new parser is measured.
+"""
+import base64
+import io
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+
+import multipart  # noqa: E402
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    try:
+        import cgi
+    except ImportError:
+        cgi = None
+
+BOUNDARY = 'bench-boundary-7MA4YWxkTrZu0gW'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def make_event(size_mb):
+    payload = os.urandom(size_mb * 1024 * 1024)
+    body = b''.join([
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="tenant_id"\r\n\r\nbench\r\n'.encode(),
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="diagram_id"\r\n\r\nbench.yml\r\n'.encode(),
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="bench.yml"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode(),
+        payload,
+        f'\r\n--{BOUNDARY}--\r\n'.encode(),
+    ])
+    return {'body': base64.b64encode(body).decode(), 'isBase64Encoded': True}, len(payload)
+
+
+def parse_cgi(event):
+    body = base64.b64decode(event['body'])
+    form = cgi.FieldStorage(
+        fp=io.BytesIO(body),
+        environ={'REQUEST_METHOD': 'POST'},
+        headers={'content-type': CONTENT_TYPE, 'content-length': str(len(body))}
+    )
+    return len(form['file'].file.read())
+
+
+def parse_memoryview(event, spill_threshold=None):
+    with multipart.RequestBody(event, spill_threshold=spill_threshold) as body:
+        form = multipart.parse_form(body, CONTENT_TYPE)
+        size = len(form['file'])
+        del form
+    return size
+
+
+def measure(fn, event, expected):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(event)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert size == expected, (size, expected)
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1, 10, 25, 50]
+    cases = [
+        ('memoryview', lambda event: parse_memoryview(event, spill_threshold=sys.maxsize)),
+        ('memoryview+spill', lambda event: parse_memoryview(event, spill_threshold=0)),
+    ]
+    if cgi is not None:
+        cases.insert(0, ('cgi.FieldStorage', parse_cgi))
+
+    print(f'{"size":>6}  {"case":<18}{"ms":>10}{"peak MB":>10}')
+    for size_mb in sizes:
+        event, expected = make_event(size_mb)
+        for name, fn in cases:
+            elapsed, peak = measure(fn, event, expected)
+            print(f'{size_mb:>4}MB  {name:<18}{elapsed:>10.1f}{peak:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Scalable inputs for the benchmarks: the same shapes the API receives, from tiny to very large.
+"""
+import hashlib
+
+BOUNDARY = 'bench-boundary-7MA4YWxkTrZu0gW'
+
+
+def make_schema(tables, fields=6):
+    """
+    DSL with `tables` entities, each referencing the previous one.
+    """
+    parts = []
+    for i in range(tables):
+        lines = [f't{i}: {{', '  shape: sql_table', '  id: int {constraint: primary_key}']
+        lines += [f'  col{j}: varchar' for j in range(fields - 2)]
+        if i:
+            lines.append(f'  t{i - 1}_id: int {{constraint: foreign_key}}')
+        lines.append('}')
+        parts.append('\n'.join(lines))
+    parts += [f't{i}.t{i - 1}_id -> t{i - 1}.id' for i in range(1, tables)]
+    return '\n'.join(parts)
+
+
+def make_d2(nodes, salt=''):
+    """
+    D2 source with `nodes` shapes in groups of 10 and a chain of edges.
+    A different salt gives a different source (and render cache key) with the same layout.
+    """
+    lines = [f'# {salt}'] if salt else []
+    for group in range(0, nodes, 10):
+        lines.append(f'g{group} {{')
+        lines += [f'  n{i}: Service {i}' for i in range(group, min(group + 10, nodes))]
+        lines.append('}')
+    lines += [f'g{(i - 1) // 10 * 10}.n{i - 1} -> g{i // 10 * 10}.n{i}' for i in range(1, nodes)]
+    return '\n'.join(lines) + '\n'
+
+
+def make_topology(nodes, salt=''):
+    """
+    diagram_generate YAML with `nodes` ECS services behind one ELB.
+    """
+    lines = [
+        'diagram:',
+        f'  name: Bench {nodes} {salt}'.rstrip(),
+        '  resources:',
+        '    - id: elb',
+        '      name: ELB',
+        '      type: aws.network.ELB',
+        '      relates:',
+    ]
+    lines += [f'        - to: svc{i}\n          direction: outgoing' for i in range(nodes)]
+    for i in range(nodes):
+        lines += [f'    - id: svc{i}', f'      name: Service {i}', '      type: aws.compute.ECS']
+    return '\n'.join(lines) + '\n'
+
+
+def make_payload(size):
+    """
+    `size` deterministic, incompressible-looking bytes.
+    """
+    block = b''.join(hashlib.sha256(str(i).encode()).digest() for i in range(2048))
+    return (block * (size // len(block) + 1))[:size]
+
+
+def make_form(fields, filename, data, content_type='application/octet-stream'):
+    """
+    multipart/form-data body with the text `fields` and one file part.
+    Returns (body bytes, Content-Type header).
+    """
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'.encode()
+    )
+    parts += [data, f'\r\n--{BOUNDARY}--\r\n'.encode()]
+    return b''.join(parts), f'multipart/form-data; boundary={BOUNDARY}'
@@ -0,0 +1,106 @@
+"""
+Cold-start import report for diagram_generate, built from `python -X importtime`.
+
+Compares the eager provider imports render_pool used to do at init with the
+node_index.json path (topology.py), both ending with test.yml compiled and ready to draw:
+
+    python lambdas/benchmarks/importtime_report.py [runs]
+
+Each scenario runs in a fresh interpreter; the median of the runs is reported.
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+DIAGRAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+TEST_YML = os.path.join(DIAGRAM_DIR, 'test.yml')
+
+EAGER_PROVIDERS = [
+    'diagrams.aws.compute',
+    'diagrams.aws.database',
+    'diagrams.aws.network',
+    'diagrams.aws.storage',
+    'diagrams.aws.integration',
+    'diagrams.aws.security',
+    'diagrams.onprem.database',
+    'diagrams.onprem.network',
+    'diagrams.onprem.inmemory',
+    'diagrams.k8s.compute',
+    'diagrams.generic.compute',
+]
+
+PRELUDE = f'''
+import sys, time
+sys.path.insert(0, {DIAGRAM_DIR!r})
+start = time.perf_counter()
+'''
+
+SCENARIOS = [
+    ('eager providers', PRELUDE + f'''
+import diagrams, topology
+topology._index['types'] = {{}}
+for name in {EAGER_PROVIDERS!r}:
+    # __import__ y no importlib.import_module: -X importtime solo registra el primero
+    __import__(name)
+    topology.register_module(name[len('diagrams.'):])
+topology.compile_topology(open({TEST_YML!r}).read())
+print((time.perf_counter() - start) * 1000)
+'''),
+    ('node index', PRELUDE + f'''
+import diagrams, topology
+topology.load_index()
+topology.compile_topology(open({TEST_YML!r}).read())
+print((time.perf_counter() - start) * 1000)
+'''),
+]
+
+
+def parse_importtime(stderr):
+    """
+    Lines look like 'import time:   self [us] |   cumulative | module'.
+    Returns {module: (self_us, cumulative_us, depth)}.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+        # Un espacio tras '|' y dos más por nivel de anidamiento
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def run(snippet):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', snippet],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f'{"scenario":<18}{"wall ms":>10}{"import ms":>11}{"modules":>9}{"diagrams.*":>12}')
+    reports = {}
+    for name, snippet in SCENARIOS:
+        samples = [run(snippet) for _ in range(runs)]
+        wall = statistics.median(sample[0] for sample in samples)
+        modules = samples[-1][1]
+        import_ms = statistics.median(sum(m[0] for m in sample[1].values()) for sample in samples) / 1000
+        providers = sum(1 for module in modules if module.startswith('diagrams.'))
+        reports[name] = modules
+        print(f'{name:<18}{wall:>10.1f}{import_ms:>11.1f}{len(modules):>9}{providers:>12}')
+
+    print('\nslowest imports (cumulative ms, eager providers):')
+    eager = reports['eager providers']
+    lazy = reports['node index']
+    top = sorted(eager.items(), key=lambda item: item[1][1], reverse=True)
+    for module, (_, cumulative_us, depth) in [item for item in top if item[1][2] <= 1][:12]:
+        marker = '' if module in lazy else '  (not imported with node index)'
+        print(f'  {cumulative_us / 1000:>8.1f}  {"  " * depth}{module}{marker}')
+
+
+if __name__ == '__main__':
+    main()
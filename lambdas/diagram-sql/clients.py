@@ -0,0 +1,77 @@
+import os
+import threading
+
+# Clientes boto3 compartidos entre invocaciones de un mismo contenedor.
+# Este módulo está duplicado en lambdas/user, lambdas/diagram y lambdas/diagram-sql (mantener iguales)
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '60'))
+
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+
+def _config(**overrides):
+    from botocore.config import Config
+    config = Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries={'mode': 'standard'}
+    )
+    return config.merge(Config(**overrides)) if overrides else config
+
+
+def get_client(service, name=None, **config):
+    """
+    Return the container-wide boto3 client for service, creating it on first use.
+    A client with extra botocore `config` options (e.g. signature_version) is kept
+    under its own `name`, so it does not replace the default one.
+    """
+    key = name or service
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.client(service, config=_config(**config))
+                _clients[key] = client
+    return client
+
+
+def get_resource(service):
+    """
+    Return the container-wide boto3 resource for service, creating it on first use.
+    """
+    resource = _resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                import boto3
+                resource = boto3.resource(service, config=_config())
+                _resources[service] = resource
+    return resource
+
+
+def set_client(service, client):
+    """
+    Replace the client for service, or for a named client (e.g. with a local stand-in in tests).
+    """
+    _clients[service] = client
+
+
+def set_resource(service, resource):
+    _resources[service] = resource
+
+
+def reset():
+    """
+    Drop every cached client and resource.
+    """
+    with _lock:
+        _clients.clear()
+        _resources.clear()
@@ -1,44 +1,31 @@
 import json
-import re
+import os
 import zlib
 import base64
+import subprocess
+import time
 import requests
+import render_cache
+from er_parser import ParseError, parse_schema
+from er_render import DOT_BINARY, SUPPORTED_FORMATS, build_dot, render_dot
+import metrics
 
-PLANTUML_SERVER = 'http://www.plantuml.com/plantuml/png/'
+PLANTUML_SERVER = os.environ.get('PLANTUML_SERVER', 'http://www.plantuml.com/plantuml/')
+PLANTUML_TIMEOUT = float(os.environ.get('PLANTUML_TIMEOUT', '20'))
+
+# 'graphviz' (local) o 'plantuml' (servidor público)
+RENDERERS = ('graphviz', 'plantuml')
+ER_RENDERER = os.environ.get('ER_RENDERER', 'graphviz')
+# Si Graphviz falla, usar el servidor PlantUML
+PLANTUML_FALLBACK = os.environ.get('PLANTUML_FALLBACK', '1') == '1'
 
 # ---- DSL Parser ----
 def parse_entities(dsl: str):
-    pattern = r"(\w+):\s*\{([^}]*)\}"
-    matches = re.findall(pattern, dsl, re.MULTILINE | re.DOTALL)
-    entities = []
-    for name, body in matches:
-        lines = [l.strip() for l in body.splitlines() if l.strip()]
-        shape = None
-        fields = []
-        for line in lines:
-            if line.startswith('shape:'):
-                shape = line.split(':', 1)[1].strip()
-            else:
-                m = re.match(r"(\w+):\s*(\w+)(?:\s*\{constraint:\s*(\w+)\})?", line)
-                if m:
-                    fname, ftype, constraint = m.groups()
-                    fields.append({'name': fname, 'type': ftype, 'constraint': constraint})
-        entities.append({'name': name, 'shape': shape, 'fields': fields})
-    return entities
+    return parse_schema(dsl).entities
 
 
 def parse_relations(dsl: str):
-    rel_pattern = r"(\w+)\.(\w+)\s*->\s*(\w+)\.(\w+)"
-    matches = re.findall(rel_pattern, dsl)
-    relations = []
-    for left_ent, left_field, right_ent, right_field in matches:
-        relations.append({
-            'left_entity': left_ent,
-            'left_field': left_field,
-            'right_entity': right_ent,
-            'right_field': right_field
-        })
-    return relations
+    return parse_schema(dsl).relations
 
 # ---- PlantUML encoding ----
 def plantuml_encode(text: str) -> str:
@@ -67,36 +54,102 @@ def plantuml_encode(text: str) -> str:
         encoded += append3bytes(b1, b2, b3)
     return encoded
 
+def build_plantuml(entities, relations) -> str:
+    lines = ['@startuml']
+    for ent in entities:
+        lines.append(f"entity {ent['name']} {{")
+        for f in ent['fields']:
+            prefix = '*' if f.get('constraint') == 'primary_key' else ''
+            lines.append(f"  {prefix}{f['name']} : {f['type']}")
+        lines.append('}\n')
+    for rel in relations:
+        lines.append(f"{rel['left_entity']}::{rel['left_field']} --> {rel['right_entity']}::{rel['right_field']}")
+    lines.append('@enduml')
+    return '\n'.join(lines)
+
+
+def render_plantuml(entities, relations, fmt: str = 'png') -> bytes:
+    encoded = plantuml_encode(build_plantuml(entities, relations))
+    url = PLANTUML_SERVER + fmt + '/' + encoded
+    resp = requests.get(url, timeout=PLANTUML_TIMEOUT)
+    resp.raise_for_status()
+    return resp.content
+
+
+def render_er(entities, relations, renderer: str, fmt: str):
+    """
+    Render with the requested backend; returns (image bytes, backend used).
+    """
+    if renderer == 'plantuml':
+        return render_plantuml(entities, relations, fmt), 'plantuml'
+
+    try:
+        return render_dot(build_dot(entities, relations), fmt), 'graphviz'
+    except (OSError, subprocess.SubprocessError) as e:
+        if not PLANTUML_FALLBACK:
+            raise
+        print('Graphviz render failed, falling back to PlantUML:', str(e))
+        return render_plantuml(entities, relations, fmt), 'plantuml'
+
 # ---- Lambda handler ----
+@metrics.instrument
 def lambda_handler(event, context):
     try:
         body = json.loads(event.get('body', '{}'))
         dsl = body.get('dsl', '')
-        # Parse DSL
-        entities = parse_entities(dsl)
-        relations = parse_relations(dsl)
-        # Build PlantUML
-        lines = ['@startuml']
-        for ent in entities:
-            lines.append(f"entity {ent['name']} {{")
-            for f in ent['fields']:
-                prefix = '*' if f.get('constraint') == 'primary_key' else ''
-                lines.append(f"  {prefix}{f['name']} : {f['type']}")
-            lines.append('}\n')
-        for rel in relations:
-            lines.append(f"{rel['left_entity']}::{rel['left_field']} --> {rel['right_entity']}::{rel['right_field']}")
-        lines.append('@enduml')
-        puml = '\n'.join(lines)
-        # Encode and fetch PNG
-        encoded = plantuml_encode(puml)
-        url = PLANTUML_SERVER + encoded
-        resp = requests.get(url)
-        resp.raise_for_status()
-        png_b64 = base64.b64encode(resp.content).decode('utf-8')
+        renderer = body.get('renderer') or ER_RENDERER
+        fmt = body.get('format', 'png')
+        # Antes de la clave de caché: un renderer desconocido no debe crear entradas propias
+        if renderer not in RENDERERS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Invalid renderer. Must be one of: {", ".join(RENDERERS)}.'})
+            }
+        if fmt not in SUPPORTED_FORMATS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Invalid format. Must be one of: {", ".join(SUPPORTED_FORMATS)}.'})
+            }
+        # Render cache (memoria + S3 si hay bucket configurado)
+        version = render_cache.command_version([DOT_BINARY, '-V']) if renderer == 'graphviz' else PLANTUML_SERVER
+        cache_key = render_cache.cache_key(dsl, renderer, version, fmt)
+        cached = render_cache.lookup(cache_key, fmt)
+
+        if cached is None:
+            # Parse DSL / DDL
+            try:
+                with metrics.stage('parse'):
+                    schema = parse_schema(dsl)
+            except ParseError as e:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': str(e), 'line': e.line, 'column': e.column})
+                }
+            # Render (Graphviz local por defecto)
+            start = time.perf_counter()
+            with metrics.stage('render'):
+                image, used_renderer = render_er(schema.entities, schema.relations, renderer, fmt)
+            render_ms = (time.perf_counter() - start) * 1000
+            # Un render de respaldo no se guarda bajo la clave del renderer pedido
+            cache_s3_key = render_cache.store(cache_key, fmt, image, render_ms) if used_renderer == renderer else None
+        else:
+            image, used_renderer = render_cache.read(cached), renderer
+            cache_s3_key = cached['s3_key']
+
+        if fmt == 'svg':
+            result = {'svg': image.decode('utf-8')}
+        else:
+            result = {'pngBase64': base64.b64encode(image).decode('utf-8')}
+        result['renderer'] = used_renderer
+        result['cache'] = 'miss' if cached is None else 'hit'
+        result['render_ms_saved'] = 0 if cached is None else round(cached['render_ms'], 1)
+        if cache_s3_key:
+            # Objeto de cache/ inmutable: la misma URL sirve mientras dure la ventana
+            result['download_url'] = render_cache.download_url(render_cache.cache_bucket(), cache_s3_key)
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({'pngBase64': png_b64})
+            'body': json.dumps(result)
         }
     except Exception as e:
         return {
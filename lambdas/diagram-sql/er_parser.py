@@ -0,0 +1,497 @@
+import re
+
+# Tokenizador de una sola pasada para el DSL ER (name: { ... }) y DDL CREATE TABLE.
+_TOKEN_RE = re.compile(r'''
+    [ \t\r\f\v]*
+    (?:
+        (?P<ident>[A-Za-z_][\w$]*)
+      | (?P<nl>\n)
+      | (?P<punct>[{}():;,.])
+      | (?P<number>\d+(?:\.\d+)?)
+      | (?P<arrow>->)
+      | (?P<comment>--[^\n]*|\#[^\n]*|//[^\n]*)
+      | (?P<block>/\*.*?\*/)
+      | (?P<string>'(?:[^']|'')*')
+      | (?P<qident>"[^"\n]*"|`[^`\n]*`|\[[^\]\n]*\])
+      | (?P<op>.)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+_SKIP = {'comment', 'block'}
+# Centinelas al final para que peek() no tenga que comprobar límites
+_LOOKAHEAD = 3
+
+# Palabras que terminan el tipo de una columna en DDL
+_COLUMN_KEYWORDS = {
+    'NOT', 'NULL', 'PRIMARY', 'REFERENCES', 'DEFAULT', 'UNIQUE', 'CHECK', 'CONSTRAINT',
+    'AUTO_INCREMENT', 'AUTOINCREMENT', 'COLLATE', 'GENERATED', 'IDENTITY', 'COMMENT', 'ON'
+}
+_SQL_STATEMENTS = {'DROP', 'INSERT', 'SET', 'SELECT', 'USE', 'COMMENT', 'GRANT', 'BEGIN', 'COMMIT', 'START'}
+_TABLE_CONSTRAINTS = {'PRIMARY', 'FOREIGN', 'UNIQUE', 'CHECK', 'CONSTRAINT', 'KEY', 'INDEX', 'EXCLUDE'}
+
+
+class ParseError(ValueError):
+    def __init__(self, message, line, column):
+        super().__init__(f'{message} (line {line}, column {column})')
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+class Schema:
+    """
+    Parsed ER model with O(1) lookups by entity name and (entity, field).
+    Entities and relations keep the dict shapes used by the renderers.
+    """
+
+    def __init__(self):
+        self.entities = []
+        self.relations = []
+        self.entity_index = {}
+        self.field_index = {}
+        self.primary_keys = {}
+
+    def add_entity(self, name, shape, token):
+        if name in self.entity_index:
+            raise ParseError(f'Duplicate entity {name}', token[2], token[3])
+        entity = {'name': name, 'shape': shape, 'fields': []}
+        self.entities.append(entity)
+        self.entity_index[name] = entity
+        return entity
+
+    def add_field(self, entity, name, ftype, constraint, token):
+        key = (entity['name'], name)
+        if key in self.field_index:
+            raise ParseError(f'Duplicate field {entity["name"]}.{name}', token[2], token[3])
+        field = {'name': name, 'type': ftype, 'constraint': constraint}
+        entity['fields'].append(field)
+        self.field_index[key] = field
+        if constraint == 'primary_key':
+            self.primary_keys.setdefault(entity['name'], name)
+        return field
+
+
+def tokenize(text):
+    """
+    Split text into (kind, value, line, column) tuples in a single pass.
+    The list ends with end-of-input sentinels.
+    """
+    tokens = []
+    append = tokens.append
+    line, line_start = 1, 0
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'ident' or kind == 'punct':
+            append((kind, m.group(kind), line, m.start(kind) - line_start + 1))
+        elif kind == 'nl':
+            append((kind, '\n', line, m.start(kind) - line_start + 1))
+            line, line_start = line + 1, m.end()
+        elif kind not in _SKIP:
+            value = m.group(kind)
+            if kind == 'qident':
+                value = value[1:-1]
+            append((kind, value, line, m.start(kind) - line_start + 1))
+        elif kind == 'block':
+            value = m.group(kind)
+            if '\n' in value:
+                line += value.count('\n')
+                line_start = m.start(kind) + value.rindex('\n') + 1
+    eof = ('eof', '', line, len(text) - line_start + 1)
+    tokens.extend([eof] * _LOOKAHEAD)
+    return tokens
+
+
+class _Parser:
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.ddl = False
+        self.schema = Schema()
+        # Relaciones pendientes: (left_ent, left_field, right_ent, right_field|None, token)
+        self.pending = []
+
+    # ---- helpers ----
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        if token[0] != 'eof':
+            self.pos += 1
+        return token
+
+    def error(self, message, token=None):
+        token = token or self.peek()
+        found = repr(token[1]) if token[0] != 'eof' else 'end of input'
+        return ParseError(f'{message}, found {found}', token[2], token[3])
+
+    def expect(self, value, message=None):
+        token = self.advance()
+        if token[1] != value:
+            raise self.error(message or f'Expected {value!r}', token)
+        return token
+
+    def expect_ident(self, what='identifier'):
+        token = self.advance()
+        if token[0] not in ('ident', 'qident', 'number'):
+            raise self.error(f'Expected {what}', token)
+        return token
+
+    def skip_newlines(self):
+        while self.peek()[0] == 'nl':
+            self.pos += 1
+
+    def skip_ws(self):
+        # En DDL los saltos de línea no son significativos
+        self.skip_newlines()
+
+    def is_keyword(self, word, offset=0):
+        token = self.peek(offset)
+        return token[0] == 'ident' and token[1].upper() == word
+
+    def skip_balanced(self, stop):
+        """
+        Skip tokens until one of `stop` at nesting depth zero (not consumed).
+        """
+        depth = 0
+        while True:
+            kind, value = self.peek()[:2]
+            if kind == 'eof':
+                return
+            if depth == 0 and value in stop:
+                return
+            if value in ('(', '{'):
+                depth += 1
+            elif value in (')', '}'):
+                depth -= 1
+                if depth < 0:
+                    return
+            self.pos += 1
+
+    # ---- top level ----
+    def parse(self):
+        while True:
+            self.skip_newlines()
+            token = self.peek()
+            if token[0] == 'eof':
+                break
+            name_like = token[0] in ('ident', 'qident')
+            if token[1] == ';':
+                self.advance()
+            # Entidades y relaciones antes que las palabras clave: "comment: {" o "user: {" tras
+            # un CREATE TABLE son DSL, no sentencias SQL
+            elif name_like and self.peek(1)[1] == ':':
+                self.parse_entity()
+            elif name_like and self.peek(1)[1] == '.' and (not self.ddl or self.peek(3)[1] == '->'):
+                self.parse_relation()
+            elif self.is_keyword('CREATE'):
+                self.parse_create()
+            elif self.is_keyword('ALTER') and self.is_keyword('TABLE', 1):
+                self.parse_alter()
+            elif self.ddl or (token[0] == 'ident' and token[1].upper() in _SQL_STATEMENTS):
+                # En un volcado SQL se ignoran las sentencias que no definen tablas
+                self.skip_statement()
+            else:
+                raise self.error('Expected entity, relation or CREATE TABLE')
+        self.resolve()
+        return self.schema
+
+    def skip_statement(self, stop_at_create=False):
+        while self.peek()[0] != 'eof':
+            if stop_at_create and (self.is_keyword('CREATE') or self.is_keyword('ALTER')):
+                return
+            if self.is_entity_start():
+                # Sentencia sin ; seguida de una entidad del DSL
+                return
+            if self.advance()[1] == ';':
+                return
+
+    def is_entity_start(self):
+        return self.peek()[0] in ('ident', 'qident') and self.peek(1)[1] == ':' and self.peek(2)[1] == '{'
+
+    # ---- DSL ----
+    def parse_entity(self):
+        name_token = self.advance()
+        self.expect(':')
+        self.expect('{', f'Expected {{ after entity {name_token[1]}')
+        entity = self.schema.add_entity(name_token[1], None, name_token)
+
+        while True:
+            self.skip_newlines()
+            token = self.peek()
+            if token[1] == '}':
+                self.advance()
+                return
+            if token[0] == 'eof':
+                raise self.error(f'Unclosed entity {name_token[1]}')
+            if token[0] not in ('ident', 'qident'):
+                raise self.error(f'Expected field in entity {name_token[1]}')
+            self.parse_entity_line(entity)
+
+    def parse_entity_line(self, entity):
+        key = self.advance()
+        if self.peek()[1] == '.':
+            # Atributos tipo style.fill: ... no son columnas
+            self.skip_line()
+            return
+        self.expect(':', f'Expected : after {key[1]}')
+
+        value = self.peek()
+        if value[1] == '{' or value[0] in ('string', 'qident'):
+            self.skip_line()
+            return
+        if key[1] == 'shape':
+            entity['shape'] = self.expect_ident('shape')[1]
+            self.skip_line()
+            return
+
+        ftype = self.expect_ident(f'type for field {key[1]}')[1]
+        if self.peek()[1] == '(':
+            ftype += self.consume_parens()
+
+        constraint = None
+        if self.peek()[1] == '{':
+            constraint = self.parse_constraint_block()
+        self.schema.add_field(entity, key[1], ftype, constraint, key)
+        self.end_line()
+
+    def parse_constraint_block(self):
+        self.expect('{')
+        constraint = None
+        while self.peek()[1] != '}':
+            token = self.advance()
+            if token[0] == 'eof':
+                raise self.error('Unclosed constraint block', token)
+            if token[0] == 'ident' and token[1] != 'constraint' and constraint is None:
+                constraint = token[1]
+        self.advance()
+        return constraint
+
+    def parse_relation(self):
+        start = self.peek()
+        left_entity = self.advance()[1]
+        self.expect('.')
+        left_field = self.expect_ident('field')[1]
+        self.expect('->', 'Expected -> in relation')
+        right_entity = self.expect_ident('entity')[1]
+        self.expect('.', 'Expected . in relation target')
+        right_field = self.expect_ident('field')[1]
+        self.pending.append((left_entity, left_field, right_entity, right_field, start))
+        self.skip_line()
+
+    def consume_parens(self):
+        """
+        Consume a balanced ( ... ) group and return its text without spaces.
+        """
+        start = self.pos
+        self.expect('(')
+        self.skip_balanced((')',))
+        self.expect(')', 'Unclosed (')
+        return ''.join(t[1] for t in self.tokens[start:self.pos] if t[0] != 'nl')
+
+    def skip_line(self):
+        self.skip_balanced(('\n', '}'))
+
+    def end_line(self):
+        token = self.peek()
+        if token[0] not in ('nl', 'eof') and token[1] != '}':
+            raise self.error('Expected end of line')
+
+    # ---- DDL ----
+    def parse_create(self):
+        self.ddl = True
+        self.advance()
+        while self.peek()[0] == 'ident' and self.peek()[1].upper() in ('TEMP', 'TEMPORARY', 'UNLOGGED', 'OR', 'REPLACE'):
+            self.advance()
+        if not self.is_keyword('TABLE'):
+            self.skip_statement()
+            return
+        self.advance()
+        if self.is_keyword('IF'):
+            self.advance()
+            self.expect_keyword('NOT')
+            self.expect_keyword('EXISTS')
+
+        name_token = self.peek()
+        name = self.parse_qualified_name()
+        entity = self.schema.add_entity(name, 'sql_table', name_token)
+
+        self.skip_ws()
+        self.expect('(', f'Expected ( after CREATE TABLE {name}')
+        while True:
+            self.skip_ws()
+            if self.peek()[0] == 'ident' and self.peek()[1].upper() in _TABLE_CONSTRAINTS:
+                self.parse_table_constraint(entity)
+            else:
+                self.parse_column(entity)
+            self.skip_ws()
+            token = self.advance()
+            if token[1] == ')':
+                break
+            if token[1] != ',':
+                raise self.error('Expected , or ) in column list', token)
+        # Opciones de tabla (ENGINE=..., etc.)
+        self.skip_statement(stop_at_create=True)
+
+    def expect_keyword(self, word):
+        self.skip_ws()
+        token = self.advance()
+        if token[0] != 'ident' or token[1].upper() != word:
+            raise self.error(f'Expected {word}', token)
+        return token
+
+    def parse_qualified_name(self):
+        self.skip_ws()
+        name = self.expect_ident('table name')[1]
+        while self.peek()[1] == '.':
+            self.advance()
+            name = self.expect_ident('table name')[1]
+        return name
+
+    def parse_name_list(self):
+        self.skip_ws()
+        self.expect('(')
+        names = []
+        while True:
+            self.skip_ws()
+            names.append(self.expect_ident('column name')[1])
+            self.skip_ws()
+            token = self.advance()
+            if token[1] == ')':
+                return names
+            if token[1] != ',':
+                raise self.error('Expected , or ) in column list', token)
+
+    def parse_references(self, entity_name, columns, token):
+        self.expect_keyword('REFERENCES')
+        target = self.parse_qualified_name()
+        self.skip_ws()
+        targets = self.parse_name_list() if self.peek()[1] == '(' else [None] * len(columns)
+        if len(targets) != len(columns):
+            raise ParseError('Foreign key column count mismatch', token[2], token[3])
+        for column, target_column in zip(columns, targets):
+            self.pending.append((entity_name, column, target, target_column, token))
+
+    def parse_column(self, entity):
+        name_token = self.peek()
+        name = self.expect_ident('column name')[1]
+
+        type_tokens = []
+        while True:
+            self.skip_ws()
+            kind, value = self.peek()[:2]
+            if kind == 'eof' or value in (',', ')') or (kind == 'ident' and value.upper() in _COLUMN_KEYWORDS):
+                break
+            if value == '(':
+                type_tokens.append(self.consume_parens())
+            else:
+                type_tokens.append(self.advance()[1])
+        if not type_tokens:
+            raise self.error(f'Expected type for column {name}')
+        ftype = type_tokens[0]
+        for part in type_tokens[1:]:
+            ftype += part if part.startswith('(') else ' ' + part
+
+        constraint = None
+        references = False
+        while True:
+            self.skip_ws()
+            kind, value = self.peek()[:2]
+            if kind == 'eof' or value in (',', ')'):
+                break
+            upper = value.upper() if kind == 'ident' else value
+            if upper == 'PRIMARY':
+                self.advance()
+                self.expect_keyword('KEY')
+                constraint = 'primary_key'
+            elif upper == 'UNIQUE' and constraint is None:
+                self.advance()
+                constraint = 'unique'
+            elif upper == 'REFERENCES':
+                self.parse_references(entity['name'], [name], name_token)
+                references = True
+            elif value == '(':
+                self.consume_parens()
+            else:
+                self.advance()
+
+        if references and constraint is None:
+            constraint = 'foreign_key'
+        self.schema.add_field(entity, name, ftype, constraint, name_token)
+
+    def parse_table_constraint(self, entity):
+        token = self.peek()
+        if self.is_keyword('CONSTRAINT'):
+            self.advance()
+            self.skip_ws()
+            self.expect_ident('constraint name')
+            self.skip_ws()
+        if self.is_keyword('PRIMARY'):
+            self.advance()
+            self.expect_keyword('KEY')
+            for column in self.parse_name_list():
+                field = self.schema.field_index.get((entity['name'], column))
+                if field is None:
+                    raise ParseError(f'Unknown column {entity["name"]}.{column} in PRIMARY KEY', token[2], token[3])
+                field['constraint'] = 'primary_key'
+                self.schema.primary_keys.setdefault(entity['name'], column)
+        elif self.is_keyword('FOREIGN'):
+            self.advance()
+            self.expect_keyword('KEY')
+            columns = self.parse_name_list()
+            for column in columns:
+                field = self.schema.field_index.get((entity['name'], column))
+                if field is None:
+                    raise ParseError(f'Unknown column {entity["name"]}.{column} in FOREIGN KEY', token[2], token[3])
+                if field['constraint'] is None:
+                    field['constraint'] = 'foreign_key'
+            self.parse_references(entity['name'], columns, token)
+        # El resto de la restricción (ON DELETE ..., CHECK (...), etc.) no afecta al diagrama
+        self.skip_balanced((',', ')', ';'))
+
+    def parse_alter(self):
+        self.ddl = True
+        self.advance()
+        self.advance()
+        if self.is_keyword('ONLY'):
+            self.advance()
+        name = self.parse_qualified_name()
+        self.skip_ws()
+        entity = self.schema.entity_index.get(name)
+        if entity is None or not self.is_keyword('ADD'):
+            self.skip_statement()
+            return
+        self.advance()
+        self.skip_ws()
+        if self.is_keyword('CONSTRAINT') or self.is_keyword('FOREIGN') or self.is_keyword('PRIMARY'):
+            self.parse_table_constraint(entity)
+        self.skip_statement()
+
+    # ---- resolución de relaciones ----
+    def resolve(self):
+        schema = self.schema
+        for left_entity, left_field, right_entity, right_field, token in self.pending:
+            for entity_name, field_name in ((left_entity, left_field), (right_entity, right_field)):
+                if entity_name not in schema.entity_index:
+                    raise ParseError(f'Relation references unknown entity {entity_name}', token[2], token[3])
+                if field_name is not None and (entity_name, field_name) not in schema.field_index:
+                    raise ParseError(f'Relation references unknown field {entity_name}.{field_name}', token[2], token[3])
+            if right_field is None:
+                right_field = schema.primary_keys.get(right_entity)
+                if right_field is None:
+                    raise ParseError(f'Table {right_entity} has no primary key to reference', token[2], token[3])
+            schema.relations.append({
+                'left_entity': left_entity,
+                'left_field': left_field,
+                'right_entity': right_entity,
+                'right_field': right_field
+            })
+
+
+def parse_schema(text):
+    """
+    Parse the ER DSL and/or CREATE TABLE DDL into a Schema.
+    Raises ParseError with line and column on invalid input or dangling relations.
+    """
+    return _Parser(text).parse()
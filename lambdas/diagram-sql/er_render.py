@@ -0,0 +1,70 @@
+import html
+import os
+import shutil
+import subprocess
+
+# Renderizado local con Graphviz (instalado en el Dockerfile)
+DOT_BINARY = os.environ.get('DOT_BINARY', 'dot')
+DOT_TIMEOUT = float(os.environ.get('DOT_TIMEOUT', '25'))
+SUPPORTED_FORMATS = ('png', 'svg')
+
+
+def graphviz_available() -> bool:
+    return shutil.which(DOT_BINARY) is not None
+
+
+def _entity_label(ent) -> str:
+    rows = [f'<tr><td bgcolor="#dbe8f5" colspan="2"><b>{html.escape(ent["name"])}</b></td></tr>']
+    for i, f in enumerate(ent['fields']):
+        name = html.escape(f['name'])
+        if f.get('constraint') == 'primary_key':
+            name = f'<u>{name}</u>'
+        # Puerto por posición: el nombre (identificador entre comillas) puede contener cualquier carácter
+        rows.append(
+            f'<tr><td port="f{i}" align="left">{name}</td>'
+            f'<td align="left">{html.escape(f["type"] or "")}</td></tr>'
+        )
+    return '<<table border="0" cellborder="1" cellspacing="0" cellpadding="4">' + ''.join(rows) + '</table>>'
+
+
+def build_dot(entities, relations) -> str:
+    """
+    Translate parsed entities/relations straight into Graphviz dot.
+    Nodes and ports are named by position (e0:f1); the names only appear escaped in the labels.
+    """
+    lines = [
+        'digraph er {',
+        '  graph [rankdir=LR, splines=true, nodesep=0.4, ranksep=0.8];',
+        '  node [shape=plaintext, fontname="Helvetica", fontsize=10];',
+        '  edge [arrowhead=crow, arrowtail=none, fontname="Helvetica"];',
+    ]
+    ports = {}
+    for i, ent in enumerate(entities):
+        lines.append(f'  e{i} [label={_entity_label(ent)}];')
+        for j, f in enumerate(ent['fields']):
+            ports.setdefault((ent['name'], f['name']), f'e{i}:f{j}')
+    for rel in relations:
+        left = ports.get((rel['left_entity'], rel['left_field']))
+        right = ports.get((rel['right_entity'], rel['right_field']))
+        if left and right:
+            lines.append(f'  {left} -> {right};')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def render_dot(dot_source: str, fmt: str = 'png') -> bytes:
+    """
+    Run dot in-container and return the rendered image bytes.
+    """
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+    result = subprocess.run(
+        [DOT_BINARY, f'-T{fmt}'],
+        input=dot_source.encode('utf-8'),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=DOT_TIMEOUT,
+        check=True
+    )
+    return result.stdout
@@ -0,0 +1,187 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Un registro por petición en CloudWatch Embedded Metric Format (EMF): las métricas se extraen
+# del log sin llamadas a PutMetricData.
+# Este módulo está duplicado en lambdas/user, lambdas/diagram y lambdas/diagram-sql (mantener iguales)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'HackDiagrams')
+# Fracción de peticiones cuyo evento completo se escribe en el log
+EVENT_LOG_SAMPLE_RATE = float(os.environ.get('EVENT_LOG_SAMPLE_RATE', '0.01'))
+REDACTED_FIELDS = ('authorization', 'password', 'token', 'file_base64', 'd2_source_base64')
+
+_local = threading.local()
+_state = {'cold': True}
+
+
+class Request:
+    def __init__(self, function):
+        self.function = function
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.sizes = {}
+        self.properties = {}
+        self.cold_start = False
+
+    def add_stage(self, name, ms):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def record(self, status_code, error=None):
+        """
+        The EMF record of this request (dict ready for json.dumps).
+        """
+        if error is not None:
+            outcome = 'exception'
+        elif status_code is None or status_code < 400:
+            outcome = 'ok'
+        else:
+            outcome = 'client_error' if status_code < 500 else 'server_error'
+
+        values = {'duration_ms': round((time.perf_counter() - self.start) * 1000, 2)}
+        units = {'duration_ms': 'Milliseconds'}
+        for name, ms in self.stages.items():
+            values[f'{name}_ms'] = round(ms, 2)
+            units[f'{name}_ms'] = 'Milliseconds'
+        for name, size in self.sizes.items():
+            values[f'{name}_bytes'] = size
+            units[f'{name}_bytes'] = 'Bytes'
+        values['cold_start'] = 1 if self.cold_start else 0
+        units['cold_start'] = 'Count'
+
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['function'], ['function', 'outcome']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, unit in units.items()]
+                }]
+            },
+            'function': self.function,
+            'outcome': outcome,
+            'status_code': status_code
+        }
+        record.update(values)
+        record.update(self.properties)
+        if error is not None:
+            record['error'] = f'{type(error).__name__}: {error}'
+        return record
+
+
+def current():
+    return getattr(_local, 'request', None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as stage `name` of the current request (no-op outside an instrumented handler).
+    """
+    request = current()
+    if request is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request.add_stage(name, (time.perf_counter() - start) * 1000)
+
+
+def size(name, nbytes):
+    request = current()
+    if request is not None and nbytes is not None:
+        request.sizes[name] = request.sizes.get(name, 0) + int(nbytes)
+
+
+def set_property(name, value):
+    request = current()
+    if request is not None:
+        request.properties[name] = value
+
+
+def _body_size(body):
+    if isinstance(body, (str, bytes, bytearray)):
+        return len(body)
+    return None
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: '***' if str(k).lower() in REDACTED_FIELDS else _redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def log_event(event, label='Event'):
+    """
+    Write the (redacted) event for a sample of the requests only.
+    A body that cannot be redacted (too large, not a JSON object or array, binary)
+    is replaced by its length and content type.
+    """
+    if random.random() >= EVENT_LOG_SAMPLE_RATE:
+        return
+    body = event.get('body') if isinstance(event, dict) else None
+    if body is not None and not isinstance(body, (dict, list)):
+        parsed = None
+        if isinstance(body, str) and len(body) < 64 * 1024 and not event.get('isBase64Encoded'):
+            try:
+                parsed = json.loads(body)
+            except ValueError:
+                pass
+        if not isinstance(parsed, (dict, list)):
+            headers = event.get('headers') or {}
+            content_type = next((v for k, v in headers.items() if str(k).lower() == 'content-type'), None)
+            parsed = {'length': len(body) if isinstance(body, (str, bytes)) else None, 'content_type': content_type}
+        event = dict(event, body=parsed)
+    print(f'{label} (sampled):', json.dumps(_redact(event), default=str)[:16384])
+
+
+def instrument(handler):
+    """
+    Decorator for lambda_handler: one EMF record per invocation with total and stage
+    timings, request/response sizes, cold/warm and outcome.
+    """
+    function = handler.__module__
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if not METRICS_ENABLED:
+            return handler(event, context)
+        if current() is not None:
+            # Handler llamado desde otro handler: cuenta como una etapa del primero
+            with stage(function):
+                return handler(event, context)
+
+        request = Request(function)
+        request.cold_start = _state['cold']
+        _state['cold'] = False
+        if context is not None and getattr(context, 'aws_request_id', None):
+            request.properties['request_id'] = context.aws_request_id
+        if isinstance(event, dict) and _body_size(event.get('body')) is not None:
+            request.sizes['request'] = _body_size(event.get('body'))
+
+        _local.request = request
+        response, error = None, None
+        try:
+            response = handler(event, context)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _local.request = None
+            status_code = response.get('statusCode') if isinstance(response, dict) else None
+            if isinstance(response, dict) and _body_size(response.get('body')) is not None:
+                request.sizes['response'] = _body_size(response.get('body'))
+            try:
+                print(json.dumps(request.record(status_code, error), default=str))
+            except Exception as e:
+                print('Could not emit metrics:', str(e))
+    return wrapper
@@ -0,0 +1,47 @@
+"""
+Generate node_index.json: type string ('aws.compute.ECS') -> [class name, icon path].
+
+topology.py reads the index to validate types and draw nodes without importing
+the provider modules. Rebuild it whenever the diagrams version in requirements.txt changes:
+
+    python lambdas/diagram/build_node_index.py
+"""
+import importlib
+import json
+import os
+import pkgutil
+import sys
+
+import diagrams
+
+OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'node_index.json')
+
+
+def build():
+    types = {}
+    for info in pkgutil.walk_packages(diagrams.__path__, 'diagrams.'):
+        module = importlib.import_module(info.name)
+        prefix = info.name[len('diagrams.'):]
+        for attr, value in vars(module).items():
+            if attr.startswith('_') or not isinstance(value, type) or not issubclass(value, diagrams.Node):
+                continue
+            if not value._icon_dir or not value._icon:
+                continue
+            # Ruta relativa al directorio que contiene el paquete diagrams (site-packages)
+            icon = os.path.join(value._icon_dir, value._icon).replace(os.sep, '/')
+            types[f'{prefix}.{attr}'] = [value.__name__, icon]
+    return types
+
+
+def main():
+    from importlib.metadata import version
+    types = build()
+    # Una entrada por línea para que los cambios de versión se lean bien en un diff
+    entries = ',\n'.join(f'  {json.dumps(name)}: {json.dumps(types[name])}' for name in sorted(types))
+    with open(OUTPUT, 'w') as f:
+        f.write(f'{{"diagrams_version": {json.dumps(version("diagrams"))},\n "types": {{\n{entries}\n}}}}\n')
+    print(f'{len(types)} node types -> {OUTPUT}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
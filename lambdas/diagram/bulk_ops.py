@@ -0,0 +1,147 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import get_client
+
+# Operaciones masivas sobre d_diagrams y el bucket versionado (diagram_bulk_create / diagram_bulk_delete)
+BATCH_WRITE_SIZE = 25      # máximo de batch_write_item
+BATCH_GET_SIZE = 100       # máximo de batch_get_item
+S3_DELETE_BATCH = 1000     # máximo de delete_objects
+BULK_MAX_RETRIES = int(os.environ.get('BULK_MAX_RETRIES', '8'))
+BULK_BACKOFF_BASE = float(os.environ.get('BULK_BACKOFF_BASE', '0.05'))
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', '8'))
+# Por encima de tantas claves sale más barato listar el prefijo del tenant una vez
+S3_PREFIX_SCAN_THRESHOLD = int(os.environ.get('S3_PREFIX_SCAN_THRESHOLD', '50'))
+
+
+def _chunks(seq, size):
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def _backoff(attempt):
+    # Exponencial con jitter completo
+    time.sleep(random.uniform(0, BULK_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _serializer():
+    from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+    return TypeSerializer(), TypeDeserializer()
+
+
+def _write_chunk(table_name, chunk):
+    """
+    One batch_write_item call plus retries of UnprocessedItems.
+    Returns [(request, reason)] for the requests that were not written.
+    """
+    dynamodb = get_client('dynamodb')
+    pending = {table_name: chunk}
+    try:
+        for attempt in range(BULK_MAX_RETRIES + 1):
+            response = dynamodb.batch_write_item(RequestItems=pending)
+            pending = response.get('UnprocessedItems') or {}
+            if not pending:
+                return []
+            _backoff(attempt)
+    except Exception as e:
+        return [(request, str(e)) for request in pending.get(table_name, chunk)]
+    return [(request, 'unprocessed after retries') for request in pending.get(table_name, [])]
+
+
+def batch_write(table_name, puts=(), deletes=()):
+    """
+    Put items / delete keys (plain Python values) in 25-request batch_write_item calls,
+    several chunks in parallel. Returns [(item or key, reason)] for what could not be written.
+    """
+    serializer, deserializer = _serializer()
+    requests = [{'PutRequest': {'Item': {k: serializer.serialize(v) for k, v in item.items()}}} for item in puts]
+    requests += [{'DeleteRequest': {'Key': {k: serializer.serialize(v) for k, v in key.items()}}} for key in deletes]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as pool:
+        for chunk_failed in pool.map(lambda chunk: _write_chunk(table_name, chunk), _chunks(requests, BATCH_WRITE_SIZE)):
+            for request, reason in chunk_failed:
+                body = request.get('PutRequest', {}).get('Item') or request['DeleteRequest']['Key']
+                failed.append(({k: deserializer.deserialize(v) for k, v in body.items()}, reason))
+    return failed
+
+
+def batch_get(table_name, keys, projection):
+    """
+    batch_get_item in chunks of 100 (retrying UnprocessedKeys). Returns the found items.
+    """
+    dynamodb = get_client('dynamodb')
+    serializer, deserializer = _serializer()
+    names = {f'#p{i}': name for i, name in enumerate(projection)}
+    items = []
+    for chunk in _chunks(keys, BATCH_GET_SIZE):
+        pending = {table_name: {
+            'Keys': [{k: serializer.serialize(v) for k, v in key.items()} for key in chunk],
+            'ProjectionExpression': ', '.join(names),
+            'ExpressionAttributeNames': names
+        }}
+        for attempt in range(BULK_MAX_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            for item in response.get('Responses', {}).get(table_name, []):
+                items.append({k: deserializer.deserialize(v) for k, v in item.items()})
+            pending = response.get('UnprocessedKeys') or {}
+            if not pending:
+                break
+            _backoff(attempt)
+    return items
+
+
+def list_versions(bucket, prefix, keys=None):
+    """
+    Every version and delete marker under prefix (only those of `keys` if given).
+    """
+    paginator = get_client('s3').get_paginator('list_object_versions')
+    objects = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for version in page.get('Versions', []) + page.get('DeleteMarkers', []):
+            if keys is None or version['Key'] in keys:
+                objects.append({'Key': version['Key'], 'VersionId': version['VersionId']})
+    return objects
+
+
+def _delete_batch(bucket, batch):
+    try:
+        response = get_client('s3').delete_objects(Bucket=bucket, Delete={'Objects': batch, 'Quiet': True})
+    except Exception as e:
+        return [(obj['Key'], str(e)) for obj in batch]
+    return [(error['Key'], error.get('Message', error.get('Code'))) for error in response.get('Errors', [])]
+
+
+def delete_versions(bucket, objects):
+    """
+    Delete object versions in 1000-key delete_objects calls, in parallel.
+    Returns ({key: versions deleted}, {key: error}).
+    """
+    errors = {}
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as pool:
+        for batch_errors in pool.map(lambda batch: _delete_batch(bucket, batch), _chunks(objects, S3_DELETE_BATCH)):
+            errors.update(batch_errors)
+    deleted = {}
+    for obj in objects:
+        if obj['Key'] not in errors:
+            deleted[obj['Key']] = deleted.get(obj['Key'], 0) + 1
+    return deleted, errors
+
+
+def delete_keys(bucket, tenant_id, keys):
+    """
+    Delete all versions of the given S3 keys of a tenant.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}, {}
+    if len(keys) > S3_PREFIX_SCAN_THRESHOLD:
+        objects = list_versions(bucket, f'{tenant_id}/', keys)
+    else:
+        objects = []
+        with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as pool:
+            # Prefix = clave exacta; se filtra para no tocar "a.sql2" al borrar "a.sql"
+            for found in pool.map(lambda key: list_versions(bucket, key, {key}), sorted(keys)):
+                objects.extend(found)
+    return delete_versions(bucket, objects)
@@ -0,0 +1,146 @@
+import os
+import subprocess
+import tempfile
+import time
+
+import metrics
+import render_cache
+from utils import record_object
+
+D2_BINARY = os.environ.get('D2_BINARY', '/opt/bin/d2')
+D2_TIMEOUT = float(os.environ.get('D2_TIMEOUT', '25'))
+# Fuente por stdin y PNG por stdout, sin tocar /tmp
+D2_PIPE_MODE = os.environ.get('D2_PIPE_MODE', '1') == '1'
+SCRATCH_DIR = os.environ.get('SCRATCH_DIR', '/tmp')
+
+_pipe_state = {'supported': D2_PIPE_MODE}
+
+
+class RenderError(Exception):
+    pass
+
+
+def diagram_id_error(diagram_id):
+    """
+    Why diagram_id cannot name the published file ({tenant_id}/{diagram_id}), or None if it can.
+    """
+    if not isinstance(diagram_id, str) or not diagram_id.strip():
+        return 'diagram_id must be a non-empty string.'
+    if '/' in diagram_id or diagram_id in ('.', '..'):
+        return 'diagram_id must be a file name, without /.'
+    return None
+
+
+def d2_version():
+    return render_cache.command_version([D2_BINARY, '--version'])
+
+
+def _run_d2(args, stdin=None):
+    try:
+        return subprocess.run(
+            [D2_BINARY] + args,
+            input=stdin,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=D2_TIMEOUT
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise RenderError(e.stderr.decode())
+    except subprocess.TimeoutExpired:
+        raise RenderError(f'd2 timed out after {D2_TIMEOUT:.0f}s')
+
+
+def _render_pipe(d2_content):
+    return _run_d2(['--stdout-format', 'png', '-', '-'], stdin=d2_content)
+
+
+def _render_scratch(d2_content):
+    # Directorio temporal por llamada, se borra siempre al salir
+    with tempfile.TemporaryDirectory(prefix='d2-', dir=SCRATCH_DIR) as scratch:
+        source_file = os.path.join(scratch, 'diagram.d2')
+        output_file = os.path.join(scratch, 'diagram.png')
+        with open(source_file, 'wb') as f:
+            f.write(d2_content)
+        _run_d2([source_file, output_file])
+        with open(output_file, 'rb') as f:
+            image = f.read()
+    return image, len(d2_content) + len(image)
+
+
+def render_d2(d2_content):
+    """
+    Run the d2 binary on the source.
+    Returns (PNG bytes, bytes written to local disk).
+    """
+    if _pipe_state['supported']:
+        try:
+            return _render_pipe(d2_content), 0
+        except RenderError as e:
+            # Binarios d2 antiguos no soportan --stdout-format: usar ficheros desde ahora
+            if 'stdout-format' not in str(e) and 'unknown flag' not in str(e):
+                raise
+            print('d2 pipe mode not supported, using scratch files:', str(e))
+            _pipe_state['supported'] = False
+    return _render_scratch(d2_content)
+
+
+def render_cached(d2_content):
+    """
+    Render d2_content unless an identical render is cached.
+    Returns the cache location of the PNG plus timing/cache info.
+    """
+    cache_key = render_cache.cache_key(d2_content, 'd2', d2_version(), 'png')
+    cached = render_cache.lookup(cache_key, 'png')
+    if cached is not None:
+        return {
+            'cache_s3_key': cached['s3_key'],
+            'image': cached['data'],
+            'render_ms': 0,
+            'disk_bytes_written': 0,
+            'cache': 'hit',
+            'render_ms_saved': round(cached['render_ms'], 1),
+            'size_bytes': cached['size']
+        }
+
+    start = time.perf_counter()
+    with metrics.stage('render'):
+        image, disk_bytes_written = render_d2(d2_content)
+    render_ms = (time.perf_counter() - start) * 1000
+    return {
+        'cache_s3_key': render_cache.store(cache_key, 'png', image, render_ms, keep_data=False),
+        'image': image,
+        'render_ms': round(render_ms, 1),
+        'disk_bytes_written': disk_bytes_written,
+        'cache': 'miss',
+        'render_ms_saved': 0,
+        'size_bytes': len(image)
+    }
+
+
+def publish(bucket, tenant_id, diagram_id, rendered):
+    """
+    Store a render_cached() result at {tenant_id}/{diagram_id}.
+    Returns (key, VersionId of the published object).
+    """
+    file_key = f"{tenant_id}/{diagram_id}"
+    version_id = render_cache.publish(bucket, file_key, rendered['cache_s3_key'], rendered['image'])
+    if rendered['size_bytes'] is not None:
+        record_object(tenant_id, diagram_id, file_key, rendered['size_bytes'], 'png')
+    return file_key, version_id
+
+
+def render_and_publish(bucket, tenant_id, diagram_id, d2_content):
+    """
+    Render (or reuse a cached render of) d2_content and store it at {tenant_id}/{diagram_id}.
+    """
+    rendered = render_cached(d2_content)
+    file_key, version_id = publish(bucket, tenant_id, diagram_id, rendered)
+    return {
+        'file_key': file_key,
+        'version_id': version_id,
+        'render_ms': rendered['render_ms'],
+        'disk_bytes_written': rendered['disk_bytes_written'],
+        'cache': rendered['cache'],
+        'render_ms_saved': rendered['render_ms_saved']
+    }
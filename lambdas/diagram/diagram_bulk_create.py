@@ -0,0 +1,98 @@
+import os
+import json
+from bulk_ops import batch_write
+from utils import get_auth_context, load_body
+import metrics
+
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '500'))
+DIAGRAM_TYPES = ['aws', 'sql', 'json']
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Lambda function to create many diagrams in one call (batch_write_item, 25 per batch).
+    """
+    table_diagram_name = os.environ['TABLE_DIAGRAM']
+
+    # Parse body
+    body = load_body(event)
+
+    tenant_id = body.get('tenant_id')
+    diagrams = body.get('diagrams')
+
+    if not tenant_id or not isinstance(diagrams, list) or not diagrams:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing required parameters: tenant_id, diagrams.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    if len(diagrams) > BULK_MAX_ITEMS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Too many diagrams. Maximum is {BULK_MAX_ITEMS}.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # Parse token from Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    token = auth_header.split(' ')[1]
+
+    try:
+        auth = get_auth_context(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # El usuario viene de la misma validación del token (sin segunda lectura de d_auth)
+    user_id = auth['user_id']
+
+    # Validar cada elemento; los inválidos se informan y no se escriben
+    results = []
+    positions = {}
+    items = []
+    for entry in diagrams:
+        entry = entry if isinstance(entry, dict) else {}
+        diagram_id = entry.get('diagram_id')
+        diagram_type = entry.get('type')
+        if not diagram_id or not isinstance(diagram_id, str):
+            results.append({'diagram_id': diagram_id, 'status': 'error', 'error': 'Missing diagram_id.'})
+        elif diagram_id in positions:
+            # batch_write_item rechaza el lote entero si una clave se repite
+            results.append({'diagram_id': diagram_id, 'status': 'error', 'error': 'Duplicate diagram_id in request.'})
+        elif diagram_type not in DIAGRAM_TYPES:
+            results.append({'diagram_id': diagram_id, 'status': 'error', 'error': 'Invalid type. Must be one of: aws, sql, json.'})
+        else:
+            positions[diagram_id] = len(results)
+            results.append({'diagram_id': diagram_id, 'status': 'created'})
+            items.append({
+                'tenant_id': tenant_id,
+                'diagram_id': diagram_id,
+                'user_id': user_id,
+                'type': diagram_type,
+            })
+
+    for item, reason in batch_write(table_diagram_name, puts=items):
+        results[positions[item['diagram_id']]] = {'diagram_id': item['diagram_id'], 'status': 'error', 'error': reason}
+
+    created = sum(1 for r in results if r['status'] == 'created')
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'{created} of {len(diagrams)} diagrams created.',
+            'created': created,
+            'failed': len(diagrams) - created,
+            'results': results,
+            'user_id': user_id
+        }),
+        'headers': {'Content-Type': 'application/json'}
+    }
@@ -0,0 +1,185 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from bulk_ops import batch_get, batch_write, delete_keys, delete_versions, list_versions
+from utils import validate_token, load_body
+from clients import get_resource
+import metrics
+
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '500'))
+# Máximo de errores detallados en la respuesta de una purga
+PURGE_MAX_ERRORS = 50
+
+
+def tenant_diagram_ids(table, tenant_id):
+    """
+    Every diagram_id of a tenant (Query on the partition, keys only).
+    """
+    ids = []
+    params = {
+        'KeyConditionExpression': '#tenant = :tenant',
+        'ProjectionExpression': 'diagram_id',
+        'ExpressionAttributeNames': {'#tenant': 'tenant_id'},
+        'ExpressionAttributeValues': {':tenant': tenant_id}
+    }
+    while True:
+        response = table.query(**params)
+        ids.extend(item['diagram_id'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return ids
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def delete_diagrams(table_name, s3_bucket, tenant_id, diagram_ids):
+    """
+    Delete the items and every version of their S3 objects ({tenant_id}/{diagram_id} and the
+    object_key recorded on the item), both stores at the same time. Per-diagram summary.
+    """
+    keys = [{'tenant_id': tenant_id, 'diagram_id': diagram_id} for diagram_id in diagram_ids]
+    # Los renders (p.ej. red.yml -> red.png) guardan su clave en el item
+    object_keys = {diagram_id: {f'{tenant_id}/{diagram_id}'} for diagram_id in diagram_ids}
+    for item in batch_get(table_name, keys, ['diagram_id', 'object_key']):
+        if item.get('object_key'):
+            object_keys[item['diagram_id']].add(item['object_key'])
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        items_future = pool.submit(batch_write, table_name, deletes=keys)
+        objects_future = pool.submit(
+            delete_keys, s3_bucket, tenant_id, set().union(*object_keys.values())
+        )
+        failed_items = {key['diagram_id']: reason for key, reason in items_future.result()}
+        deleted, errors = objects_future.result()
+
+    results = []
+    for diagram_id in diagram_ids:
+        result = {
+            'diagram_id': diagram_id,
+            'item': 'error' if diagram_id in failed_items else 'deleted',
+            'object_versions_deleted': sum(deleted.get(key, 0) for key in object_keys[diagram_id])
+        }
+        object_errors = [errors[key] for key in object_keys[diagram_id] if key in errors]
+        if diagram_id in failed_items or object_errors:
+            result['error'] = '; '.join(([failed_items[diagram_id]] if diagram_id in failed_items else []) + object_errors)
+        results.append(result)
+    return results
+
+
+def purge_tenant(table, s3_bucket, tenant_id):
+    """
+    Delete every item of the tenant and every object version under {tenant_id}/ and jobs/{tenant_id}/.
+    """
+    def purge_items():
+        diagram_ids = tenant_diagram_ids(table, tenant_id)
+        failed = batch_write(table.name, deletes=[{'tenant_id': tenant_id, 'diagram_id': d} for d in diagram_ids])
+        return len(diagram_ids), failed
+
+    def purge_objects():
+        objects = list_versions(s3_bucket, f'{tenant_id}/') + list_versions(s3_bucket, f'jobs/{tenant_id}/')
+        return delete_versions(s3_bucket, objects)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        items_future = pool.submit(purge_items)
+        objects_future = pool.submit(purge_objects)
+        total_items, failed_items = items_future.result()
+        deleted, errors = objects_future.result()
+
+    error_list = [f"item {key['diagram_id']}: {reason}" for key, reason in failed_items]
+    error_list += [f'object {key}: {reason}' for key, reason in errors.items()]
+    return {
+        'items_deleted': total_items - len(failed_items),
+        'items_failed': len(failed_items),
+        'object_versions_deleted': sum(deleted.values()),
+        'objects_failed': len(errors),
+        'errors': error_list[:PURGE_MAX_ERRORS]
+    }
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Lambda function to delete many diagrams (or a whole tenant) with their S3 objects.
+    """
+    table = get_resource('dynamodb').Table(os.environ['TABLE_DIAGRAM'])
+    s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
+
+    # Parse body
+    body = load_body(event)
+
+    tenant_id = body.get('tenant_id')
+    diagram_ids = body.get('diagram_ids')
+    purge = body.get('purge') is True
+
+    if not tenant_id or (not purge and (not isinstance(diagram_ids, list) or not diagram_ids)):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing required parameters: tenant_id and diagram_ids (or purge).'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    # La purga exige repetir el tenant para evitar borrados accidentales
+    if purge and body.get('confirm') != tenant_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Purge requires "confirm" set to the tenant_id.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    if not purge:
+        if len(diagram_ids) > BULK_MAX_ITEMS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Too many diagram_ids. Maximum is {BULK_MAX_ITEMS}.'}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        if not all(isinstance(d, str) and d and '/' not in d for d in diagram_ids):
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'diagram_ids must be non-empty strings without "/".'}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+
+    # Parse token from Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    token = auth_header.split(' ')[1]
+
+    try:
+        validate_token(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    try:
+        if purge:
+            summary = purge_tenant(table, s3_bucket, tenant_id)
+            return {
+                'statusCode': 200,
+                'body': json.dumps(dict(summary, message=f'Tenant {tenant_id} purged.')),
+                'headers': {'Content-Type': 'application/json'}
+            }
+
+        results = delete_diagrams(table.name, s3_bucket, tenant_id, list(dict.fromkeys(diagram_ids)))
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': f'Error deleting diagrams: {str(e)}'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    failed = sum(1 for r in results if 'error' in r)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'{len(results) - failed} of {len(results)} diagrams deleted.',
+            'deleted': len(results) - failed,
+            'failed': failed,
+            'results': results
+        }),
+        'headers': {'Content-Type': 'application/json'}
+    }
@@ -1,15 +1,16 @@
-import boto3
 import os
 import json
-from utils import validate_token, load_body
+from utils import get_auth_context, load_body
+from clients import get_resource
+import metrics
 
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to create a diagram.
     """
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_diagram_name = os.environ['TABLE_DIAGRAM']
-    table_auth_name = os.environ['TABLE_AUTH']  # <- se necesita la tabla auth
 
     # Parse body
     body = load_body(event)
@@ -49,7 +50,7 @@ def lambda_handler(event, context):
 
     # Validate token (this will raise Exception if invalid)
     try:
-        validate_token(token, tenant_id)
+        auth = get_auth_context(token, tenant_id)
     except Exception as e:
         return {
             'statusCode': 403,
@@ -59,25 +60,8 @@ def lambda_handler(event, context):
             }
         }
 
-    # Fetch user_id from TABLE_AUTH (DynamoDB)
-    table_auth = dynamodb.Table(table_auth_name)
-    response = table_auth.get_item(
-        Key={
-            'token': token,
-            'tenant_id': tenant_id
-        }
-    )
-
-    if 'Item' not in response:
-        return {
-            'statusCode': 403,
-            'body': json.dumps({'error': 'Token not found.'}),
-            'headers': {
-                'Content-Type': 'application/json'
-            }
-        }
-
-    user_id = response['Item'].get('user_id')
+    # El usuario viene de la misma validación del token (sin segunda lectura de d_auth)
+    user_id = auth['user_id']
 
     # Insert new diagram record
     table_diagram = dynamodb.Table(table_diagram_name)
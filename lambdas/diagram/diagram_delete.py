@@ -1,15 +1,17 @@
-import boto3
 import os
 import json
-from utils import validate_token, load_body
+from bulk_ops import delete_keys
+from utils import get_auth_context, load_body
+from clients import get_resource
+import metrics
 
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to delete a diagram.
     """
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_diagram_name = os.environ['TABLE_DIAGRAM']
-    table_auth_name = os.environ['TABLE_AUTH']
 
     # Parse body
     body = load_body(event)
@@ -40,7 +42,7 @@ def lambda_handler(event, context):
 
     # Validate token (raises Exception if invalid)
     try:
-        validate_token(token, tenant_id)
+        auth = get_auth_context(token, tenant_id)
     except Exception as e:
         return {
             'statusCode': 403,
@@ -50,35 +52,26 @@ def lambda_handler(event, context):
             }
         }
 
-    # Fetch user_id from TABLE_AUTH (DynamoDB)
-    table_auth = dynamodb.Table(table_auth_name)
-    response = table_auth.get_item(
-        Key={
-            'token': token,
-            'tenant_id': tenant_id
-        }
-    )
-
-    if 'Item' not in response:
-        return {
-            'statusCode': 403,
-            'body': json.dumps({'error': 'Token not found.'}),
-            'headers': {
-                'Content-Type': 'application/json'
-            }
-        }
-
-    user_id = response['Item'].get('user_id')
+    # El usuario viene de la misma validación del token (sin segunda lectura de d_auth)
+    user_id = auth['user_id']
 
     # Delete diagram
     table_diagram = dynamodb.Table(table_diagram_name)
     try:
-        table_diagram.delete_item(
+        response = table_diagram.delete_item(
             Key={
                 'tenant_id': tenant_id,
                 'diagram_id': diagram_id
-            }
+            },
+            ReturnValues='ALL_OLD'
         )
+        # Borrar también todas las versiones del objeto en S3 (y del render, si lo hay)
+        object_keys = {f'{tenant_id}/{diagram_id}'}
+        if response.get('Attributes', {}).get('object_key'):
+            object_keys.add(response['Attributes']['object_key'])
+        deleted, errors = delete_keys(os.environ['S3_BUCKET_DIAGRAM'], tenant_id, object_keys)
+        if errors:
+            raise Exception('; '.join(f'{key}: {reason}' for key, reason in errors.items()))
     except Exception as e:
         return {
             'statusCode': 500,
@@ -90,7 +83,11 @@ def lambda_handler(event, context):
 
     return {
         'statusCode': 200,
-        'body': json.dumps({'message': 'Diagram deleted successfully.', 'user_id': user_id}),
+        'body': json.dumps({
+            'message': 'Diagram deleted successfully.',
+            'user_id': user_id,
+            'object_versions_deleted': sum(deleted.values())
+        }),
         'headers': {
             'Content-Type': 'application/json'
         }
@@ -1,17 +1,26 @@
-import boto3
 import os
 import json
-from utils import validate_token
+import render_cache
+from utils import get_header, make_etag, etag_matches, not_modified, validate_token
+from clients import get_client
+import metrics
 
+# La URL devuelta sigue siendo válida al menos este tiempo (ver render_cache.download_url)
+DOWNLOAD_MAX_AGE = render_cache.PRESIGN_EXPIRES - render_cache.PRESIGN_REUSE_WINDOW
+
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Generate pre-signed URL for downloading diagram from S3 (auth required).
+    The URL is pinned to the current object version; If-None-Match returns 304
+    while the same URL is still being handed out. Proxy integration, so the status code
+    and the ETag / Cache-Control headers reach the client.
     """
 
     s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
 
     # Parse query params
-    params = event.get('query') or {}
+    params = event.get('query') or event.get('queryStringParameters') or {}
     tenant_id = params.get('tenant_id')
     diagram_id = params.get('diagram_id')
 
@@ -20,18 +29,20 @@ def lambda_handler(event, context):
             'statusCode': 400,
             'body': json.dumps({'error': 'Missing required parameters: tenant_id or diagram_id.'}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
     # Parse token from Authorization header
-    auth_header = event.get('headers', {}).get('Authorization', '')
+    auth_header = get_header(event, 'Authorization', '')
     if not auth_header or not auth_header.startswith('Bearer '):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
@@ -45,37 +56,66 @@ def lambda_handler(event, context):
             'statusCode': 403,
             'body': json.dumps({'error': str(e)}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
     file_key = f'{tenant_id}/{diagram_id}'
 
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
 
     try:
-        presigned_url = s3.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={'Bucket': s3_bucket, 'Key': file_key},
-            ExpiresIn=3600  # 1 hour
-        )
-
+        head = s3.head_object(Bucket=s3_bucket, Key=file_key)
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': f'File {diagram_id} not found for tenant {tenant_id}.'}),
+                'headers': {
+                    'Content-Type': 'application/json'
+                }
+            }
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'download_url': presigned_url,
-                'file_key': file_key
-            }),
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
+    try:
+        presigned_url = render_cache.download_url(s3_bucket, file_key, head.get('VersionId'))
     except Exception as e:
         return {
             'statusCode': 500,
             'body': json.dumps({'error': str(e)}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
+
+    # La respuesta contiene la URL: el ETag cambia con el objeto y con la URL
+    etag = make_etag(head.get('ETag'), head.get('VersionId'), presigned_url)
+    cache_control = f'private, max-age={DOWNLOAD_MAX_AGE}'
+    if etag_matches(event, etag):
+        return not_modified(etag, cache_control)
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'download_url': presigned_url,
+            'file_key': file_key,
+            'size_bytes': head.get('ContentLength'),
+            'etag': head.get('ETag')
+        }),
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': etag,
+            'Cache-Control': cache_control
+        }
+    }
@@ -1,75 +1,132 @@
-import boto3
 import os
 import json
+import tempfile
+import time
 import uuid
-from utils import validate_token
+import render_cache
+from utils import get_header, record_object, validate_token
+from multipart import MultipartError, RequestBody, parse_form
 
-from diagrams import Diagram  # Import de diagrams
+import render_pool
+from topology import COMPILER_VERSION, TopologyError, compile_topology
 from contextlib import redirect_stdout
+import metrics
 
 s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
-s3 = boto3.client('s3')
+SCRATCH_DIR = os.environ.get('SCRATCH_DIR', '/tmp')
 
+# diagrams y los workers se cargan durante el init de Lambda, no en la primera petición
+render_pool.prewarm()
 
-def generate_diagram(diagram_id, fileitem, tenant_id):
-    # Leer el código enviado (.py)
-    code_content = fileitem.file.read().decode()
-
-    output_file = f"/tmp/{diagram_id}.png"
 
+def diagrams_version():
     try:
-        with Diagram(diagram_id, filename=f"/tmp/{diagram_id}", outformat="png"):
-            # Ejecutar el código dentro del contexto Diagram
-            # Seguridad: crear un contexto restringido
-            exec_globals = {}
-            exec_locals = {}
-            exec(code_content, exec_globals, exec_locals)
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': f'Error generating diagram: {str(e)}'})
-        }
+        from importlib.metadata import version
+        return version('diagrams')
+    except Exception:
+        return 'unknown'
 
-    if not os.path.exists(output_file):
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': 'Diagram image not generated'})
-        }
+
+def generate_diagram(diagram_id, fileitem, tenant_id, item_id=None):
+    # Topología YAML enviada: fileitem.data es una vista sobre el body, sin copia
+    source_bytes = fileitem.data
+
+    # Render cache: el título (diagram_id) también forma parte de la imagen
+    cache_key = render_cache.cache_key(
+        source_bytes, 'diagrams-topology',
+        f'{COMPILER_VERSION}/{diagrams_version()}/{render_cache.command_version(["dot", "-V"])}', 'png',
+        {'name': diagram_id}
+    )
+    cached = render_cache.lookup(cache_key, 'png')
+
+    if cached is None:
+        try:
+            with metrics.stage('compile'):
+                compiled = compile_topology(fileitem.text(), diagram_id)
+        except (TopologyError, MultipartError) as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Invalid diagram: {str(e)}'})
+            }
+
+        # Directorio propio por petición: dos renders del mismo diagram_id (otro tenant, otro hilo
+        # del modo servidor, un reintento) no pueden pisarse el PNG
+        with tempfile.TemporaryDirectory(prefix='topology-', dir=SCRATCH_DIR) as scratch:
+            output_base = os.path.join(scratch, 'diagram')
+            try:
+                start = time.perf_counter()
+                # Se dibuja en un worker aislado (límites de CPU, memoria y tiempo)
+                with metrics.stage('render'):
+                    render_pool.render(compiled, output_base)
+                render_ms = (time.perf_counter() - start) * 1000
+            except render_pool.RenderError as e:
+                return {
+                    'statusCode': 500,
+                    'body': json.dumps({'error': f'Error generating diagram: {str(e)}'})
+                }
+
+            if not os.path.exists(output_base + '.png'):
+                return {
+                    'statusCode': 500,
+                    'body': json.dumps({'error': 'Diagram image not generated'})
+                }
+            with open(output_base + '.png', 'rb') as f:
+                image = f.read()
 
     # Subir a S3
     file_key = f'{tenant_id}/{diagram_id}.png'
-    s3.upload_file(output_file, s3_bucket, file_key)
+    if cached is None:
+        cache_s3_key = render_cache.store(cache_key, 'png', image, render_ms, keep_data=False)
+        version_id = render_cache.publish(s3_bucket, file_key, cache_s3_key, image)
+        size_bytes = len(image)
+    else:
+        version_id = render_cache.publish(s3_bucket, file_key, cached['s3_key'], cached['data'])
+        size_bytes = cached['size']
+    # El item del diagrama (p.ej. "red.yml") guarda el tamaño y formato del PNG generado
+    if size_bytes is not None:
+        record_object(tenant_id, item_id or diagram_id, file_key, size_bytes, 'png')
 
-    presigned_url = s3.generate_presigned_url(
-        ClientMethod='get_object',
-        Params={'Bucket': s3_bucket, 'Key': file_key},
-        ExpiresIn=3600
-    )
+    # URL fijada a la versión publicada: reutilizable y cacheable
+    presigned_url = render_cache.download_url(s3_bucket, file_key, version_id)
 
     return {
         'statusCode': 200,
-        'body': json.dumps({'download_url': presigned_url}),
+        'body': json.dumps({
+            'download_url': presigned_url,
+            'cache': 'miss' if cached is None else 'hit',
+            'render_ms_saved': 0 if cached is None else round(cached['render_ms'], 1)
+        }),
         'headers': {'Content-Type': 'application/json'}
     }
 
 
+@metrics.instrument
 def lambda_handler(event, context):
-    import base64
-    import cgi
-    import io
+    token = get_header(event, 'Authorization')
+    content_type = get_header(event, 'Content-Type')
 
-    token = event['headers'].get('Authorization') or event['headers'].get('authorization')
+    try:
+        body = RequestBody(event)
+    except MultipartError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)})
+        }
+    with body:
+        return handle_form(body, content_type, token)
 
-    content_type = event['headers'].get('Content-Type') or event['headers'].get('content-type')
-    body = base64.b64decode(event['body'])
-    fp = io.BytesIO(body)
-    env = {'REQUEST_METHOD': 'POST'}
-    headers = {'content-type': content_type}
 
-    form = cgi.FieldStorage(fp=fp, environ=env, headers=headers)
-    fileitem = form['file']
-    tenant_id = form.getvalue('tenant_id')
-    diagram_id = form.getvalue('diagram_id') or str(uuid.uuid4())
+def handle_form(body, content_type, token):
+    try:
+        form = parse_form(body, content_type)
+        fileitem = form.get('file')
+        tenant_id = form.getvalue('tenant_id')
+        diagram_id = form.getvalue('diagram_id') or str(uuid.uuid4())
+    except MultipartError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)})
+        }
 
     if not tenant_id or not fileitem:
         return {
@@ -85,11 +142,12 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': str(e)})
         }
 
-    # SOLO .py → usa diagrams
+    # SOLO .yml → topología compilada y dibujada con diagrams
     if diagram_id.endswith('.yml'):
         # Quitar extensión
+        item_id = diagram_id
         diagram_id = diagram_id.replace(".yml", "")
-        return generate_diagram(diagram_id, fileitem, tenant_id)
+        return generate_diagram(diagram_id, fileitem, tenant_id, item_id)
 
     # .sql o .json → igual que antes
     elif diagram_id.endswith('.sql'):
@@ -99,5 +157,5 @@ def lambda_handler(event, context):
     else:
         return {
             'statusCode': 400,
-            'body': json.dumps({'error': 'Unsupported file type. Only .py, .sql, and .json are allowed.'})
+            'body': json.dumps({'error': 'Unsupported file type. Only .yml, .sql, and .json are allowed.'})
         }
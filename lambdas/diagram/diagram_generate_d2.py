@@ -1,17 +1,34 @@
-import boto3
 import os
 import json
 import base64
-import subprocess
 import uuid
-from utils import validate_token, load_body
+import render_cache
+import render_jobs
+from d2_render import RenderError, diagram_id_error, render_and_publish
+from utils import get_header, validate_token, load_body
+from multipart import MultipartError, RequestBody, parse_form
+import metrics
+
+def load_form(event, content_type):
+    """
+    Read a multipart/form-data request: returns (fields, d2 source bytes or None).
+    """
+    with RequestBody(event) as raw:
+        form = parse_form(raw, content_type)
+        fields = {name: part.text() for name, part in form.items() if name != 'file'}
+        d2_file = bytes(form['file'].data) if 'file' in form else None
+        del form
+    if 'async' in fields:
+        fields['async'] = fields['async'].strip().lower() in ('1', 'true', 'yes')
+    return fields, d2_file
 
+
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to generate D2 diagram from base64 source (.d2 file), output PNG to S3.
     """
     s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
-    s3 = boto3.client('s3')
 
     # Authorization header
     auth_header = event.get('headers', {}).get('Authorization', '')
@@ -24,28 +41,48 @@ def lambda_handler(event, context):
 
     token = auth_header.split(' ')[1]
 
-    # Parse JSON body
-    try:
-        body = load_body(event)
-    except Exception:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid JSON body.'}),
-            'headers': {'Content-Type': 'application/json'}
-        }
+    # Parse body: multipart/form-data (campo file con el .d2) o JSON
+    d2_file = None
+    content_type = get_header(event, 'Content-Type') or ''
+    if content_type.lower().startswith('multipart/form-data'):
+        try:
+            body, d2_file = load_form(event, content_type)
+        except MultipartError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+    else:
+        try:
+            body = load_body(event)
+        except Exception:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Invalid JSON body.'}),
+                'headers': {'Content-Type': 'application/json'}
+            }
 
     # Extract fields
     tenant_id = body.get('tenant_id')
     diagram_id = body.get('diagram_id') or str(uuid.uuid4()) + '.png'
     d2_source_base64 = body.get('d2_source_base64')
 
-    if not tenant_id or not d2_source_base64:
+    if not tenant_id or not (d2_source_base64 or d2_file):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Missing tenant_id or d2_source_base64.'}),
             'headers': {'Content-Type': 'application/json'}
         }
 
+    id_error = diagram_id_error(diagram_id)
+    if id_error:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': id_error}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
     # Validate token
     try:
         validate_token(token, tenant_id)
@@ -58,7 +95,7 @@ def lambda_handler(event, context):
 
     # Decode D2 source
     try:
-        d2_content = base64.b64decode(d2_source_base64)
+        d2_content = d2_file if d2_file is not None else base64.b64decode(d2_source_base64)
     except Exception:
         return {
             'statusCode': 400,
@@ -66,49 +103,63 @@ def lambda_handler(event, context):
             'headers': {'Content-Type': 'application/json'}
         }
 
-    # Write to temp .d2 file
-    tmp_d2_file = f"/tmp/{uuid.uuid4()}.d2"
-    with open(tmp_d2_file, 'wb') as f:
-        f.write(d2_content)
-
-    # Temp output PNG
-    tmp_output_file = f"/tmp/{uuid.uuid4()}.png"
+    # Modo asíncrono: devolver job_id y renderizar en el worker
+    if body.get('async'):
+        try:
+            job_id = render_jobs.submit(tenant_id, diagram_id, d2_content)
+        except render_jobs.DiagramNotFound as e:
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': str(e)}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'error': str(e)}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        return {
+            'statusCode': 202,
+            'body': json.dumps({
+                'message': 'D2 render job queued.',
+                'job_id': job_id,
+                'job_status': 'queued',
+                'diagram_id': diagram_id
+            }),
+            'headers': {'Content-Type': 'application/json'}
+        }
 
     try:
-        # Call D2 binary to generate PNG
-        result = subprocess.run(
-            ["/opt/bin/d2", tmp_d2_file, tmp_output_file],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-    except subprocess.CalledProcessError as e:
+        result = render_and_publish(s3_bucket, tenant_id, diagram_id, d2_content)
+    except RenderError as e:
         return {
             'statusCode': 500,
-            'body': json.dumps({'error': f'Error generating diagram: {e.stderr.decode()}'}),
+            'body': json.dumps({'error': f'Error generating diagram: {str(e)}'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)}),
             'headers': {'Content-Type': 'application/json'}
         }
 
-    # Upload PNG to S3
-    file_key = f"{tenant_id}/{diagram_id}"
+    file_key = result['file_key']
 
     try:
-        with open(tmp_output_file, 'rb') as f:
-            s3.put_object(Bucket=s3_bucket, Key=file_key, Body=f)
-
         # Presigned URL
-        presigned_url = s3.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={'Bucket': s3_bucket, 'Key': file_key},
-            ExpiresIn=3600
-        )
+        presigned_url = render_cache.download_url(s3_bucket, file_key, result['version_id'])
 
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'D2 diagram generated successfully.',
                 'download_url': presigned_url,
-                'file_key': file_key
+                'file_key': file_key,
+                'cache': result['cache'],
+                'render_ms_saved': result['render_ms_saved'],
+                'disk_bytes_written': result['disk_bytes_written']
             }),
             'headers': {'Content-Type': 'application/json'}
         }
@@ -0,0 +1,153 @@
+import os
+import json
+import base64
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import render_cache
+from d2_render import RenderError, diagram_id_error, publish, render_cached
+from utils import validate_token, load_body
+import metrics
+
+D2_BATCH_MAX_ITEMS = int(os.environ.get('D2_BATCH_MAX_ITEMS', '50'))
+UPLOAD_CONCURRENCY = int(os.environ.get('D2_BATCH_UPLOAD_CONCURRENCY', '16'))
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def render_item(item):
+    """
+    Decode and render one batch item; returns (rendered, error).
+    """
+    try:
+        d2_content = base64.b64decode(item['d2_source_base64'], validate=True)
+    except Exception:
+        return None, 'Invalid base64 content for D2 source.'
+    try:
+        return render_cached(d2_content), None
+    except RenderError as e:
+        return None, f'Error generating diagram: {str(e)}'
+    except Exception as e:
+        return None, str(e)
+
+
+def publish_item(s3_bucket, tenant_id, diagram_id, rendered):
+    file_key, version_id = publish(s3_bucket, tenant_id, diagram_id, rendered)
+    presigned_url = render_cache.download_url(s3_bucket, file_key, version_id)
+    return {
+        'diagram_id': diagram_id,
+        'download_url': presigned_url,
+        'file_key': file_key,
+        'cache': rendered['cache'],
+        'render_ms': rendered['render_ms'],
+        'render_ms_saved': rendered['render_ms_saved'],
+        'disk_bytes_written': rendered['disk_bytes_written']
+    }
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Batch variant of diagram_generate_d2: one token check, N sources rendered
+    in parallel (one d2 process per vCPU) and uploaded to S3 concurrently.
+    """
+    s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
+
+    # Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    token = auth_header.split(' ')[1]
+
+    # Parse JSON body
+    try:
+        body = load_body(event)
+    except Exception:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid JSON body.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    tenant_id = body.get('tenant_id')
+    items = body.get('items')
+
+    if not tenant_id or not isinstance(items, list) or not items:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing tenant_id or items.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if len(items) > D2_BATCH_MAX_ITEMS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Too many items. Maximum is {D2_BATCH_MAX_ITEMS}.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # Validate token (una sola vez para todo el lote)
+    try:
+        validate_token(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    results = [None] * len(items)
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        diagram_id = item.get('diagram_id') or str(uuid.uuid4()) + '.png'
+        # Mismas reglas que diagram/generate/d2, como error del elemento y no del lote
+        id_error = diagram_id_error(diagram_id)
+        if id_error:
+            results[index] = {'diagram_id': diagram_id, 'error': id_error}
+        elif not item.get('d2_source_base64'):
+            results[index] = {'diagram_id': diagram_id, 'error': 'Missing d2_source_base64.'}
+        elif diagram_id in seen:
+            results[index] = {'diagram_id': diagram_id, 'error': 'Duplicate diagram_id in batch.'}
+        else:
+            seen.add(diagram_id)
+            pending.append((index, diagram_id, item))
+
+    # Renders limitados por CPU; las subidas a S3 van en otro pool en cuanto termina cada render
+    with ThreadPoolExecutor(max_workers=available_cpus()) as render_pool, \
+            ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as upload_pool:
+        renders = [(index, diagram_id, render_pool.submit(render_item, item)) for index, diagram_id, item in pending]
+        uploads = []
+        for index, diagram_id, future in renders:
+            rendered, error = future.result()
+            if error:
+                results[index] = {'diagram_id': diagram_id, 'error': error}
+            else:
+                uploads.append((index, diagram_id, upload_pool.submit(publish_item, s3_bucket, tenant_id, diagram_id, rendered)))
+        for index, diagram_id, future in uploads:
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = {'diagram_id': diagram_id, 'error': str(e)}
+
+    failed = sum(1 for r in results if 'error' in r)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'{len(results) - failed} of {len(results)} D2 diagrams generated.',
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': results
+        }),
+        'headers': {'Content-Type': 'application/json'}
+    }
@@ -0,0 +1,168 @@
+import os
+import json
+import base64
+import binascii
+from decimal import Decimal
+from utils import validate_token
+from clients import get_resource
+import metrics
+
+LIST_DEFAULT_LIMIT = int(os.environ.get('LIST_DEFAULT_LIMIT', '50'))
+LIST_MAX_LIMIT = int(os.environ.get('LIST_MAX_LIMIT', '200'))
+# Con filtros una página de Query puede volver casi vacía: como mucho tantas lecturas por petición
+LIST_MAX_QUERY_PAGES = int(os.environ.get('LIST_MAX_QUERY_PAGES', '5'))
+
+LIST_FIELDS = ('diagram_id', 'type', 'user_id', 'format', 'size_bytes', 'object_key', 'updated_at', 'job_status')
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(last_key):
+    return base64.urlsafe_b64encode(json.dumps(last_key, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor, tenant_id):
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise CursorError('Invalid cursor.')
+    # El cursor solo puede continuar el listado del mismo tenant
+    if not isinstance(last_key, dict) or set(last_key) != {'tenant_id', 'diagram_id'} \
+            or last_key['tenant_id'] != tenant_id or not isinstance(last_key['diagram_id'], str):
+        raise CursorError('Invalid cursor.')
+    return last_key
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def query_diagrams(tenant_id, fields, limit, last_key=None, diagram_type=None, user_id=None):
+    """
+    One Query on the tenant_id partition (several only when filters leave a page short).
+    Returns (items, LastEvaluatedKey or None).
+    """
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    params = {
+        'KeyConditionExpression': '#tenant = :tenant',
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': dict(names, **{'#tenant': 'tenant_id'}),
+        'ExpressionAttributeValues': {':tenant': tenant_id}
+    }
+    filters = []
+    if diagram_type:
+        filters.append('#type = :type')
+        params['ExpressionAttributeNames']['#type'] = 'type'
+        params['ExpressionAttributeValues'][':type'] = diagram_type
+    if user_id:
+        filters.append('#user = :user')
+        params['ExpressionAttributeNames']['#user'] = 'user_id'
+        params['ExpressionAttributeValues'][':user'] = user_id
+    if filters:
+        params['FilterExpression'] = ' AND '.join(filters)
+
+    table = get_resource('dynamodb').Table(os.environ['TABLE_DIAGRAM'])
+    items = []
+    for _ in range(LIST_MAX_QUERY_PAGES):
+        if last_key:
+            params['ExclusiveStartKey'] = last_key
+        with metrics.stage('db'):
+            response = table.query(Limit=limit - len(items), **params)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or len(items) >= limit:
+            break
+    return items, last_key
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Lambda function to list a tenant's diagrams, one page at a time.
+    """
+    params = event.get('query') or {}
+
+    # fallback en caso de rawQueryString (HTTP API v2)
+    if not params and 'rawQueryString' in event:
+        import urllib.parse
+        params = urllib.parse.parse_qs(event['rawQueryString'])
+        params = {k: v[0] for k, v in params.items()}
+
+    tenant_id = params.get('tenant_id')
+    if not tenant_id:
+        return {
+            'statusCode': 400,
+            'body': {'error': 'Missing required parameter: tenant_id.'},
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    try:
+        limit = int(params.get('limit') or LIST_DEFAULT_LIMIT)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= LIST_MAX_LIMIT:
+        return {
+            'statusCode': 400,
+            'body': {'error': f'limit must be between 1 and {LIST_MAX_LIMIT}.'},
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    fields = [f.strip() for f in params['fields'].split(',') if f.strip()] if params.get('fields') else list(LIST_FIELDS)
+    # Sin repetidos (en orden): dos rutas iguales en la ProjectionExpression son un ValidationException
+    fields = list(dict.fromkeys(fields))
+    unknown = [f for f in fields if f not in LIST_FIELDS]
+    if unknown:
+        return {
+            'statusCode': 400,
+            'body': {'error': f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(LIST_FIELDS)}.'},
+            'headers': {'Content-Type': 'application/json'}
+        }
+    if 'diagram_id' not in fields:
+        fields.insert(0, 'diagram_id')
+
+    # Parse token from Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': {'error': 'Missing or invalid Authorization header.'},
+            'headers': {'Content-Type': 'application/json'}
+        }
+    token = auth_header.split(' ')[1]
+
+    try:
+        validate_token(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': {'error': str(e)},
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    try:
+        last_key = decode_cursor(params['cursor'], tenant_id) if params.get('cursor') else None
+    except CursorError as e:
+        return {
+            'statusCode': 400,
+            'body': {'error': str(e)},
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    items, last_key = query_diagrams(
+        tenant_id, fields, limit, last_key,
+        diagram_type=params.get('type'), user_id=params.get('user_id')
+    )
+
+    return {
+        'statusCode': 200,
+        'body': {
+            'diagrams': [{k: _plain(v) for k, v in item.items()} for item in items],
+            'count': len(items),
+            'cursor': encode_cursor(last_key) if last_key else None
+        },
+        'headers': {'Content-Type': 'application/json'}
+    }
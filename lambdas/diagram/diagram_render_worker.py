@@ -0,0 +1,35 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from render_jobs import RENDER_WORKER_CONCURRENCY, process_job
+import metrics
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    SQS worker: render queued D2 jobs with bounded concurrency.
+    Failed messages are reported individually so only those are retried.
+    ApproximateReceiveCount tells process_job when a message is on its last delivery.
+    """
+    records = event.get('Records', [])
+    failures = []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(RENDER_WORKER_CONCURRENCY, len(records)))) as executor:
+        futures = {}
+        for record in records:
+            # Un mensaje ilegible solo falla él, no el lote entero
+            try:
+                message = json.loads(record['body'])
+                receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+            except (KeyError, TypeError, ValueError) as e:
+                print('Invalid render job message:', record.get('messageId'), str(e))
+                failures.append({'itemIdentifier': record.get('messageId')})
+                continue
+            futures[executor.submit(process_job, message, receive_count)] = record['messageId']
+        for future, message_id in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print('Render job failed:', message_id, str(e))
+                failures.append({'itemIdentifier': message_id})
+
+    return {'batchItemFailures': failures}
@@ -1,21 +1,24 @@
-import boto3
 import os
 import json
-from utils import validate_token
+from utils import get_auth_context, get_header, json_default, make_etag, etag_matches, not_modified
+from clients import get_resource
+import metrics
 
+@metrics.instrument
 def lambda_handler(event, context):
     """
-    Lambda function to get a diagram.
+    Lambda function to get a diagram (ETag from the item contents, 304 on If-None-Match).
+    Proxy integration, so the status code and the ETag / Cache-Control headers reach the client.
+    The item is still read before comparing: a 304 saves the transfer, not the DynamoDB read.
     """
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_diagram_name = os.environ['TABLE_DIAGRAM']
-    table_auth_name = os.environ['TABLE_AUTH']
 
-    # Log completo
-    print('Full Event:', json.dumps(event))
+    # Evento completo solo para una muestra de las peticiones
+    metrics.log_event(event, 'Full Event')
 
     # Manejo robusto para GET
-    params = event.get('query') or {}
+    params = event.get('query') or event.get('queryStringParameters') or {}
 
     # fallback en caso de rawQueryString (HTTP API v2)
     if not params and 'rawQueryString' in event:
@@ -30,83 +33,80 @@ def lambda_handler(event, context):
     if not tenant_id or not diagram_id:
         return {
             'statusCode': 400,
-            'body': {'error': 'Missing required parameters: tenant_id, diagram_id.'},
+            'body': json.dumps({'error': 'Missing required parameters: tenant_id, diagram_id.'}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
     # Parse token from Authorization header
-    auth_header = event.get('headers', {}).get('Authorization', '')
+    auth_header = get_header(event, 'Authorization', '')
     if not auth_header or not auth_header.startswith('Bearer '):
         return {
             'statusCode': 400,
-            'body': {'error': 'Missing or invalid Authorization header.'},
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
     token = auth_header.split(' ')[1]
 
     # Validate token (raises Exception if invalid)
     try:
-        validate_token(token, tenant_id)
+        auth = get_auth_context(token, tenant_id)
     except Exception as e:
         return {
             'statusCode': 403,
-            'body': {'error': str(e)},
+            'body': json.dumps({'error': str(e)}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
-    # Fetch user_id from TABLE_AUTH (DynamoDB)
-    table_auth = dynamodb.Table(table_auth_name)
-    response = table_auth.get_item(
-        Key={
-            'token': token,
-            'tenant_id': tenant_id
-        }
-    )
-
-    if 'Item' not in response:
-        return {
-            'statusCode': 403,
-            'body': {'error': 'Token not found.'},
-            'headers': {
-                'Content-Type': 'application/json'
-            }
-        }
-
-    user_id = response['Item'].get('user_id')
+    # El usuario viene de la misma validación del token (sin segunda lectura de d_auth)
+    user_id = auth['user_id']
 
     # Retrieve the diagram
     table_diagram = dynamodb.Table(table_diagram_name)
-    response = table_diagram.get_item(
-        Key={
-            'tenant_id': tenant_id,
-            'diagram_id': diagram_id
-        }
-    )
+    with metrics.stage('db'):
+        response = table_diagram.get_item(
+            Key={
+                'tenant_id': tenant_id,
+                'diagram_id': diagram_id
+            }
+        )
 
     if 'Item' not in response:
         return {
             'statusCode': 404,
-            'body': {'error': f'Diagram {diagram_id} not found for tenant {tenant_id}.'},
+            'body': json.dumps({'error': f'Diagram {diagram_id} not found for tenant {tenant_id}.'}),
             'headers': {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
             }
         }
 
     diagram_item = response['Item']
 
+    # Cualquier cambio del item (o del usuario que pregunta) da otro ETag
+    etag = make_etag(diagram_item, user_id)
+    if etag_matches(event, etag):
+        return not_modified(etag, 'private, no-cache')
+
     return {
         'statusCode': 200,
-        'body': {
+        'body': json.dumps({
             'diagram': diagram_item,
             'user_id': user_id
-        },
+        }, default=json_default),
         'headers': {
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache'
         }
     }
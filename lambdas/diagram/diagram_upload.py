@@ -1,17 +1,21 @@
-import boto3
 import os
 import json
 import base64
-from utils import validate_token
+from utils import get_header, record_object, validate_token
+from clients import get_client
+from multipart import MultipartError, RequestBody, parse_form
+import metrics
 
 ALLOWED_EXTENSIONS = ('.sql', '.json', '.dbml')
 
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda endpoint to upload file directly to S3 (with auth) — base64 version.
+    Kept for small files; clients should prefer diagram/upload/presign + diagram/upload/complete.
     """
     s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
 
     # Authorization header
     auth_header = event.get('headers', {}).get('Authorization', '')
@@ -24,6 +28,20 @@ def lambda_handler(event, context):
 
     token = auth_header.split(' ')[1]
 
+    # multipart/form-data: campos tenant_id, diagram_id y file (sin base64 dentro del JSON)
+    content_type = get_header(event, 'Content-Type') or ''
+    if content_type.lower().startswith('multipart/form-data'):
+        try:
+            body = RequestBody(event)
+        except MultipartError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': str(e)}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        with body:
+            return upload_form(s3, s3_bucket, token, body, content_type)
+
     # Decode body (json)
     try:
         body = json.loads(event['body'])
@@ -46,6 +64,44 @@ def lambda_handler(event, context):
             'headers': {'Content-Type': 'application/json'}
         }
 
+    # Decode file content
+    try:
+        file_content = base64.b64decode(file_base64)
+    except Exception:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid base64 content.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    return upload_file(s3, s3_bucket, token, tenant_id, diagram_id, file_content, len(file_content))
+
+
+def upload_form(s3, s3_bucket, token, body, content_type):
+    try:
+        form = parse_form(body, content_type)
+        fileitem = form.get('file')
+        tenant_id = form.getvalue('tenant_id')
+        diagram_id = form.getvalue('diagram_id') or (fileitem.filename if fileitem else None)
+    except MultipartError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if not tenant_id or not diagram_id or fileitem is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing tenant_id, diagram_id, or file.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # El part se sube directamente desde la vista del body, sin copiarlo
+    return upload_file(s3, s3_bucket, token, tenant_id, diagram_id, fileitem.open(), len(fileitem))
+
+
+def upload_file(s3, s3_bucket, token, tenant_id, diagram_id, file_content, size_bytes):
     if not diagram_id.endswith(ALLOWED_EXTENSIONS):
         return {
             'statusCode': 400,
@@ -63,25 +119,18 @@ def lambda_handler(event, context):
             'headers': {'Content-Type': 'application/json'}
         }
 
-    # Decode file content
-    try:
-        file_content = base64.b64decode(file_base64)
-    except Exception:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'Invalid base64 content.'}),
-            'headers': {'Content-Type': 'application/json'}
-        }
-
     # Upload to S3
     file_key = f'{tenant_id}/{diagram_id}'
 
     try:
-        s3.put_object(
-            Bucket=s3_bucket,
-            Key=file_key,
-            Body=file_content
-        )
+        with metrics.stage('upload'):
+            s3.put_object(
+                Bucket=s3_bucket,
+                Key=file_key,
+                Body=file_content
+            )
+        metrics.size('object', size_bytes)
+        record_object(tenant_id, diagram_id, file_key, size_bytes)
 
         return {
             'statusCode': 200,
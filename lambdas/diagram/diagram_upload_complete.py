@@ -0,0 +1,134 @@
+import os
+import json
+from utils import validate_token, load_body, record_object
+from clients import get_client
+import metrics
+
+ALLOWED_EXTENSIONS = ('.sql', '.json', '.dbml')
+
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(5 * 1024 * 1024 * 1024)))
+
+
+def complete_multipart(s3, s3_bucket, file_key, upload_id):
+    """
+    Close the multipart upload with the parts S3 actually received (not the client's list).
+    """
+    parts = []
+    paginator = s3.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=s3_bucket, Key=file_key, UploadId=upload_id):
+        parts.extend({'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in page.get('Parts', []))
+    if not parts:
+        raise ValueError('No parts uploaded.')
+    s3.complete_multipart_upload(
+        Bucket=s3_bucket, Key=file_key, UploadId=upload_id,
+        MultipartUpload={'Parts': parts}
+    )
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Phase two of the direct upload: finish the multipart upload (if any) and record
+    size, ETag and checksum of the S3 object on the d_diagrams item.
+    """
+    s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
+
+    # Parse body
+    body = load_body(event)
+
+    tenant_id = body.get('tenant_id')
+    diagram_id = body.get('diagram_id')
+    upload_id = body.get('upload_id')
+
+    if not tenant_id or not diagram_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing tenant_id or diagram_id.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if not diagram_id.endswith(ALLOWED_EXTENSIONS) or '/' in diagram_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Invalid file extension. Allowed extensions: {ALLOWED_EXTENSIONS}'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    token = auth_header.split(' ')[1]
+
+    # Validate token
+    try:
+        validate_token(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    file_key = f'{tenant_id}/{diagram_id}'
+    s3 = get_client('s3')
+
+    try:
+        if upload_id:
+            complete_multipart(s3, s3_bucket, file_key, upload_id)
+        head = s3.head_object(Bucket=s3_bucket, Key=file_key, ChecksumMode='ENABLED')
+    except s3.exceptions.NoSuchUpload:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'error': 'Upload not found.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    except Exception as e:
+        status = e.response['Error']['Code'] if hasattr(e, 'response') else None
+        if status in ('404', 'NoSuchKey'):
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': 'File not uploaded.'}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        return {
+            'statusCode': 400 if isinstance(e, ValueError) else 500,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    size_bytes = head['ContentLength']
+    # Las URLs de presign ya limitan el tamaño; esto cubre las emitidas antes de ese cambio
+    if size_bytes > UPLOAD_MAX_BYTES:
+        # Bucket versionado: sin VersionId solo se añadiría un delete marker y el objeto seguiría ahí
+        delete = {'Bucket': s3_bucket, 'Key': file_key}
+        if head.get('VersionId'):
+            delete['VersionId'] = head['VersionId']
+        s3.delete_object(**delete)
+        return {
+            'statusCode': 413,
+            'body': json.dumps({'error': f'File too large. Maximum is {UPLOAD_MAX_BYTES} bytes.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    checksum = {
+        'etag': head.get('ETag'),
+        'checksum_sha256': head.get('ChecksumSHA256')
+    }
+    if not record_object(tenant_id, diagram_id, file_key, size_bytes, attributes=checksum):
+        # Sin item (nunca creado o borrado) el tamaño y el checksum no se guardarían
+        return {
+            'statusCode': 409,
+            'body': json.dumps({'error': f'Diagram metadata could not be recorded for {diagram_id}; create the diagram and retry.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(dict(checksum, message='File uploaded successfully.', file_key=file_key, size_bytes=size_bytes)),
+        'headers': {'Content-Type': 'application/json'}
+    }
@@ -0,0 +1,167 @@
+import os
+import json
+from utils import validate_token, load_body
+from clients import get_client
+import metrics
+
+ALLOWED_EXTENSIONS = ('.sql', '.json', '.dbml')
+
+UPLOAD_URL_EXPIRES = int(os.environ.get('UPLOAD_URL_EXPIRES', '900'))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(5 * 1024 * 1024 * 1024)))
+# Por encima de este tamaño se reparten URLs por parte (subida multipart)
+UPLOAD_MULTIPART_THRESHOLD = int(os.environ.get('UPLOAD_MULTIPART_THRESHOLD', str(64 * 1024 * 1024)))
+UPLOAD_PART_SIZE = max(int(os.environ.get('UPLOAD_PART_SIZE', str(16 * 1024 * 1024))), 5 * 1024 * 1024)
+S3_MAX_PARTS = 10000
+
+
+def get_presign_client():
+    """
+    S3 client used only for signing: SigV4 and virtual-hosted URLs, which browsers can use
+    without a redirect (the default 's3' client from clients.py keeps the default config).
+    """
+    return get_client('s3', 's3-presign', signature_version='s3v4', s3={'addressing_style': 'virtual'})
+
+
+def presign_post(s3, s3_bucket, file_key, size_bytes):
+    max_bytes = size_bytes if size_bytes is not None else UPLOAD_MAX_BYTES
+    post = s3.generate_presigned_post(
+        Bucket=s3_bucket,
+        Key=file_key,
+        Conditions=[['content-length-range', 0, max_bytes]],
+        ExpiresIn=UPLOAD_URL_EXPIRES
+    )
+    return {'mode': 'post', 'url': post['url'], 'fields': post['fields']}
+
+
+def presign_put(s3, s3_bucket, file_key, size_bytes, checksum_sha256):
+    # Lo que se firma aquí S3 lo exige luego en la subida: el tamaño firmado es el límite
+    params = {'Bucket': s3_bucket, 'Key': file_key, 'ContentLength': size_bytes}
+    headers = {'Content-Length': str(size_bytes)}
+    if checksum_sha256:
+        params['ChecksumSHA256'] = checksum_sha256
+        headers['x-amz-checksum-sha256'] = checksum_sha256
+    url = s3.generate_presigned_url('put_object', Params=params, ExpiresIn=UPLOAD_URL_EXPIRES)
+    return {'mode': 'put', 'url': url, 'headers': headers}
+
+
+def presign_multipart(s3, s3_bucket, file_key, size_bytes):
+    part_size = max(UPLOAD_PART_SIZE, -(-size_bytes // S3_MAX_PARTS))
+    upload_id = s3.create_multipart_upload(Bucket=s3_bucket, Key=file_key)['UploadId']
+    parts = []
+    for number in range(1, -(-size_bytes // part_size) + 1):
+        # Cada parte con su tamaño firmado (la última, el resto): el total no puede pasar de size_bytes
+        length = min(part_size, size_bytes - (number - 1) * part_size)
+        url = s3.generate_presigned_url(
+            'upload_part',
+            Params={
+                'Bucket': s3_bucket, 'Key': file_key, 'UploadId': upload_id,
+                'PartNumber': number, 'ContentLength': length
+            },
+            ExpiresIn=UPLOAD_URL_EXPIRES
+        )
+        parts.append({'part_number': number, 'url': url, 'size_bytes': length})
+    return {'mode': 'multipart', 'upload_id': upload_id, 'part_size': part_size, 'parts': parts}
+
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Phase one of the direct upload: validate token and extension and return presigned
+    S3 URLs (POST, PUT or one per multipart part). The client then calls diagram/upload/complete.
+    Every URL bounds the upload size: the POST policy with content-length-range, PUT and
+    multipart parts with a signed Content-Length, so PUT needs size_bytes.
+    """
+    s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
+
+    # Parse body
+    body = load_body(event)
+
+    tenant_id = body.get('tenant_id')
+    diagram_id = body.get('diagram_id')
+    size_bytes = body.get('size_bytes')
+    method = (body.get('method') or 'post').lower()
+    checksum_sha256 = body.get('checksum_sha256')
+
+    if not tenant_id or not diagram_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing tenant_id or diagram_id.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if not diagram_id.endswith(ALLOWED_EXTENSIONS) or '/' in diagram_id:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Invalid file extension. Allowed extensions: {ALLOWED_EXTENSIONS}'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if method not in ('post', 'put'):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'method must be post or put.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    if size_bytes is not None and (not isinstance(size_bytes, int) or isinstance(size_bytes, bool) or size_bytes < 0):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'size_bytes must be a non-negative integer.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    if method == 'put' and size_bytes is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'size_bytes is required with method put.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    if size_bytes is not None and size_bytes > UPLOAD_MAX_BYTES:
+        return {
+            'statusCode': 413,
+            'body': json.dumps({'error': f'File too large. Maximum is {UPLOAD_MAX_BYTES} bytes.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    # Authorization header
+    auth_header = event.get('headers', {}).get('Authorization', '')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+    token = auth_header.split(' ')[1]
+
+    # Validate token
+    try:
+        validate_token(token, tenant_id)
+    except Exception as e:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    file_key = f'{tenant_id}/{diagram_id}'
+    s3 = get_presign_client()
+
+    try:
+        if size_bytes is not None and size_bytes > UPLOAD_MULTIPART_THRESHOLD:
+            upload = presign_multipart(s3, s3_bucket, file_key, size_bytes)
+        elif method == 'put':
+            upload = presign_put(s3, s3_bucket, file_key, size_bytes, checksum_sha256)
+        else:
+            upload = presign_post(s3, s3_bucket, file_key, size_bytes)
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {'Content-Type': 'application/json'}
+        }
+
+    upload.update({'file_key': file_key, 'expires_in': UPLOAD_URL_EXPIRES})
+    return {
+        'statusCode': 200,
+        'body': json.dumps(upload),
+        'headers': {'Content-Type': 'application/json'}
+    }
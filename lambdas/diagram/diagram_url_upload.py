@@ -1,14 +1,120 @@
-import boto3
 import os
 import json
+import time
 import requests
-from utils import validate_token, load_body
+from utils import validate_token, load_body, record_object
+from clients import get_client, get_resource
+import metrics
 
 ALLOWED_EXTENSIONS = ('.sql', '.json', '.dbml')
 
+URL_CONNECT_TIMEOUT = float(os.environ.get('URL_CONNECT_TIMEOUT', '5'))
+URL_READ_TIMEOUT = float(os.environ.get('URL_READ_TIMEOUT', '15'))
+# Tiempo total de descarga (el read timeout solo cuenta entre paquetes)
+URL_TOTAL_TIMEOUT = float(os.environ.get('URL_TOTAL_TIMEOUT', '25'))
+URL_MAX_BYTES = int(os.environ.get('URL_MAX_BYTES', str(50 * 1024 * 1024)))
+# Parte de la subida multipart a S3 (mínimo 5 MB salvo la última)
+URL_PART_SIZE = max(int(os.environ.get('URL_PART_SIZE', str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+URL_CHUNK_SIZE = 64 * 1024
+URL_POOL_SIZE = int(os.environ.get('URL_POOL_SIZE', '10'))
+
+_session = None
+
+
+class SourceError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_session():
+    """
+    Container-wide requests session, so keep-alive connections survive between invocations.
+    """
+    global _session
+    if _session is None:
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=URL_POOL_SIZE, pool_maxsize=URL_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def iter_body(response):
+    """
+    Chunks of the response body, enforcing URL_MAX_BYTES and URL_TOTAL_TIMEOUT.
+    """
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and int(length) > URL_MAX_BYTES:
+        raise SourceError(f'Remote file too large. Maximum is {URL_MAX_BYTES} bytes.', 413)
+    deadline = time.monotonic() + URL_TOTAL_TIMEOUT
+    received = 0
+    for chunk in response.iter_content(chunk_size=URL_CHUNK_SIZE):
+        received += len(chunk)
+        if received > URL_MAX_BYTES:
+            raise SourceError(f'Remote file too large. Maximum is {URL_MAX_BYTES} bytes.', 413)
+        if time.monotonic() > deadline:
+            raise SourceError('Timed out downloading remote file.', 504)
+        yield chunk
+
+
+def stream_to_s3(chunks, s3_bucket, file_key):
+    """
+    Upload the chunks to S3 holding at most one part in memory. Files smaller than
+    one part go in a single put_object. Returns the number of bytes written.
+    """
+    s3 = get_client('s3')
+    buffer = bytearray()
+    upload_id = None
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            buffer += chunk
+            size += len(chunk)
+            if len(buffer) >= URL_PART_SIZE:
+                if upload_id is None:
+                    upload_id = s3.create_multipart_upload(Bucket=s3_bucket, Key=file_key)['UploadId']
+                part = s3.upload_part(
+                    Bucket=s3_bucket, Key=file_key, UploadId=upload_id,
+                    PartNumber=len(parts) + 1, Body=bytes(buffer)
+                )
+                parts.append({'PartNumber': len(parts) + 1, 'ETag': part['ETag']})
+                buffer.clear()
+
+        if upload_id is None:
+            s3.put_object(Bucket=s3_bucket, Key=file_key, Body=bytes(buffer))
+            return size
+
+        if buffer:
+            part = s3.upload_part(
+                Bucket=s3_bucket, Key=file_key, UploadId=upload_id,
+                PartNumber=len(parts) + 1, Body=bytes(buffer)
+            )
+            parts.append({'PartNumber': len(parts) + 1, 'ETag': part['ETag']})
+        s3.complete_multipart_upload(
+            Bucket=s3_bucket, Key=file_key, UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+        return size
+    except BaseException:
+        # No dejar partes huérfanas facturando en el bucket
+        if upload_id is not None:
+            try:
+                s3.abort_multipart_upload(Bucket=s3_bucket, Key=file_key, UploadId=upload_id)
+            except Exception as e:
+                print('Could not abort multipart upload:', file_key, str(e))
+        raise
+
+
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to download a file from external URL and upload to S3, with token auth.
+    With "refresh": true the previous source is fetched with a conditional GET and
+    nothing is uploaded if it did not change.
     """
 
     s3_bucket = os.environ['S3_BUCKET_DIAGRAM']
@@ -19,8 +125,9 @@ def lambda_handler(event, context):
     tenant_id = body.get('tenant_id')
     diagram_id = body.get('diagram_id')
     url = body.get('url')
+    refresh = body.get('refresh') is True
 
-    if not tenant_id or not diagram_id or not url:
+    if not tenant_id or not diagram_id or not (url or refresh):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Missing required parameters: tenant_id, diagram_id, url.'}),
@@ -38,6 +145,15 @@ def lambda_handler(event, context):
             }
         }
 
+    if url and not url.lower().startswith(('http://', 'https://')):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'url must be http or https.'}),
+            'headers': {
+                'Content-Type': 'application/json'
+            }
+        }
+
     # Read Authorization header
     auth_header = event.get('headers', {}).get('Authorization', '')
     if not auth_header or not auth_header.startswith('Bearer '):
@@ -65,27 +181,116 @@ def lambda_handler(event, context):
 
     file_key = f'{tenant_id}/{diagram_id}'
 
+    # El item debe existir (diagram/create): record_object no crea items parciales.
+    # Trae también los validadores de la descarga anterior para el GET condicional
+    item = get_resource('dynamodb').Table(os.environ['TABLE_DIAGRAM']).get_item(
+        Key={'tenant_id': tenant_id, 'diagram_id': diagram_id},
+        ProjectionExpression='diagram_id, source_url, source_etag, source_last_modified'
+    ).get('Item')
+    if item is None:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'error': f'Diagram {diagram_id} not found for tenant {tenant_id}.'}),
+            'headers': {
+                'Content-Type': 'application/json'
+            }
+        }
+
+    request_headers = {}
+    if refresh:
+        if not url:
+            url = item.get('source_url')
+        if not url:
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': 'Diagram has no source URL to refresh.'}),
+                'headers': {
+                    'Content-Type': 'application/json'
+                }
+            }
+        if url == item.get('source_url'):
+            if item.get('source_etag'):
+                request_headers['If-None-Match'] = item['source_etag']
+            if item.get('source_last_modified'):
+                request_headers['If-Modified-Since'] = item['source_last_modified']
+
     try:
-        # Descargar desde URL externa
-        file_response = requests.get(url)
-        file_response.raise_for_status()
-        file_content = file_response.content
+        # Descargar desde URL externa en streaming
+        with get_session().get(
+            url, headers=request_headers, stream=True,
+            timeout=(URL_CONNECT_TIMEOUT, URL_READ_TIMEOUT)
+        ) as file_response:
+            if file_response.status_code == 304:
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': 'Source not modified; nothing uploaded.',
+                        'file_key': file_key,
+                        'modified': False
+                    }),
+                    'headers': {
+                        'Content-Type': 'application/json'
+                    }
+                }
+            file_response.raise_for_status()
 
-        # Subir a S3
-        s3 = boto3.client('s3')
-        s3.put_object(Bucket=s3_bucket, Key=file_key, Body=file_content)
+            # Subir a S3
+            with metrics.stage('transfer'):
+                size_bytes = stream_to_s3(iter_body(file_response), s3_bucket, file_key)
+            metrics.size('object', size_bytes)
+            # Sin validador se guarda NULL para no reutilizar el de otra URL
+            source = {
+                'source_url': url,
+                'source_etag': file_response.headers.get('ETag'),
+                'source_last_modified': file_response.headers.get('Last-Modified')
+            }
+            if not record_object(tenant_id, diagram_id, file_key, size_bytes, attributes=source):
+                # Borrado mientras se descargaba: sin source_url un refresh posterior no funcionaría
+                return {
+                    'statusCode': 409,
+                    'body': json.dumps({'error': 'Diagram metadata could not be recorded; retry the upload.'}),
+                    'headers': {
+                        'Content-Type': 'application/json'
+                    }
+                }
 
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': 'File uploaded successfully from URL.',
-                'file_key': file_key
+                'file_key': file_key,
+                'size_bytes': size_bytes,
+                'modified': True
             }),
             'headers': {
                 'Content-Type': 'application/json'
             }
         }
 
+    except SourceError as e:
+        return {
+            'statusCode': e.status_code,
+            'body': json.dumps({'error': str(e)}),
+            'headers': {
+                'Content-Type': 'application/json'
+            }
+        }
+    except requests.Timeout:
+        return {
+            'statusCode': 504,
+            'body': json.dumps({'error': 'Timed out fetching remote file.'}),
+            'headers': {
+                'Content-Type': 'application/json'
+            }
+        }
+    except requests.RequestException as e:
+        return {
+            'statusCode': 502,
+            'body': json.dumps({'error': f'Error fetching remote file: {str(e)}'}),
+            'headers': {
+                'Content-Type': 'application/json'
+            }
+        }
     except Exception as e:
         return {
             'statusCode': 500,
@@ -0,0 +1,218 @@
+import base64
+import binascii
+import io
+import mmap
+import os
+import tempfile
+
+# Parser multipart/form-data sin copias (sustituye a cgi.FieldStorage, eliminado en Python 3.13)
+SPILL_THRESHOLD = int(os.environ.get('MULTIPART_SPILL_THRESHOLD', str(10 * 1024 * 1024)))
+SCRATCH_DIR = os.environ.get('SCRATCH_DIR', '/tmp')
+# Múltiplo de 4 para poder decodificar base64 por trozos
+_B64_CHUNK = 4 * 1024 * 1024
+# Lo que b64decode ignora (saltos de línea, espacios): se quita antes de trocear
+_B64_IGNORED = bytes(set(range(256)) - set(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='))
+
+
+class MultipartError(ValueError):
+    pass
+
+
+class Part:
+    """
+    One form field. `data` is a memoryview into the request body (no copy).
+    """
+    __slots__ = ('name', 'filename', 'content_type', 'data')
+
+    def __init__(self, name, filename, content_type, data):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def text(self, encoding='utf-8'):
+        try:
+            return str(self.data, encoding)
+        except UnicodeDecodeError as e:
+            raise MultipartError(f'Field {self.name} is not valid {encoding} text: {e}')
+
+    def open(self):
+        """
+        Seekable file-like reader over the part (for boto3 Body=...), without copying it.
+        """
+        return io.BufferedReader(_ViewReader(self.data))
+
+
+class _ViewReader(io.RawIOBase):
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class FormData(dict):
+    """
+    name -> Part. The first part wins when a name is repeated.
+    """
+
+    def getvalue(self, name, default=None):
+        part = self.get(name)
+        return part.text() if part is not None else default
+
+
+class RequestBody:
+    """
+    Decoded request body exposed as a memoryview.
+    Bodies above the spill threshold are decoded into a temp file and memory-mapped
+    instead of being held in the Lambda heap. Use as a context manager.
+    """
+
+    def __init__(self, event, spill_threshold=None):
+        threshold = SPILL_THRESHOLD if spill_threshold is None else spill_threshold
+        raw = event.get('body') or ''
+        is_base64 = event.get('isBase64Encoded', True)
+        self._file = None
+        self._mmap = None
+        self.buffer = memoryview(b'')
+
+        try:
+            if not is_base64:
+                data = raw.encode('utf-8') if isinstance(raw, str) else raw
+            elif len(raw) * 3 // 4 > threshold:
+                data = self._spill(raw)
+            else:
+                data = base64.b64decode(raw)
+        except (binascii.Error, UnicodeEncodeError) as e:
+            self.close()
+            raise MultipartError(f'Invalid request body: {e}')
+        self._bytes = data
+        self.buffer = memoryview(data)
+        self.spilled = self._mmap is not None
+
+    def _spill(self, raw):
+        self._file = tempfile.TemporaryFile(dir=SCRATCH_DIR)
+        # Sin saltos de línea los trozos quedan alineados a 4; lo que sobra pasa al siguiente
+        pending = b''
+        for start in range(0, len(raw), _B64_CHUNK):
+            chunk = raw[start:start + _B64_CHUNK]
+            if isinstance(chunk, str):
+                chunk = chunk.encode('ascii')
+            chunk = pending + chunk.translate(None, _B64_IGNORED)
+            aligned = len(chunk) - len(chunk) % 4
+            self._file.write(binascii.a2b_base64(chunk[:aligned]))
+            pending = chunk[aligned:]
+        if pending:
+            self._file.write(binascii.a2b_base64(pending))
+        self._file.flush()
+        if self._file.tell() == 0:
+            return b''
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def close(self):
+        # Si aún quedan vistas (Part.data) vivas, el mmap se libera al recolectarlas;
+        # el fichero temporal ya no tiene nombre en disco, así que cerrarlo basta
+        try:
+            self.buffer.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_boundary(content_type):
+    if not content_type or not content_type.lower().startswith('multipart/form-data'):
+        raise MultipartError('Content-Type must be multipart/form-data')
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'boundary' and value:
+            return value.strip('"').encode('latin-1')
+    raise MultipartError('Missing multipart boundary')
+
+
+def _parse_headers(raw):
+    name = filename = None
+    content_type = 'text/plain'
+    for line in raw.decode('utf-8', 'replace').split('\r\n'):
+        key, _, value = line.partition(':')
+        key = key.strip().lower()
+        if key == 'content-type':
+            content_type = value.strip()
+        elif key == 'content-disposition':
+            for param in value.split(';')[1:]:
+                pkey, _, pvalue = param.strip().partition('=')
+                pvalue = pvalue.strip().strip('"')
+                if pkey.lower() == 'name':
+                    name = pvalue
+                elif pkey.lower() == 'filename':
+                    filename = pvalue
+    return name, filename, content_type
+
+
+def parse_form(body, content_type):
+    """
+    Parse a multipart/form-data body (bytes, mmap or RequestBody) into FormData.
+    Part data are memoryview slices of the body; nothing is copied.
+    """
+    if isinstance(body, RequestBody):
+        body = body._bytes
+    view = memoryview(body)
+    delimiter = b'--' + get_boundary(content_type)
+    separator = b'\r\n' + delimiter
+
+    form = FormData()
+    pos = body.find(delimiter)
+    if pos < 0:
+        raise MultipartError('Multipart boundary not found in body')
+    pos += len(delimiter)
+
+    while True:
+        if body[pos:pos + 2] == b'--':
+            return form
+        if body[pos:pos + 2] == b'\r\n':
+            pos += 2
+        header_end = body.find(b'\r\n\r\n', pos)
+        if header_end < 0:
+            raise MultipartError('Malformed multipart part headers')
+        name, filename, part_type = _parse_headers(bytes(view[pos:header_end]))
+        data_start = header_end + 4
+        data_end = body.find(separator, data_start)
+        if data_end < 0:
+            raise MultipartError('Unterminated multipart part')
+        if name is not None and name not in form:
+            form[name] = Part(name, filename, part_type, view[data_start:data_end])
+        pos = data_end + len(separator)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+from clients import get_client
+import metrics
+
+# Caché de renders direccionada por contenido: LRU en memoria + objetos S3 bajo cache/.
+# Este módulo está duplicado en lambdas/diagram y lambdas/diagram-sql (mantener iguales)
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get('RENDER_CACHE_MAX_ENTRIES', '256'))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RENDER_CACHE_PREFIX = 'cache/'
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+# Los objetos de cache/ están direccionados por contenido: nunca cambian
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Las copias publicadas en {tenant_id}/... sí se sobrescriben
+PUBLISHED_CACHE_CONTROL = 'no-cache'
+
+# URLs presignadas reutilizadas durante PRESIGN_REUSE_WINDOW para que caches de navegador/CDN acierten
+PRESIGN_EXPIRES = int(os.environ.get('PRESIGN_EXPIRES', '3600'))
+PRESIGN_REUSE_WINDOW = min(int(os.environ.get('PRESIGN_REUSE_WINDOW', '1800')), PRESIGN_EXPIRES - 60)
+PRESIGN_CACHE_MAX_ENTRIES = int(os.environ.get('PRESIGN_CACHE_MAX_ENTRIES', '1024'))
+
+# key -> {'data': bytes | None, 'render_ms': float, 's3_key': str | None, 'size': int | None}
+_lru = OrderedDict()
+_lru_state = {'bytes': 0}
+_lock = threading.Lock()
+_versions = {}
+# (bucket, key, version_id) -> (url, signed_at)
+_urls = OrderedDict()
+
+
+def cache_bucket():
+    return os.environ.get('RENDER_CACHE_BUCKET') or os.environ.get('S3_BUCKET_DIAGRAM')
+
+
+def cache_key(source, renderer, version, fmt, options=None):
+    """
+    Hash of the source bytes plus everything that changes the rendered output.
+    """
+    digest = hashlib.sha256()
+    for part in (renderer, version, fmt, json.dumps(options or {}, sort_keys=True)):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(source.encode('utf-8') if isinstance(source, str) else source)
+    return digest.hexdigest()
+
+
+def object_key(key, fmt):
+    return f'{RENDER_CACHE_PREFIX}{key}.{fmt}'
+
+
+def command_version(args):
+    """
+    Output of a renderer's version command, computed once per container.
+    """
+    args = tuple(args)
+    if args not in _versions:
+        try:
+            result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=10)
+            _versions[args] = result.stdout.decode('utf-8', 'replace').strip()
+        except (OSError, subprocess.SubprocessError):
+            _versions[args] = 'unknown'
+    return _versions[args]
+
+
+def _remember(key, data, render_ms, s3_key, size=None):
+    if data is None and s3_key is None:
+        return
+    with _lock:
+        old = _lru.pop(key, None)
+        if old and old['data']:
+            _lru_state['bytes'] -= len(old['data'])
+        _lru[key] = {'data': data, 'render_ms': render_ms, 's3_key': s3_key, 'size': size}
+        if data:
+            _lru_state['bytes'] += len(data)
+        while _lru and (len(_lru) > RENDER_CACHE_MAX_ENTRIES or _lru_state['bytes'] > RENDER_CACHE_MAX_BYTES):
+            _, evicted = _lru.popitem(last=False)
+            if evicted['data']:
+                _lru_state['bytes'] -= len(evicted['data'])
+
+
+def lookup(key, fmt):
+    """
+    Find a cached render: first in memory, then in S3.
+    Returns {'tier', 'data', 's3_key', 'render_ms', 'size'} or None on a miss.
+    """
+    with _lock:
+        entry = _lru.get(key)
+        if entry is not None:
+            _lru.move_to_end(key)
+            return dict(entry, tier='memory')
+
+    bucket = cache_bucket()
+    if not bucket:
+        return None
+
+    s3_key = object_key(key, fmt)
+    try:
+        with metrics.stage('cache_lookup'):
+            head = get_client('s3').head_object(Bucket=bucket, Key=s3_key)
+    except Exception as e:
+        # 404 = no está en caché; cualquier otro error se trata como miss
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+            print('Render cache lookup failed:', str(e))
+        return None
+
+    render_ms = float(head.get('Metadata', {}).get('render-ms', 0))
+    size = head.get('ContentLength')
+    _remember(key, None, render_ms, s3_key, size)
+    return {'tier': 's3', 'data': None, 's3_key': s3_key, 'render_ms': render_ms, 'size': size}
+
+
+def store(key, fmt, data, render_ms, keep_data=True):
+    """
+    Save a render in memory and, when a bucket is configured, under cache/ in S3.
+    Returns the S3 key of the cached object (or None).
+    """
+    s3_key = None
+    bucket = cache_bucket()
+    if bucket:
+        s3_key = object_key(key, fmt)
+        with metrics.stage('cache_store'):
+            get_client('s3').put_object(
+                Bucket=bucket,
+                Key=s3_key,
+                Body=data,
+                ContentType=CONTENT_TYPES.get(fmt, 'application/octet-stream'),
+                CacheControl=IMMUTABLE_CACHE_CONTROL,
+                Metadata={'render-ms': f'{render_ms:.1f}'}
+            )
+    _remember(key, data if keep_data else None, render_ms, s3_key, len(data))
+    return s3_key
+
+
+def read(entry):
+    """
+    Bytes of a cache entry, fetching them from S3 if only the key is known.
+    """
+    if entry.get('data') is not None:
+        return entry['data']
+    with metrics.stage('cache_read'):
+        response = get_client('s3').get_object(Bucket=cache_bucket(), Key=entry['s3_key'])
+        return response['Body'].read()
+
+
+def cache_stats():
+    with _lock:
+        return {'entries': len(_lru), 'bytes': _lru_state['bytes']}
+
+
+def publish(bucket, file_key, s3_key=None, data=None):
+    """
+    Place a render at file_key: server-side copy of the cached object when there is one,
+    otherwise upload the bytes. Returns the VersionId of the new object (None if unversioned).
+    """
+    s3 = get_client('s3')
+    content_type = CONTENT_TYPES.get(os.path.splitext(file_key)[1].lstrip('.').lower(), 'application/octet-stream')
+    with metrics.stage('upload'):
+        if s3_key:
+            # REPLACE: la copia no debe heredar el Cache-Control inmutable de cache/
+            response = s3.copy_object(
+                Bucket=bucket, Key=file_key, CopySource={'Bucket': cache_bucket(), 'Key': s3_key},
+                MetadataDirective='REPLACE', ContentType=content_type, CacheControl=PUBLISHED_CACHE_CONTROL
+            )
+        else:
+            metrics.size('object', len(data))
+            response = s3.put_object(
+                Bucket=bucket, Key=file_key, Body=data,
+                ContentType=content_type, CacheControl=PUBLISHED_CACHE_CONTROL
+            )
+    return response.get('VersionId')
+
+
+def download_url(bucket, key, version_id=None):
+    """
+    Presigned GET for an object that will not change under this URL: a cache/ key or a
+    pinned version. The same URL is returned for PRESIGN_REUSE_WINDOW seconds.
+    """
+    now = time.time()
+    url_key = (bucket, key, version_id)
+    with _lock:
+        entry = _urls.get(url_key)
+        if entry is not None and now - entry[1] < PRESIGN_REUSE_WINDOW:
+            _urls.move_to_end(url_key)
+            return entry[0]
+
+    params = {'Bucket': bucket, 'Key': key}
+    if version_id:
+        params['VersionId'] = version_id
+        params['ResponseCacheControl'] = IMMUTABLE_CACHE_CONTROL
+    with metrics.stage('presign'):
+        url = get_client('s3').generate_presigned_url(ClientMethod='get_object', Params=params, ExpiresIn=PRESIGN_EXPIRES)
+
+    with _lock:
+        _urls[url_key] = (url, now)
+        _urls.move_to_end(url_key)
+        while len(_urls) > PRESIGN_CACHE_MAX_ENTRIES:
+            _urls.popitem(last=False)
+    return url
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from clients import get_client, get_resource
+from d2_render import RenderError, render_and_publish
+
+# Cola de renders: SQS si RENDER_QUEUE_URL está definido, si no un pool en proceso (tests/local)
+RENDER_QUEUE_URL = os.environ.get('RENDER_QUEUE_URL', '')
+RENDER_WORKER_CONCURRENCY = int(os.environ.get('RENDER_WORKER_CONCURRENCY', '4'))
+# maxReceiveCount de la RedrivePolicy: en el último intento el job se marca failed
+RENDER_MAX_RECEIVES = int(os.environ.get('RENDER_MAX_RECEIVES', '3'))
+JOB_SOURCE_PREFIX = 'jobs/'
+
+_local = {'executor': None, 'futures': []}
+_local_lock = threading.Lock()
+
+
+class DiagramNotFound(Exception):
+    pass
+
+
+def _error_code(e):
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _diagram_table():
+    return get_resource('dynamodb').Table(os.environ['TABLE_DIAGRAM'])
+
+
+def submit(tenant_id, diagram_id, d2_content):
+    """
+    Record a queued job on the diagram item and enqueue it. Returns the job_id.
+    The source goes to S3 so large files are not limited by the queue message size.
+    Raises DiagramNotFound if the diagram has no d_diagrams item.
+    """
+    job_id = str(uuid.uuid4())
+    bucket = os.environ['S3_BUCKET_DIAGRAM']
+    source_key = f'{JOB_SOURCE_PREFIX}{tenant_id}/{job_id}.d2'
+
+    get_client('s3').put_object(Bucket=bucket, Key=source_key, Body=d2_content)
+    try:
+        # Sin item no se crea uno parcial (sin user_id ni type)
+        _diagram_table().update_item(
+            Key={'tenant_id': tenant_id, 'diagram_id': diagram_id},
+            UpdateExpression='SET job_id = :job_id, job_status = :status, job_updated_at = :now REMOVE job_error',
+            ConditionExpression='attribute_exists(diagram_id)',
+            ExpressionAttributeValues={':job_id': job_id, ':status': 'queued', ':now': _now()}
+        )
+    except Exception as e:
+        if _error_code(e) == 'ConditionalCheckFailedException':
+            get_client('s3').delete_object(Bucket=bucket, Key=source_key)
+            raise DiagramNotFound(f'Diagram {diagram_id} not found for tenant {tenant_id}.')
+        raise
+
+    message = {'job_id': job_id, 'tenant_id': tenant_id, 'diagram_id': diagram_id, 'source_key': source_key}
+    if RENDER_QUEUE_URL:
+        get_client('sqs').send_message(QueueUrl=RENDER_QUEUE_URL, MessageBody=json.dumps(message))
+    else:
+        with _local_lock:
+            if _local['executor'] is None:
+                _local['executor'] = ThreadPoolExecutor(max_workers=RENDER_WORKER_CONCURRENCY)
+            _local['futures'].append(_local['executor'].submit(process_job, message))
+    return job_id
+
+
+def drain_local_queue(timeout=None):
+    """
+    Wait for jobs submitted to the in-process queue (local stand-in only).
+    """
+    with _local_lock:
+        futures, _local['futures'] = _local['futures'], []
+    for future in futures:
+        future.result(timeout=timeout)
+
+
+def _set_status(message, status, extra=None, only_pending=False):
+    """
+    Update the job fields, only if the item still belongs to this job
+    (and, with only_pending, the job has not finished yet).
+    Returns False when the condition does not hold.
+    """
+    values = {':job_id': message['job_id'], ':status': status, ':now': _now()}
+    expression = 'SET job_status = :status, job_updated_at = :now'
+    condition = 'job_id = :job_id'
+    if only_pending:
+        condition += ' AND job_status IN (:queued, :running)'
+        values.update({':queued': 'queued', ':running': 'running'})
+    for name, value in (extra or {}).items():
+        expression += f', {name} = :{name}'
+        values[f':{name}'] = value
+    try:
+        _diagram_table().update_item(
+            Key={'tenant_id': message['tenant_id'], 'diagram_id': message['diagram_id']},
+            UpdateExpression=expression,
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        if _error_code(e) == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def process_job(message, receive_count=None):
+    """
+    Render one queued job and record its outcome on the diagram item.
+    Render errors mark the job failed; infrastructure errors propagate so the queue retries,
+    except on the last delivery (receive_count, None when there are no retries), where the job
+    is marked failed before the message goes to the dead-letter queue.
+    The source is deleted once the job is finished, whatever the outcome.
+    """
+    bucket = os.environ['S3_BUCKET_DIAGRAM']
+    s3 = get_client('s3')
+    last_attempt = receive_count is None or receive_count >= RENDER_MAX_RECEIVES
+    finished = False
+    try:
+        # Mensajes duplicados o de un job reemplazado no se procesan
+        if not _set_status(message, 'running', only_pending=True):
+            print('Job superseded or already finished:', message['job_id'])
+            finished = True
+            return
+
+        d2_content = s3.get_object(Bucket=bucket, Key=message['source_key'])['Body'].read()
+        try:
+            result = render_and_publish(bucket, message['tenant_id'], message['diagram_id'], d2_content)
+        except RenderError as e:
+            _set_status(message, 'failed', {'job_error': str(e)[:1000]})
+        else:
+            _set_status(message, 'done', {
+                'output_key': result['file_key'],
+                'render_ms': Decimal(str(result['render_ms'])),
+                'job_cache': result['cache']
+            })
+        finished = True
+    except Exception as e:
+        if last_attempt:
+            finished = True
+            try:
+                _set_status(message, 'failed', {'job_error': f'Render job failed: {e}'[:1000]}, only_pending=True)
+            except Exception as status_error:
+                print('Could not mark job failed:', message['job_id'], str(status_error))
+        raise
+    finally:
+        if finished:
+            s3.delete_object(Bucket=bucket, Key=message['source_key'])
@@ -0,0 +1,237 @@
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import topology
+
+# Pool de procesos que ya tienen importado diagrams para dibujar las topologías compiladas.
+# Solo Process + Pipe: multiprocessing.Pool/Queue necesitan /dev/shm, que Lambda no tiene.
+RENDER_POOL_SIZE = int(os.environ.get('RENDER_POOL_SIZE', '1'))
+RENDER_MAX_JOBS = int(os.environ.get('RENDER_MAX_JOBS', '50'))
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', '20'))
+RENDER_CPU_SECONDS = int(os.environ.get('RENDER_CPU_SECONDS', '15'))
+RENDER_MEMORY_MB = int(os.environ.get('RENDER_MEMORY_MB', '768'))
+# Los proveedores no se precargan: topology los resuelve con node_index.json
+RENDER_PRELOAD_MODULES = [name for name in os.environ.get('RENDER_PRELOAD_MODULES', 'diagrams').split(',') if name]
+# fork en Lambda (un hilo por petición). Un proceso con más hilos (lambdas/server) usa forkserver:
+# hacer fork con otros hilos activos puede copiar locks tomados y colgar al worker.
+RENDER_START_METHOD = os.environ.get('RENDER_START_METHOD', 'fork')
+
+_ctx = multiprocessing.get_context(RENDER_START_METHOD)
+if RENDER_START_METHOD == 'forkserver':
+    # Los workers salen del forkserver con diagrams ya importado
+    _ctx.set_forkserver_preload([__name__] + RENDER_PRELOAD_MODULES)
+_state = {'preloaded': False, 'workers': [], 'idle': []}
+_cond = threading.Condition()
+
+
+class RenderError(Exception):
+    pass
+
+
+def _limit_resources():
+    import resource
+    if RENDER_MEMORY_MB > 0:
+        limit = RENDER_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu():
+    # RLIMIT_CPU cuenta todo el tiempo del proceso: el límite blando se mueve en cada job
+    import resource
+    if RENDER_CPU_SECONDS <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + RENDER_CPU_SECONDS
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _render(job):
+    topology.emit(job['topology'], job['filename'])
+
+
+def _worker_main(conn):
+    # Grupo de procesos propio: al matar el worker también cae el dot que haya lanzado
+    os.setsid()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Con fork ya viene precargado; con forkserver solo falta el índice de nodos
+    preload()
+    _limit_resources()
+    for _ in range(RENDER_MAX_JOBS):
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        _limit_cpu()
+        try:
+            _render(job)
+            conn.send({'ok': True})
+        except MemoryError:
+            conn.send({'ok': False, 'error': f'memory limit exceeded ({RENDER_MEMORY_MB} MB)'})
+        except BaseException as e:
+            conn.send({'ok': False, 'error': str(e) or type(e).__name__})
+    conn.close()
+    os._exit(0)
+
+
+class _Worker:
+
+    def __init__(self):
+        self.conn, child_conn = _ctx.Pipe()
+        self.process = _ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    @property
+    def alive(self):
+        return self.jobs < RENDER_MAX_JOBS and self.process.is_alive()
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.conn.close()
+
+    def run(self, job, timeout):
+        self.jobs += 1
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise RenderError(f'render timed out after {timeout:.0f}s')
+        try:
+            return self.conn.recv()
+        except EOFError:
+            # El worker murió: SIGXCPU (límite de CPU) o el OOM killer
+            self.process.join(1)
+            self.conn.close()
+            if self.process.exitcode == -signal.SIGXCPU:
+                raise RenderError(f'CPU time limit exceeded ({RENDER_CPU_SECONDS}s)')
+            raise RenderError(f'render worker died (exit code {self.process.exitcode})')
+
+
+def preload():
+    """
+    Import diagrams and load the node index once, before forking workers.
+    """
+    if _state['preloaded']:
+        return
+    topology.load_index()
+    for name in RENDER_PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+            if name.startswith('diagrams.'):
+                topology.register_module(name[len('diagrams.'):])
+        except ImportError as e:
+            print('Render pool preload skipped:', name, str(e))
+    _state['preloaded'] = True
+
+
+def prewarm():
+    """
+    Preload modules and start the workers (call at init, outside the request path).
+    """
+    preload()
+    if RENDER_POOL_SIZE <= 0:
+        return
+    with _cond:
+        while len(_state['workers']) < RENDER_POOL_SIZE:
+            worker = _Worker()
+            _state['workers'].append(worker)
+            _state['idle'].append(worker)
+
+
+def _acquire():
+    with _cond:
+        while True:
+            while _state['idle']:
+                worker = _state['idle'].pop()
+                if worker.alive:
+                    return worker
+                _discard(worker)
+            if len(_state['workers']) < RENDER_POOL_SIZE:
+                worker = _Worker()
+                _state['workers'].append(worker)
+                return worker
+            _cond.wait()
+
+
+def _discard(worker):
+    if worker in _state['workers']:
+        _state['workers'].remove(worker)
+    if worker.process.is_alive():
+        try:
+            worker.conn.send(None)
+        except OSError:
+            pass
+        worker.process.join(1)
+    worker.conn.close()
+
+
+def _release(worker, healthy):
+    with _cond:
+        if healthy and worker.alive:
+            _state['idle'].append(worker)
+        else:
+            _discard(worker)
+            # Reponer el worker ya, fuera del camino de la siguiente petición
+            if len(_state['workers']) < RENDER_POOL_SIZE:
+                replacement = _Worker()
+                _state['workers'].append(replacement)
+                _state['idle'].append(replacement)
+        _cond.notify()
+
+
+def render(compiled, filename, timeout=None):
+    """
+    Draw a compiled topology (topology.compile_topology) in a pooled worker,
+    with CPU, memory and wall-clock limits. The PNG is written to filename + '.png'.
+    """
+    job = {'topology': compiled, 'filename': filename}
+    timeout = RENDER_TIMEOUT if timeout is None else timeout
+
+    if RENDER_POOL_SIZE <= 0:
+        # Sin pool (desarrollo local): en el propio proceso y sin límites
+        try:
+            _render(job)
+        except Exception as e:
+            raise RenderError(str(e))
+        return
+
+    preload()
+    worker = _acquire()
+    healthy = False
+    try:
+        result = worker.run(job, timeout)
+        healthy = True
+    finally:
+        _release(worker, healthy)
+    if not result['ok']:
+        raise RenderError(result['error'])
+
+
+def shutdown():
+    with _cond:
+        for worker in list(_state['workers']):
+            _discard(worker)
+        _state['idle'] = []
+
+
+def pool_stats():
+    with _cond:
+        return {
+            'workers': len(_state['workers']),
+            'idle': len(_state['idle']),
+            'jobs': sum(worker.jobs for worker in _state['workers'])
+        }
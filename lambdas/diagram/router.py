@@ -0,0 +1,111 @@
+import importlib
+import json
+
+# Punto de entrada único ("mono-Lambda", ver serverless.router.yml): despacha por método y ruta a
+# los lambda_handler de siempre. Cada módulo se importa la primera vez que se usa su ruta, así una
+# ruta ligera no paga diagrams (diagram_generate) ni requests (diagram_url_upload) en el arranque.
+ROUTES = {
+    ('POST', 'diagram/create'): 'diagram_create',
+    ('POST', 'diagram/upload'): 'diagram_upload',
+    ('POST', 'diagram/upload/presign'): 'diagram_upload_presign',
+    ('POST', 'diagram/upload/complete'): 'diagram_upload_complete',
+    ('POST', 'diagram/url/upload'): 'diagram_url_upload',
+    ('GET', 'diagram/download'): 'diagram_download',
+    ('DELETE', 'diagram/delete'): 'diagram_delete',
+    ('POST', 'diagram/bulk/create'): 'diagram_bulk_create',
+    ('DELETE', 'diagram/bulk/delete'): 'diagram_bulk_delete',
+    ('GET', 'diagram/request'): 'diagram_request',
+    ('GET', 'diagram/list'): 'diagram_list',
+    ('POST', 'diagram/generate'): 'diagram_generate',
+    ('POST', 'diagram/generate/d2'): 'diagram_generate_d2',
+    ('POST', 'diagram/generate/d2/batch'): 'diagram_generate_d2_batch',
+}
+PATHS = sorted({path for _, path in ROUTES}, key=len, reverse=True)
+
+_handlers = {}
+
+
+def get_handler(module_name):
+    """
+    lambda_handler of module_name, imported on first use.
+    """
+    handler = _handlers.get(module_name)
+    if handler is None:
+        handler = importlib.import_module(module_name).lambda_handler
+        _handlers[module_name] = handler
+    return handler
+
+
+def route_of(event):
+    """
+    (method, path, proxy) for the three event shapes API Gateway can send:
+    HTTP API (payload 2.0), REST proxy and REST `integration: lambda` (serverless default template).
+    proxy is True when the response body must be a string.
+    """
+    http = (event.get('requestContext') or {}).get('http')
+    if http:
+        return http.get('method', ''), event.get('rawPath') or http.get('path', ''), True
+    if 'httpMethod' in event:
+        return event['httpMethod'], event.get('path') or event.get('resource') or '', True
+    return event.get('method', ''), event.get('requestPath') or '', False
+
+
+def match_path(path, paths=None):
+    """
+    Known route for a request path, ignoring slashes and a stage prefix ('/dev/diagram/list').
+    `paths` must be sorted longest first (default: the diagram routes).
+    """
+    path = path.strip('/')
+    for known in paths or PATHS:
+        if path == known or path.endswith('/' + known):
+            return known
+    return None
+
+
+def normalize(event, proxy):
+    """
+    Shallow copy of a proxy event with the fields the handlers read: 'query' and
+    Authorization/Content-Type with their usual capitalization (HTTP API lowercases headers).
+    """
+    if not proxy:
+        return event
+    event = dict(event)
+    headers = dict(event.get('headers') or {})
+    for name in ('Authorization', 'Content-Type'):
+        if name not in headers and name.lower() in headers:
+            headers[name] = headers[name.lower()]
+    event['headers'] = headers
+    if 'query' not in event:
+        event['query'] = event.get('queryStringParameters') or {}
+    return event
+
+
+def proxy_response(response):
+    # Con integración proxy el body debe ser texto; los GET devuelven dicts
+    if isinstance(response, dict) and 'body' in response and not isinstance(response['body'], str):
+        response = dict(response, body=json.dumps(response['body'], default=str))
+    return response
+
+
+def lambda_handler(event, context):
+    method, path, proxy = route_of(event)
+    method = method.upper()
+    known = match_path(path)
+
+    if known is None:
+        response = {
+            'statusCode': 404,
+            'body': {'error': f'No route for {method} {path}.'},
+            'headers': {'Content-Type': 'application/json'}
+        }
+    elif (method, known) not in ROUTES:
+        allowed = ', '.join(m for m, p in ROUTES if p == known)
+        response = {
+            'statusCode': 405,
+            'body': {'error': f'Method {method} not allowed on {known}.'},
+            'headers': {'Content-Type': 'application/json', 'Allow': allowed}
+        }
+    else:
+        response = get_handler(ROUTES[(method, known)])(normalize(event, proxy), context)
+
+    return proxy_response(response) if proxy else response
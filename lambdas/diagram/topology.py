@@ -0,0 +1,309 @@
+import importlib
+import importlib.util
+import json
+import os
+import re
+
+# Compilador del formato YAML de diagram/test.yml (resources / of / relates) a nodos, clusters y aristas.
+# El resultado es un dict serializable que se envía al worker de render_pool, sin exec.
+TOPOLOGY_MAX_RESOURCES = int(os.environ.get('TOPOLOGY_MAX_RESOURCES', '20000'))
+# Anidamiento máximo de clusters/grupos (walk y members son recursivos)
+TOPOLOGY_MAX_DEPTH = int(os.environ.get('TOPOLOGY_MAX_DEPTH', '32'))
+YAML_MAX_FLOW_DEPTH = 256
+# Índice generado por build_node_index.py: tipo -> [clase, icono], sin importar los proveedores
+NODE_INDEX_PATH = os.environ.get(
+    'NODE_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'node_index.json')
+)
+COMPILER_VERSION = '1'
+
+CONTAINER_TYPES = ('cluster', 'group')
+DIRECTIONS = {
+    # direction -> (forward, reverse)
+    'outgoing': (True, False),
+    'incoming': (False, True),
+    'bidirectional': (True, True),
+    'undirected': (False, False),
+}
+GRAPH_DIRECTIONS = ('TB', 'BT', 'LR', 'RL')
+
+_TYPE_RE = re.compile(r'^[a-z0-9_]+(\.[a-z0-9_]+)*\.[A-Za-z_][A-Za-z0-9_]*$')
+_NOT_BRACKET_RE = re.compile(r'[^\[\]{}]')
+
+# 'aws.network.Route53' -> clase Node, solo para tipos que no están en el índice
+_registry = {}
+_registered_modules = set()
+_index = {'types': None, 'root': None}
+_icons = {}
+
+
+class TopologyError(ValueError):
+    pass
+
+
+def _scalar(value):
+    # Ids, nombres y referencias: texto o número del YAML, nunca listas ni mapas
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def register_module(module_name):
+    """
+    Add every node class of diagrams.<module_name> (e.g. 'aws.compute') to the registry.
+    """
+    if module_name in _registered_modules:
+        return
+    _registered_modules.add(module_name)
+    from diagrams import Node
+    module = importlib.import_module(f'diagrams.{module_name}')
+    for attr, value in vars(module).items():
+        if not attr.startswith('_') and isinstance(value, type) and issubclass(value, Node):
+            _registry[f'{module_name}.{attr}'] = value
+
+
+def resolve_type(type_name):
+    """
+    Node class for a type string like 'aws.compute.ECS'.
+    """
+    node_class = _registry.get(type_name)
+    if node_class is not None:
+        return node_class
+    if not isinstance(type_name, str) or not _TYPE_RE.match(type_name):
+        raise TopologyError(f'Invalid node type: {type_name!r}')
+    module_name = type_name.rpartition('.')[0]
+    try:
+        register_module(module_name)
+    except ImportError:
+        pass
+    node_class = _registry.get(type_name)
+    if node_class is None:
+        raise TopologyError(f'Unknown node type: {type_name}')
+    return node_class
+
+
+def load_index():
+    """
+    Type index from NODE_INDEX_PATH, read once per container.
+    """
+    if _index['types'] is None:
+        try:
+            with open(NODE_INDEX_PATH) as f:
+                _index['types'] = json.load(f)['types']
+        except (OSError, ValueError, KeyError) as e:
+            print('Node index not available, importing provider modules instead:', str(e))
+            _index['types'] = {}
+    return _index['types']
+
+
+def _resources_root():
+    # Directorio que contiene diagrams/ y resources/ (site-packages), sin importar diagrams
+    if _index['root'] is None:
+        spec = importlib.util.find_spec('diagrams')
+        _index['root'] = os.path.dirname(os.path.dirname(spec.origin)) if spec and spec.origin else ''
+    return _index['root']
+
+
+def check_type(type_name):
+    """
+    Raise TopologyError unless type_name is a known node type.
+    """
+    types = load_index()
+    if isinstance(type_name, str) and type_name in types:
+        return
+    if types:
+        # El índice cubre todos los tipos de la versión fijada en requirements.txt
+        raise TopologyError(f'Unknown node type: {type_name}')
+    resolve_type(type_name)
+
+
+def icon_path(type_name):
+    """
+    Absolute icon path of an indexed type, or None if its class has to be imported.
+    """
+    if type_name not in _icons:
+        entry = load_index().get(type_name)
+        path = os.path.join(_resources_root(), entry[1]) if entry else None
+        # Índice de otra versión de diagrams: si el icono no existe se usa la clase
+        _icons[type_name] = path if path and os.path.exists(path) else None
+    return _icons[type_name]
+
+
+def _make_node(node_class, node_type, label, nodeid):
+    icon = icon_path(node_type)
+    if icon is None:
+        return resolve_type(node_type)(label, nodeid=nodeid)
+    # Mismos atributos que pone una clase de proveedor con icono (diagrams.Node)
+    height = node_class._height + 0.4 * label.count('\n')
+    return node_class(label, nodeid=nodeid, shape='none', height=str(height), image=icon)
+
+
+def _flow_depth(source):
+    """
+    Deepest [ / { nesting of a YAML source (brackets inside quotes count too: it is only a bound).
+    """
+    if isinstance(source, bytes):
+        source = source.decode('utf-8', 'replace')
+    depth = deepest = 0
+    for char in _NOT_BRACKET_RE.sub('', source):
+        depth = depth + 1 if char in '[{' else max(depth - 1, 0)
+        deepest = max(deepest, depth)
+    return deepest
+
+
+def _load_yaml(source):
+    import yaml
+    # libyaml compone recursivamente en C: miles de [[[...]]] revientan la pila del proceso
+    if _flow_depth(source) > YAML_MAX_FLOW_DEPTH:
+        raise TopologyError(f'Invalid YAML: nested deeper than {YAML_MAX_FLOW_DEPTH} levels')
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        return yaml.load(source, Loader=loader)
+    except yaml.YAMLError as e:
+        raise TopologyError(f'Invalid YAML: {e}')
+    except RecursionError:
+        raise TopologyError('Invalid YAML: too deeply nested')
+
+
+class _Compiler:
+
+    def __init__(self):
+        self.nodes = []       # (label, type, cluster)
+        self.clusters = []    # (label, parent cluster)
+        self.containers = []  # lista de miembros directos: ('node', i) | ('container', i)
+        self.index = {}       # ruta con puntos -> ('node', i) | ('container', i)
+        self.pending = []     # (ruta origen, relates)
+        self._members = {}
+
+    def walk(self, resources, prefix, cluster, container, depth=0):
+        if not isinstance(resources, list):
+            raise TopologyError(f'"of" must be a list under {prefix.rstrip(".") or "diagram"}')
+        if depth > TOPOLOGY_MAX_DEPTH:
+            raise TopologyError(f'Too deeply nested under {prefix.rstrip(".")} (max {TOPOLOGY_MAX_DEPTH} levels)')
+        for resource in resources:
+            if not isinstance(resource, dict):
+                raise TopologyError(f'Invalid resource under {prefix.rstrip(".") or "diagram"}')
+            resource_id = resource.get('id')
+            resource_type = resource.get('type')
+            if not resource_id or not resource_type:
+                raise TopologyError(f'Resource without id or type under {prefix.rstrip(".") or "diagram"}')
+            if not _scalar(resource_id) or not isinstance(resource_type, str):
+                raise TopologyError(f'id and type must be text under {prefix.rstrip(".") or "diagram"}')
+            if resource.get('name') is not None and not _scalar(resource['name']):
+                raise TopologyError(f'name must be text in {prefix}{resource_id}')
+            path = f'{prefix}{resource_id}'
+            if path in self.index:
+                raise TopologyError(f'Duplicate resource id: {path}')
+            if len(self.index) >= TOPOLOGY_MAX_RESOURCES:
+                raise TopologyError(f'Too many resources (max {TOPOLOGY_MAX_RESOURCES})')
+            label = str(resource.get('name') or resource_id)
+
+            if resource_type in CONTAINER_TYPES:
+                entry = ('container', len(self.containers))
+                self.containers.append([])
+                child_cluster = cluster
+                if resource_type == 'cluster':
+                    child_cluster = len(self.clusters)
+                    self.clusters.append((label, cluster))
+                self.index[path] = entry
+                self.walk(resource.get('of') or [], f'{path}.', child_cluster, entry[1], depth + 1)
+            else:
+                check_type(resource_type)
+                entry = ('node', len(self.nodes))
+                self.nodes.append((label, resource_type, cluster))
+                self.index[path] = entry
+
+            if container is not None:
+                self.containers[container].append(entry)
+            if resource.get('relates'):
+                self.pending.append((path, resource['relates']))
+
+    def members(self, entry):
+        """
+        Node indexes behind a reference (a group or cluster expands to all its nodes).
+        """
+        kind, i = entry
+        if kind == 'node':
+            return (i,)
+        if i not in self._members:
+            nodes = []
+            for child in self.containers[i]:
+                nodes.extend(self.members(child))
+            self._members[i] = tuple(nodes)
+        return self._members[i]
+
+    def edges(self):
+        edges = []
+        for path, relates in self.pending:
+            if not isinstance(relates, list):
+                raise TopologyError(f'"relates" must be a list in {path}')
+            sources = self.members(self.index[path])
+            for relation in relates:
+                target = relation.get('to') if isinstance(relation, dict) else None
+                if not _scalar(target) or str(target) not in self.index:
+                    raise TopologyError(f'Unknown reference {target!r} in {path}')
+                target = str(target)
+                direction = relation.get('direction', 'outgoing')
+                if not isinstance(direction, str) or direction not in DIRECTIONS:
+                    raise TopologyError(f'Invalid direction {direction!r} in {path}')
+                forward, reverse = DIRECTIONS[direction]
+                attrs = {key: str(relation[key]) for key in ('label', 'color', 'style') if relation.get(key)}
+                targets = self.members(self.index[target])
+                edges.append((sources, targets, forward, reverse, attrs))
+        return edges
+
+
+def compile_topology(source, default_name=''):
+    """
+    Compile a YAML topology (str or bytes) into
+    {'name', 'direction', 'nodes', 'clusters', 'edges'} for emit().
+    """
+    document = _load_yaml(source)
+    diagram = document.get('diagram') if isinstance(document, dict) else None
+    if not isinstance(diagram, dict):
+        raise TopologyError('Missing "diagram" section')
+
+    direction = str(diagram.get('direction', 'LR')).upper()
+    if direction not in GRAPH_DIRECTIONS:
+        raise TopologyError(f'Invalid diagram direction: {direction}')
+
+    compiler = _Compiler()
+    compiler.walk(diagram.get('resources') or [], '', None, None)
+    return {
+        'name': str(diagram.get('name') or default_name),
+        'direction': direction,
+        'nodes': compiler.nodes,
+        'clusters': compiler.clusters,
+        'edges': compiler.edges(),
+    }
+
+
+def emit(topology, filename, outformat='png'):
+    """
+    Draw a compiled topology with diagrams; writes filename + '.' + outformat.
+    """
+    from diagrams import Cluster, Diagram, Edge, Node
+
+    nodes_by_cluster = {}
+    for i, (_, _, cluster) in enumerate(topology['nodes']):
+        nodes_by_cluster.setdefault(cluster, []).append(i)
+    clusters_by_parent = {}
+    for i, (_, parent) in enumerate(topology['clusters']):
+        clusters_by_parent.setdefault(parent, []).append(i)
+
+    created = [None] * len(topology['nodes'])
+
+    def emit_cluster(cluster):
+        for i in nodes_by_cluster.get(cluster, ()):
+            label, node_type, _ = topology['nodes'][i]
+            created[i] = _make_node(Node, node_type, label, f'n{i}')
+        for child in clusters_by_parent.get(cluster, ()):
+            with Cluster(topology['clusters'][child][0]):
+                emit_cluster(child)
+
+    with Diagram(topology['name'], filename=filename, outformat=outformat,
+                 direction=topology['direction'], show=False) as diagram:
+        emit_cluster(None)
+        for sources, targets, forward, reverse, attrs in topology['edges']:
+            # Una sola Edge por relación: diagrams solo lee sus atributos al conectar
+            edge = Edge(forward=forward, reverse=reverse, **attrs)
+            for source in sources:
+                for target in targets:
+                    diagram.connect(created[source], created[target], edge)
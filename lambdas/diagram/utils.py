@@ -1,12 +1,88 @@
-import boto3
+import hashlib
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from session_token import InvalidToken, expires_epoch, is_signed, revocation_key, signing_enabled, verify_token
+from clients import get_client, get_resource
+import metrics
+
+# Cache de validaciones de token (por contenedor caliente)
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', '60'))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.environ.get('TOKEN_CACHE_NEGATIVE_TTL', '0'))
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', '1024'))
+# Consultar la lista de revocación para tokens firmados
+TOKEN_REVOCATION_CHECK = os.environ.get('TOKEN_REVOCATION_CHECK', '1') == '1'
+
+# (token, tenant_id) -> (auth context dict | False, deadline)
+_token_cache = OrderedDict()
+_token_cache_stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'evictions': 0}
+# Varios hilos comparten la caché en el modo servidor (lambdas/server)
+_token_cache_lock = threading.Lock()
+
+
+def token_cache_stats():
+    """
+    Return hit/miss counters of the token validation cache.
+    """
+    with _token_cache_lock:
+        stats = dict(_token_cache_stats)
+        stats['size'] = len(_token_cache)
+    return stats
+
+
+def clear_token_cache():
+    with _token_cache_lock:
+        _token_cache.clear()
+        for k in _token_cache_stats:
+            _token_cache_stats[k] = 0
+
+
+def _count(name):
+    with _token_cache_lock:
+        _token_cache_stats[name] += 1
+
+
+def _cache_get(key):
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+
+        context, deadline = entry
+        if time.time() >= deadline:
+            del _token_cache[key]
+            return None
+
+        _token_cache.move_to_end(key)
+        return context
+
+
+def _cache_put(key, context, ttl):
+    if ttl <= 0 or TOKEN_CACHE_MAX_SIZE <= 0:
+        return
+
+    with _token_cache_lock:
+        _token_cache[key] = (context, time.time() + ttl)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+            _token_cache.popitem(last=False)
+            _token_cache_stats['evictions'] += 1
+
+
+def _parse_expires_at(expires):
+    # Epoch (user_validate actual) o cadena ISO (versiones anteriores)
+    return expires_epoch(expires)
+
 
 def payload_token(token, tenant_id):
     if not token or not tenant_id:
         raise Exception('Token inválido o expirado')
 
-    lambda_client = boto3.client('lambda')
+    lambda_client = get_client('lambda')
 
     payload = {
         "token": token,
@@ -27,11 +103,92 @@ def payload_token(token, tenant_id):
     print('Validate Lambda response:', result_payload)
     return result_payload
 
-def validate_token(token, tenant_id):
-    result_payload = payload_token(token, tenant_id)
-    if result_payload.get('statusCode') == 403:
+def verify_signed_token(token, tenant_id):
+    """
+    Validate a signed token locally; DynamoDB is only read for the revocation list.
+    Returns a payload shaped like the user_validate response.
+    """
+    try:
+        claims = verify_token(token, tenant_id)
+    except InvalidToken as e:
+        return {'statusCode': 403, 'body': json.dumps(str(e))}
+
+    if TOKEN_REVOCATION_CHECK:
+        table_auth = get_resource('dynamodb').Table(os.environ['TABLE_AUTH'])
+        response = table_auth.get_item(
+            Key={
+                'token': revocation_key(claims),
+                'tenant_id': tenant_id
+            }
+        )
+        if 'Item' in response:
+            return {'statusCode': 403, 'body': json.dumps('Token revocado')}
+
+    return {
+        'statusCode': 200,
+        'expires_at': int(claims['exp']),
+        'user_id': claims.get('uid')
+    }
+
+def get_auth_context(token, tenant_id):
+    """
+    Validate the token and return {'tenant_id', 'user_id', 'expires_at'} from that single
+    lookup, so handlers do not read d_auth again. Raises Exception if the token is invalid.
+    """
+    key = (token, tenant_id)
+    cached = _cache_get(key)
+    if cached:
+        _count('hits')
+        metrics.set_property('auth_cache', 'hit')
+        return dict(cached)
+    if cached is False:
+        _count('negative_hits')
+        metrics.set_property('auth_cache', 'negative_hit')
         raise Exception('Token inválido o expirado')
 
+    _count('misses')
+    metrics.set_property('auth_cache', 'miss')
+    with metrics.stage('auth'):
+        if is_signed(token) and signing_enabled():
+            result_payload = verify_signed_token(token, tenant_id)
+        else:
+            result_payload = payload_token(token, tenant_id)
+        status = result_payload.get('statusCode') if isinstance(result_payload, dict) else None
+        if status != 200:
+            # Solo un 200 valida: un error de la Lambda de auth ({"errorMessage": ...}), un 400 o
+            # un 500 no dejan pasar la petición. Solo el 403 (token inválido) va a la caché negativa
+            if status == 403:
+                _cache_put(key, False, TOKEN_CACHE_NEGATIVE_TTL)
+            raise Exception('Token inválido o expirado')
+
+        user_id = result_payload.get('user_id')
+        if 'user_id' not in result_payload:
+            # 200 confirmado de un user_validate anterior a user_id en la respuesta: una lectura
+            # más, como antes. Sin fila (logout entre medias) el token ya no vale
+            item = get_resource('dynamodb').Table(os.environ['TABLE_AUTH']).get_item(
+                Key={'token': token, 'tenant_id': tenant_id},
+                ProjectionExpression='user_id'
+            ).get('Item')
+            if not item or not item.get('user_id'):
+                raise Exception('Token inválido o expirado')
+            user_id = item['user_id']
+    context = {
+        'tenant_id': tenant_id,
+        'user_id': user_id,
+        'expires_at': result_payload.get('expires_at')
+    }
+
+    # El TTL nunca debe sobrepasar la expiración del token
+    ttl = TOKEN_CACHE_TTL
+    expires_ts = _parse_expires_at(result_payload.get('expires_at'))
+    if expires_ts is not None:
+        ttl = min(ttl, expires_ts - time.time())
+    _cache_put(key, context, ttl)
+
+    return dict(context)
+
+def validate_token(token, tenant_id):
+    get_auth_context(token, tenant_id)
     return True
 
 def load_body(event):
@@ -41,4 +198,98 @@ def load_body(event):
     if isinstance(event["body"], dict):
         return event['body']
     else:
-        return json.loads(event['body'])
\ No newline at end of file
+        with metrics.stage('parse'):
+            return json.loads(event['body'])
+
+def get_header(event, name, default=None):
+    """
+    Case-insensitive header lookup.
+    """
+    headers = event.get('headers') or {}
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, header_value in headers.items():
+            if key.lower() == lowered:
+                return header_value
+        return default
+    return value
+
+def json_default(value):
+    """
+    json.dumps default for DynamoDB items: Decimal as int or float.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def make_etag(*parts):
+    """
+    Strong ETag built from anything JSON-serialisable (items, S3 ETags, URLs).
+    """
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(event, etag):
+    """
+    True when the request's If-None-Match lists etag (weak comparison, as for GET).
+    """
+    header = get_header(event, 'If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    strip_weak = lambda tag: tag[2:] if tag.startswith('W/') else tag
+    return any(strip_weak(tag.strip()) == strip_weak(etag) for tag in header.split(','))
+
+def not_modified(etag, cache_control):
+    return {
+        'statusCode': 304,
+        'body': '',
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            # Rutas proxy (diagram/download, diagram/request): CORS lo pone la Lambda
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        }
+    }
+
+def record_object(tenant_id, diagram_id, object_key, size_bytes, object_format=None, attributes=None):
+    """
+    Store size and format of the diagram's S3 object on its d_diagrams item,
+    so listings never need an S3 HEAD. `attributes` are extra fields set in the
+    same update. Only existing items are updated: an object without its item
+    (deleted meanwhile, never created) must not leave a partial row with no owner.
+    Returns True if the item was updated; failures are logged, not raised.
+    """
+    if object_format is None:
+        object_format = os.path.splitext(object_key)[1].lstrip('.').lower() or 'bin'
+    values = {
+        ':key': object_key,
+        ':size': int(size_bytes),
+        ':format': object_format,
+        ':now': datetime.now().isoformat()
+    }
+    names = {'#format': 'format'}
+    update = 'SET object_key = :key, size_bytes = :size, #format = :format, updated_at = :now'
+    for i, (name, value) in enumerate((attributes or {}).items()):
+        names[f'#a{i}'] = name
+        values[f':a{i}'] = value
+        update += f', #a{i} = :a{i}'
+    try:
+        with metrics.stage('db'):
+            get_resource('dynamodb').Table(os.environ['TABLE_DIAGRAM']).update_item(
+                Key={'tenant_id': tenant_id, 'diagram_id': diagram_id},
+                UpdateExpression=update,
+                ConditionExpression='attribute_exists(diagram_id)',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+    except Exception as e:
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            print('No diagram item to record object metadata on:', tenant_id, diagram_id)
+        else:
+            print('Could not record object metadata:', tenant_id, diagram_id, str(e))
+        return False
+    return True
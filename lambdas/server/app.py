@@ -0,0 +1,231 @@
+"""
+Long-running server mode: the routes of lambdas/diagram and lambdas/user on one ASGI app,
+for steady traffic where paying per-invocation Lambda overhead makes no sense.
+
+    pip install -r lambdas/server/requirements.txt
+    uvicorn app:app --app-dir lambdas/server --host 0.0.0.0 --port 8000 --timeout-keep-alive 75
+
+Every request becomes the API Gateway proxy event the Lambda would get and runs the unchanged
+lambda_handler (through diagram/router.py) on an executor thread, so the event loop never waits
+on DynamoDB, S3, bcrypt or a render:
+- SERVER_IO_WORKERS threads for the AWS-bound routes, sharing the keep-alive pools of
+  clients.py (AWS_MAX_POOL_CONNECTIONS defaults to the same number).
+- SERVER_CPU_WORKERS threads (one per CPU) for CPU_ROUTES; bcrypt releases the GIL and the
+  renders already run in d2 or render_pool subprocesses, so threads keep every core busy.
+  render_pool starts its workers through a forkserver (RENDER_START_METHOD), never by forking
+  this multi-threaded process.
+Token checks call user_validate in process instead of invoking the auth Lambda.
+Environment variables are the same as in the serverless.yml files.
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+LAMBDAS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# diagram primero: session_token, clients y metrics de lambdas/user son copias idénticas
+sys.path[:0] = [os.path.join(LAMBDAS_DIR, 'diagram'), os.path.join(LAMBDAS_DIR, 'user')]
+
+IO_WORKERS = int(os.environ.get('SERVER_IO_WORKERS', '64'))
+CPU_WORKERS = int(os.environ.get('SERVER_CPU_WORKERS', '0')) or os.cpu_count() or 1
+# Límite de API Gateway
+MAX_BODY_BYTES = int(os.environ.get('SERVER_MAX_BODY_BYTES', str(10 * 1024 * 1024)))
+# Un hilo de IO por conexión del pool de boto3: ninguna petición espera por una conexión libre
+os.environ.setdefault('AWS_MAX_POOL_CONNECTIONS', str(IO_WORKERS))
+# Los workers de render_pool no pueden salir de un fork de este proceso, que tiene hilos
+os.environ.setdefault('RENDER_START_METHOD', 'forkserver')
+
+import clients  # noqa: E402
+import router  # noqa: E402
+
+ROUTES = dict(router.ROUTES)
+ROUTES.update({
+    ('POST', 'user/login'): 'user_login',
+    ('POST', 'user/logout'): 'user_logout',
+    ('POST', 'user/register'): 'user_register',
+    ('POST', 'user/register/bulk'): 'user_register_bulk',
+    ('POST', 'user/validate'): 'user_validate',
+})
+PATHS = sorted({path for _, path in ROUTES}, key=len, reverse=True)
+CPU_ROUTES = {
+    'diagram_generate', 'diagram_generate_d2', 'diagram_generate_d2_batch',
+    'user_login', 'user_register', 'user_register_bulk',
+}
+
+_executors = {}
+
+
+class Context:
+    """
+    The parts of the Lambda context object the handlers (and metrics.instrument) read.
+    """
+
+    def __init__(self):
+        self.aws_request_id = str(uuid.uuid4())
+        self.function_name = 'server'
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+
+class LocalLambda:
+    """
+    Lambda client for clients.py: the auth check (utils.payload_token) runs user_validate here.
+    """
+
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse'):
+        result = router.get_handler('user_validate')(json.loads(Payload), Context())
+        return {'StatusCode': 200, 'Payload': _Body(json.dumps(result).encode('utf-8'))}
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def dispatch(module_name, event):
+    # En el hilo del executor: el primer import de una ruta (diagrams, requests) tampoco bloquea el bucle
+    return router.get_handler(module_name)(event, Context())
+
+
+def executor(module_name):
+    return _executors['cpu' if module_name in CPU_ROUTES else 'io']
+
+
+def start():
+    _executors['io'] = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+    _executors['cpu'] = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix='cpu')
+    clients.set_client('lambda', LocalLambda())
+
+
+def stop():
+    for pool in _executors.values():
+        pool.shutdown(wait=True)
+    _executors.clear()
+    if 'render_pool' in sys.modules:
+        sys.modules['render_pool'].shutdown()
+
+
+def to_event(scope, body):
+    """
+    API Gateway REST proxy event for an ASGI HTTP request.
+    """
+    headers = {}
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        # Cabeceras repetidas: unidas con coma, como hace API Gateway en headers
+        headers[name] = f'{headers[name]}, {value.decode("latin-1")}' if name in headers else value.decode('latin-1')
+    query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+
+    is_text = headers.get('content-type', '').startswith(('application/json', 'text/')) or not body
+    if is_text:
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            is_text = False
+    return {
+        'httpMethod': scope['method'],
+        'path': scope['path'],
+        'resource': scope['path'],
+        'headers': headers,
+        'queryStringParameters': query or None,
+        'body': text if is_text else base64.b64encode(body).decode('ascii'),
+        'isBase64Encoded': not is_text,
+        'requestContext': {'stage': 'server', 'httpMethod': scope['method'], 'path': scope['path']},
+    }
+
+
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError(f'Request body too large. Maximum is {MAX_BODY_BYTES} bytes.')
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def send_response(send, response):
+    status = response.get('statusCode', 200) if isinstance(response, dict) else 200
+    headers = dict(response.get('headers') or {}) if isinstance(response, dict) else {}
+    body = response.get('body', '') if isinstance(response, dict) else response
+    if isinstance(body, str):
+        body = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+    elif not isinstance(body, bytes):
+        body = json.dumps(body, default=str).encode('utf-8')
+        headers.setdefault('Content-Type', 'application/json')
+    headers['Content-Length'] = str(len(body))
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def error(status, message, headers=None):
+    return {'statusCode': status, 'body': {'error': message}, 'headers': dict(headers or {})}
+
+
+async def handle_http(scope, receive, send):
+    method = scope['method'].upper()
+    if scope['path'].rstrip('/') == '/health':
+        return await send_response(send, {'statusCode': 200, 'body': {'status': 'ok'}})
+
+    known = router.match_path(scope['path'], PATHS)
+    if known is None:
+        return await send_response(send, error(404, f'No route for {method} {scope["path"]}.'))
+    if (method, known) not in ROUTES:
+        allowed = ', '.join(m for m, p in ROUTES if p == known)
+        return await send_response(send, error(405, f'Method {method} not allowed on {known}.', {'Allow': allowed}))
+
+    try:
+        body = await read_body(receive)
+    except ValueError as e:
+        return await send_response(send, error(413, str(e)))
+    if body is None:
+        return
+
+    module_name = ROUTES[(method, known)]
+    event = router.normalize(to_event(scope, body), True)
+    loop = asyncio.get_running_loop()
+    try:
+        response = await loop.run_in_executor(executor(module_name), dispatch, module_name, event)
+    except Exception as e:
+        # En Lambda sería un 502 de API Gateway; aquí la traza va al log del servidor
+        print('Unhandled error in', module_name, str(e))
+        traceback.print_exc()
+        response = error(500, 'Internal server error.')
+    await send_response(send, router.proxy_response(response))
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, stop)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    elif scope['type'] == 'http':
+        if not _executors:
+            # Servidor sin eventos lifespan
+            start()
+        await handle_http(scope, receive, send)
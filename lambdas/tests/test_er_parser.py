@@ -0,0 +1,90 @@
+"""
+ER DSL / DDL parser of lambdas/diagram-sql (er_parser.py).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram-sql'))
+
+from er_parser import ParseError, parse_schema  # noqa: E402
+
+USER_DSL = '''user: {
+  shape: sql_table
+  id: int {constraint: primary_key}
+  a_id: int {constraint: foreign_key}
+}
+'''
+
+
+def names(schema):
+    return [entity['name'] for entity in schema.entities]
+
+
+def test_dsl_entities_fields_and_relations():
+    schema = parse_schema(USER_DSL + 'a: {\n  id: int {constraint: primary_key}\n}\nuser.a_id -> a.id\n')
+    assert names(schema) == ['user', 'a']
+    assert schema.entity_index['user']['shape'] == 'sql_table'
+    assert schema.field_index[('user', 'id')]['constraint'] == 'primary_key'
+    assert schema.relations == [{'left_entity': 'user', 'left_field': 'a_id', 'right_entity': 'a', 'right_field': 'id'}]
+
+
+def test_ddl_tables_and_foreign_keys():
+    schema = parse_schema('''
+        CREATE TABLE IF NOT EXISTS public.a (id SERIAL PRIMARY KEY, name varchar(20) NOT NULL);
+        CREATE TABLE b (
+          id int,
+          a_id int REFERENCES a,
+          PRIMARY KEY (id)
+        ) ENGINE=InnoDB;
+        INSERT INTO b VALUES (1, 1);
+    ''')
+    assert names(schema) == ['a', 'b']
+    assert schema.field_index[('a', 'name')]['type'] == 'varchar(20)'
+    assert schema.field_index[('b', 'id')]['constraint'] == 'primary_key'
+    assert schema.relations == [{'left_entity': 'b', 'left_field': 'a_id', 'right_entity': 'a', 'right_field': 'id'}]
+
+
+@pytest.mark.parametrize('keyword', [
+    'comment', 'set', 'use', 'start', 'begin', 'select', 'insert', 'drop', 'grant', 'commit', 'create', 'alter'
+])
+def test_entity_named_after_sql_keyword(keyword):
+    schema = parse_schema(f'{keyword}: {{\n  id: int\n}}\n' + USER_DSL)
+    assert names(schema) == [keyword, 'user']
+
+
+def test_dsl_after_ddl():
+    schema = parse_schema('CREATE TABLE a (id int PRIMARY KEY);\n' + USER_DSL + 'user.a_id -> a.id\n')
+    assert names(schema) == ['a', 'user']
+    assert len(schema.relations) == 1
+
+
+def test_dsl_after_ddl_without_semicolon():
+    schema = parse_schema('CREATE TABLE a (id int PRIMARY KEY)\n' + USER_DSL)
+    assert names(schema) == ['a', 'user']
+
+
+def test_ddl_after_dsl():
+    schema = parse_schema(USER_DSL + 'CREATE TABLE a (id int PRIMARY KEY);\nALTER TABLE a ADD CONSTRAINT x UNIQUE (id);')
+    assert names(schema) == ['user', 'a']
+
+
+def test_quoted_identifiers():
+    schema = parse_schema('CREATE TABLE "order items" ("the id" int PRIMARY KEY, `a&b` text);')
+    assert names(schema) == ['order items']
+    assert [f['name'] for f in schema.entities[0]['fields']] == ['the id', 'a&b']
+
+
+@pytest.mark.parametrize('text, message', [
+    ('a: {\n  id: int\n', 'Unclosed entity a'),
+    ('a: {\n  id: int\n}\na: {\n  id: int\n}', 'Duplicate entity a'),
+    ('a: {\n  id: int\n}\na.id -> b.id', 'unknown entity b'),
+    ('CREATE TABLE a (id int PRIMARY KEY, b_id int REFERENCES b);', 'unknown entity b'),
+    ('42', 'Expected entity, relation or CREATE TABLE'),
+])
+def test_errors_report_position(text, message):
+    with pytest.raises(ParseError) as info:
+        parse_schema(text)
+    assert message in str(info.value)
+    assert info.value.line >= 1 and info.value.column >= 1
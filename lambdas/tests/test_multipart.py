@@ -0,0 +1,93 @@
+"""
+multipart/form-data parser of lambdas/diagram (multipart.py), which replaced cgi.FieldStorage.
+"""
+import base64
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+
+from multipart import MultipartError, RequestBody, parse_form  # noqa: E402
+
+CONTENT_TYPE = 'multipart/form-data; boundary="XyZ"'
+
+
+def form_body(*parts):
+    body = b''
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else '')
+        body += f'--XyZ\r\nContent-Disposition: {disposition}\r\n'.encode()
+        if filename:
+            body += b'Content-Type: application/octet-stream\r\n'
+        body += b'\r\n' + data + b'\r\n'
+    return body + b'--XyZ--\r\n'
+
+
+BODY = form_body(
+    ('tenant_id', None, 't1'.encode()),
+    ('file', 'red.yml', b'diagram:\r\n  name: \xc3\xb1\r\n\x00\xff'),
+    ('tenant_id', None, b'ignored'),
+)
+
+
+def test_parse_form_fields_and_file():
+    form = parse_form(BODY, CONTENT_TYPE)
+    assert form.getvalue('tenant_id') == 't1'
+    assert form.getvalue('missing', 'x') == 'x'
+    part = form['file']
+    assert part.filename == 'red.yml'
+    assert part.content_type == 'application/octet-stream'
+    assert bytes(part.data) == b'diagram:\r\n  name: \xc3\xb1\r\n\x00\xff'
+    assert isinstance(part.data, memoryview)
+    with part.open() as f:
+        assert f.read(8) == b'diagram:'
+        f.seek(-2, os.SEEK_END)
+        assert f.read() == b'\x00\xff'
+
+
+@pytest.mark.parametrize('spill_threshold', [None, 0])
+def test_base64_body_with_line_breaks(spill_threshold):
+    encoded = base64.encodebytes(BODY).decode()
+    assert '\n' in encoded
+    with RequestBody({'body': encoded, 'isBase64Encoded': True}, spill_threshold=spill_threshold) as body:
+        assert body.spilled == (spill_threshold == 0)
+        assert bytes(body.buffer) == BODY
+        form = parse_form(body, CONTENT_TYPE)
+        assert form.getvalue('tenant_id') == 't1'
+        del form
+
+
+def test_text_body_is_utf8():
+    text = form_body(('name', None, 'diagrama ñ €'.encode())).decode('utf-8')
+    with RequestBody({'body': text, 'isBase64Encoded': False}) as body:
+        assert parse_form(body, CONTENT_TYPE).getvalue('name') == 'diagrama ñ €'
+
+
+def test_empty_body():
+    with RequestBody({'body': None}) as body:
+        assert len(body) == 0
+
+
+def test_invalid_base64():
+    with pytest.raises(MultipartError, match='Invalid request body'):
+        RequestBody({'body': 'abc', 'isBase64Encoded': True})
+
+
+def test_undecodable_field_text():
+    form = parse_form(form_body(('tenant_id', None, b'\xff\xfe')), CONTENT_TYPE)
+    with pytest.raises(MultipartError, match='tenant_id'):
+        form.getvalue('tenant_id')
+
+
+@pytest.mark.parametrize('body, content_type, message', [
+    (BODY, 'application/json', 'must be multipart/form-data'),
+    (BODY, 'multipart/form-data', 'Missing multipart boundary'),
+    (BODY, 'multipart/form-data; boundary=Other', 'boundary not found'),
+    (b'--XyZ\r\nContent-Disposition: form-data; name="a"', CONTENT_TYPE, 'Malformed'),
+    (b'--XyZ\r\nContent-Disposition: form-data; name="a"\r\n\r\nvalue', CONTENT_TYPE, 'Unterminated'),
+])
+def test_malformed_forms(body, content_type, message):
+    with pytest.raises(MultipartError, match=message):
+        parse_form(body, content_type)
@@ -0,0 +1,94 @@
+"""
+Signed session tokens of lambdas/diagram/session_token.py (same module as lambdas/user).
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+
+import session_token  # noqa: E402
+from session_token import InvalidToken, expires_epoch, issue_token, revocation_key, verify_token  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def keys(monkeypatch):
+    monkeypatch.setenv('TOKEN_SIGNING_KEYS', 'k2:second-secret,k1:first-secret')
+
+
+def test_issue_and_verify():
+    token = issue_token('t1', 'u1', time.time() + 60)
+    assert session_token.is_signed(token)
+    assert token.split('.')[1] == 'k2'
+    claims = verify_token(token, 't1')
+    assert claims['tid'] == 't1' and claims['uid'] == 'u1'
+    assert revocation_key(claims) == 'revoked#' + claims['jti']
+
+
+def test_tokens_have_unique_ids():
+    expires_at = time.time() + 60
+    assert issue_token('t1', 'u1', expires_at) != issue_token('t1', 'u1', expires_at)
+
+
+def test_old_key_still_verifies(monkeypatch):
+    monkeypatch.setenv('TOKEN_SIGNING_KEYS', 'k1:first-secret')
+    token = issue_token('t1', 'u1', time.time() + 60)
+    monkeypatch.setenv('TOKEN_SIGNING_KEYS', 'k2:second-secret,k1:first-secret')
+    assert verify_token(token, 't1')['uid'] == 'u1'
+
+
+def test_removed_key_is_rejected(monkeypatch):
+    token = issue_token('t1', 'u1', time.time() + 60)
+    monkeypatch.setenv('TOKEN_SIGNING_KEYS', 'k1:first-secret')
+    with pytest.raises(InvalidToken, match='desconocida'):
+        verify_token(token, 't1')
+
+
+def test_tampered_payload_is_rejected():
+    version, kid, payload, signature = issue_token('t1', 'u1', time.time() + 60).split('.')
+    other = issue_token('t2', 'u1', time.time() + 60).split('.')[2]
+    with pytest.raises(InvalidToken, match='Firma'):
+        verify_token(f'{version}.{kid}.{other}.{signature}')
+
+
+@pytest.mark.parametrize('token', ['v1.k2.!!!.???', 'v1.k2.e30.%%%'])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(InvalidToken):
+        verify_token(token)
+
+
+def test_expired_token_is_rejected():
+    token = issue_token('t1', 'u1', 1000)
+    with pytest.raises(InvalidToken, match='expirado'):
+        verify_token(token, 't1')
+    assert verify_token(token, 't1', now=999)['exp'] == 1000
+
+
+def test_other_tenant_is_rejected():
+    token = issue_token('t1', 'u1', time.time() + 60)
+    with pytest.raises(InvalidToken, match='tenant'):
+        verify_token(token, 't2')
+
+
+def test_unsigned_token_and_missing_keys(monkeypatch):
+    with pytest.raises(InvalidToken, match='no firmado'):
+        verify_token('3f2b9c0e-legacy-uuid-token')
+    monkeypatch.setenv('TOKEN_SIGNING_KEYS', '')
+    assert not session_token.signing_enabled()
+    with pytest.raises(InvalidToken):
+        issue_token('t1', 'u1', time.time() + 60)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (1700000000, 1700000000.0),
+    ('2023-11-14 22:13:20', 1700000000.0),
+    ('2023-11-14T22:13:20', 1700000000.0),
+    ('2023-11-14T23:13:20+01:00', 1700000000.0),
+    ('not a date', None),
+    (None, None),
+    (True, None),
+])
+def test_expires_epoch(value, expected):
+    assert expires_epoch(value) == expected
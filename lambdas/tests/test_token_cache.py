@@ -0,0 +1,83 @@
+"""
+Concurrency of the auth token cache in lambdas/diagram/utils.py: the server mode
+(lambdas/server) calls get_auth_context from many executor threads at once.
+
+    pip install pytest boto3
+    python -m pytest lambdas/tests
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import clients  # noqa: E402
+import utils  # noqa: E402
+
+THREADS = 16
+CALLS = 2000
+
+
+class FakeLambda:
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse'):
+        token = json.loads(json.loads(Payload)['body'])['token']
+        if token.startswith('bad'):
+            result = {'statusCode': 403, 'body': json.dumps('Token inválido o expirado')}
+        else:
+            result = {'statusCode': 200, 'expires_at': int(time.time()) + 3600, 'user_id': f'u-{token}'}
+        return {'StatusCode': 200, 'Payload': FakeBody(json.dumps(result).encode('utf-8'))}
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def hammer(worker, errors, denied):
+    for i in range(CALLS):
+        # Pocas claves para un caché pequeño: aciertos, expiraciones y desalojos a la vez
+        token = f'{"bad" if i % 7 == 0 else "tok"}{(worker + i) % 24}'
+        try:
+            context = utils.get_auth_context(token, 'tenant')
+            assert context['user_id'] == f'u-{token}'
+        except AssertionError as e:
+            errors.append(e)
+        except Exception as e:
+            if not token.startswith('bad'):
+                errors.append(e)
+            denied.append(token)
+
+
+def test_token_cache_concurrent_access(monkeypatch):
+    clients.set_client('lambda', FakeLambda())
+    monkeypatch.setattr(utils, 'TOKEN_CACHE_MAX_SIZE', 8)
+    monkeypatch.setattr(utils, 'TOKEN_CACHE_TTL', 0.001)
+    monkeypatch.setattr(utils, 'TOKEN_CACHE_NEGATIVE_TTL', 0.001)
+    monkeypatch.setattr(utils, 'signing_enabled', lambda: False)
+    utils.clear_token_cache()
+    # Cambios de hilo muy frecuentes para que las carreras aparezcan en pocas llamadas
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    errors, denied = [], []
+    threads = [threading.Thread(target=hammer, args=(n, errors, denied)) for n in range(THREADS)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    stats = utils.token_cache_stats()
+    # Ningún contador perdido: cada llamada es exactamente un acierto, acierto negativo o fallo
+    assert stats['hits'] + stats['negative_hits'] + stats['misses'] == THREADS * CALLS
+    assert stats['size'] <= 8
+    assert len(denied) == sum(1 for n in range(THREADS) for i in range(CALLS) if i % 7 == 0)
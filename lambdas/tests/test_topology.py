@@ -0,0 +1,122 @@
+"""
+YAML topology compiler of lambdas/diagram (topology.py): validation only, nothing is drawn.
+
+    pip install pytest pyyaml
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'diagram'))
+
+import topology  # noqa: E402
+from topology import TopologyError, compile_topology  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'diagram', 'test.yml')
+
+
+def resources(body):
+    return 'diagram:\n  resources:\n' + body
+
+
+def nested_groups(depth):
+    lines = []
+    for level in range(depth):
+        indent = '  ' * (2 + 2 * level)
+        lines.append(f'{indent}- id: g{level}\n{indent}  type: group\n{indent}  of:\n')
+    lines.append('  ' * (2 + 2 * depth) + '- id: web\n' + '  ' * (2 + 2 * depth) + '  type: aws.compute.EC2\n')
+    return 'diagram:\n  resources:\n' + ''.join(lines)
+
+
+def test_compile_sample():
+    with open(SAMPLE, 'rb') as f:
+        compiled = compile_topology(f.read(), 'fallback')
+    assert compiled['name'] == 'Web Services Architecture on AWS'
+    assert compiled['direction'] == 'LR'
+    labels = [label for label, _, _ in compiled['nodes']]
+    assert 'DNS' in labels and 'GraphQL API №1' in labels
+    assert compiled['edges']
+
+
+def test_groups_expand_to_their_nodes():
+    compiled = compile_topology(resources('''\
+    - id: lb
+      type: aws.network.ELB
+      relates:
+        - to: api
+          direction: bidirectional
+          label: 443
+    - id: api
+      type: cluster
+      name: API
+      of:
+        - id: a
+          type: aws.compute.ECS
+        - id: b
+          type: aws.compute.ECS
+'''), 'red')
+    assert compiled['name'] == 'red'
+    assert compiled['clusters'] == [('API', None)]
+    assert compiled['nodes'] == [('lb', 'aws.network.ELB', None), ('a', 'aws.compute.ECS', 0), ('b', 'aws.compute.ECS', 0)]
+    assert compiled['edges'] == [((0,), (1, 2), True, True, {'label': '443'})]
+
+
+def test_numeric_ids_and_references():
+    compiled = compile_topology(resources('''\
+    - id: 1
+      type: aws.compute.EC2
+      relates:
+        - to: 2
+    - id: 2
+      type: aws.compute.EC2
+'''))
+    assert compiled['edges'] == [((0,), (1,), True, False, {})]
+
+
+@pytest.mark.parametrize('body, message', [
+    ('- id: [a]\n  type: aws.compute.EC2\n', 'id and type must be text'),
+    ('- id: a\n  type: {x: 1}\n', 'id and type must be text'),
+    ('- id: a\n  name: [x]\n  type: aws.compute.EC2\n', 'name must be text'),
+    ('- id: a\n  type: aws.compute.EC2\n- id: a\n  type: aws.compute.EC2\n', 'Duplicate resource id'),
+    ('- id: a\n  type: aws.compute.Nope\n', 'Unknown node type'),
+    ('- id: a\n  type: group\n  of: {b: 1}\n', '"of" must be a list'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates: {to: a}\n', '"relates" must be a list'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates:\n    - to: b\n', 'Unknown reference'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates:\n    - to: [a]\n', 'Unknown reference'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates:\n    - to: {a: 1}\n', 'Unknown reference'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates:\n    - to: a\n      direction: sideways\n', 'Invalid direction'),
+    ('- id: a\n  type: aws.compute.EC2\n  relates:\n    - to: a\n      direction: [outgoing]\n', 'Invalid direction'),
+])
+def test_invalid_resources(body, message):
+    indented = ''.join('    ' + line + '\n' for line in body.splitlines())
+    with pytest.raises(TopologyError, match=message):
+        compile_topology(resources(indented))
+
+
+@pytest.mark.parametrize('source, message', [
+    ('diagram: [', 'Invalid YAML'),
+    ('resources: []', 'Missing "diagram" section'),
+    ('diagram:\n  direction: up\n', 'Invalid diagram direction'),
+])
+def test_invalid_documents(source, message):
+    with pytest.raises(TopologyError, match=message):
+        compile_topology(source)
+
+
+def test_nesting_depth_limit():
+    assert compile_topology(nested_groups(topology.TOPOLOGY_MAX_DEPTH))['nodes'] == [('web', 'aws.compute.EC2', None)]
+    with pytest.raises(TopologyError, match='Too deeply nested'):
+        compile_topology(nested_groups(topology.TOPOLOGY_MAX_DEPTH + 1))
+
+
+def test_flow_depth_limit():
+    with pytest.raises(TopologyError, match='nested deeper than'):
+        compile_topology('diagram: ' + '[' * 100000 + ']' * 100000)
+
+
+def test_resource_limit(monkeypatch):
+    monkeypatch.setattr(topology, 'TOPOLOGY_MAX_RESOURCES', 2)
+    body = ''.join(f'    - id: n{i}\n      type: aws.compute.EC2\n' for i in range(3))
+    with pytest.raises(TopologyError, match='Too many resources'):
+        compile_topology(resources(body))
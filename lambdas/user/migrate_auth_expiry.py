@@ -0,0 +1,123 @@
+"""
+Backfill d_auth rows written before expires_at became a numeric (epoch seconds) TTL attribute.
+
+Rows whose expires_at is still a string are rewritten to the number, or deleted when already
+expired (or unreadable). Strings without an offset ('%Y-%m-%d %H:%M:%S') were written by Lambda,
+whose clock is UTC, so they are read as UTC whatever the timezone of the machine running this. The table is read with a parallel Scan, one thread per segment, and
+written with batch_execute_statement, 25 statements per call. Every statement is conditioned on
+the old value, so a row deleted by a concurrent logout is never brought back:
+
+    python lambdas/user/migrate_auth_expiry.py d_auth_dev [--segments 8] [--dry-run]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from session_token import expires_epoch
+
+BATCH_SIZE = 25
+MAX_RETRIES = 8
+RETRYABLE = ('ThrottlingError', 'ProvisionedThroughputExceeded', 'RequestLimitExceeded', 'InternalServerError')
+
+
+def statement_for(table, item, now):
+    """
+    PartiQL statement that migrates one row, and the counter it belongs to.
+    """
+    token, tenant_id, old = item['token'], item['tenant_id'], item['expires_at']
+    expires = expires_epoch(old['S'])
+    if expires is None or expires <= now:
+        # Ya no es válida: no merece la pena reescribirla
+        return {
+            'Statement': f'DELETE FROM "{table}" WHERE "token"=? AND tenant_id=? AND expires_at=?',
+            'Parameters': [token, tenant_id, old]
+        }, 'deleted'
+    return {
+        'Statement': f'UPDATE "{table}" SET expires_at=? WHERE "token"=? AND tenant_id=? AND expires_at=?',
+        'Parameters': [{'N': str(int(expires))}, token, tenant_id, old]
+    }, 'rewritten'
+
+
+def execute(client, batch, stats):
+    """
+    Run (statement, counter) pairs in one batch_execute_statement, retrying throttled ones.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        response = client.batch_execute_statement(Statements=[statement for statement, _ in batch])
+        retry = []
+        for (statement, counter), result in zip(batch, response['Responses']):
+            code = result.get('Error', {}).get('Code')
+            if code is None:
+                stats[counter] += 1
+            elif code == 'ConditionalCheckFailed':
+                # La fila cambió (logout, nuevo login) desde el Scan
+                stats['changed'] += 1
+            elif code in RETRYABLE:
+                retry.append((statement, counter))
+            else:
+                print('Failed:', code, result['Error'].get('Message'))
+                stats['failed'] += 1
+        if not retry:
+            return
+        batch = retry
+        time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+    stats['failed'] += len(batch)
+
+
+def migrate_segment(table, segment, total_segments, dry_run):
+    client = boto3.client('dynamodb')
+    stats = Counter()
+    now = time.time()
+    pending = []
+    paginator = client.get_paginator('scan')
+    pages = paginator.paginate(
+        TableName=table,
+        Segment=segment,
+        TotalSegments=total_segments,
+        ProjectionExpression='#token, tenant_id, expires_at',
+        FilterExpression='attribute_type(expires_at, :string)',
+        ExpressionAttributeNames={'#token': 'token'},
+        ExpressionAttributeValues={':string': {'S': 'S'}}
+    )
+    for page in pages:
+        stats['scanned'] += page['ScannedCount']
+        for item in page['Items']:
+            statement, counter = statement_for(table, item, now)
+            if dry_run:
+                stats[counter] += 1
+                continue
+            pending.append((statement, counter))
+            if len(pending) == BATCH_SIZE:
+                execute(client, pending, stats)
+                pending = []
+    if pending:
+        execute(client, pending, stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('table')
+    parser.add_argument('--segments', type=int, default=8)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        results = list(pool.map(
+            lambda segment: migrate_segment(args.table, segment, args.segments, args.dry_run),
+            range(args.segments)
+        ))
+    total = sum(results, Counter())
+    print(f'{"dry run: " if args.dry_run else ""}scanned={total["scanned"]} rewritten={total["rewritten"]} '
+          f'deleted={total["deleted"]} changed={total["changed"]} failed={total["failed"]} '
+          f'in {time.perf_counter() - start:.1f}s')
+    return 1 if total['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+
+# Formato: v1.<kid>.<payload>.<firma>
+# Este módulo está duplicado en lambdas/user y lambdas/diagram (mantener iguales)
+TOKEN_VERSION = 'v1'
+REVOKED_PREFIX = 'revoked#'
+
+_keys_cache = {'raw': None, 'keys': []}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def load_keys():
+    """
+    Parse TOKEN_SIGNING_KEYS ("kid1:secret1,kid2:secret2").
+    The first key signs new tokens; every key is accepted when verifying,
+    so keys can be rotated by prepending a new one.
+    """
+    raw = os.environ.get('TOKEN_SIGNING_KEYS', '')
+    if raw != _keys_cache['raw']:
+        keys = []
+        for entry in raw.split(','):
+            kid, sep, secret = entry.strip().partition(':')
+            if sep and kid and secret:
+                keys.append((kid, secret.encode()))
+        _keys_cache['raw'] = raw
+        _keys_cache['keys'] = keys
+    return _keys_cache['keys']
+
+
+def signing_enabled():
+    return bool(load_keys())
+
+
+def is_signed(token):
+    return bool(token) and token.startswith(TOKEN_VERSION + '.') and token.count('.') == 3
+
+
+def _sign(secret, message):
+    return hmac.new(secret, message.encode(), hashlib.sha256).digest()
+
+
+def issue_token(tenant_id, user_id, expires_at):
+    """
+    Build a signed token for tenant_id/user_id expiring at expires_at (epoch seconds).
+    """
+    keys = load_keys()
+    if not keys:
+        raise InvalidToken('No signing keys configured')
+
+    kid, secret = keys[0]
+    claims = {
+        'tid': tenant_id,
+        'uid': user_id,
+        'exp': int(expires_at),
+        'jti': secrets.token_urlsafe(12)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    message = f'{TOKEN_VERSION}.{kid}.{payload}'
+    return f'{message}.{_b64encode(_sign(secret, message))}'
+
+
+def verify_token(token, tenant_id=None, now=None):
+    """
+    Check signature, expiry and tenant of a signed token and return its claims.
+    """
+    if not is_signed(token):
+        raise InvalidToken('Token no firmado')
+
+    version, kid, payload, signature = token.split('.')
+    secret = dict(load_keys()).get(kid)
+    if secret is None:
+        raise InvalidToken('Clave de firma desconocida')
+
+    message = f'{version}.{kid}.{payload}'
+    try:
+        valid = hmac.compare_digest(_sign(secret, message), _b64decode(signature))
+        claims = json.loads(_b64decode(payload)) if valid else None
+    except (ValueError, TypeError):
+        raise InvalidToken('Token mal formado')
+    if not valid:
+        raise InvalidToken('Firma inválida')
+
+    if tenant_id is not None and claims.get('tid') != tenant_id:
+        raise InvalidToken('Token no corresponde al tenant')
+
+    if (now or time.time()) >= claims.get('exp', 0):
+        raise InvalidToken('Token expirado')
+
+    return claims
+
+
+def revocation_key(claims):
+    """
+    Key under which user_logout records a revoked token in the auth table.
+    """
+    return REVOKED_PREFIX + claims['jti']
+
+
+def expires_epoch(value):
+    """
+    Expiry of a d_auth row as epoch seconds. Rows store a number (DynamoDB TTL attribute);
+    rows written before that hold an ISO / '%Y-%m-%d %H:%M:%S' string, in UTC when it has no
+    offset (Lambda's clock). Returns None if the value cannot be read.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            # No la hora local de quien ejecuta (p. ej. la migración en un portátil)
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
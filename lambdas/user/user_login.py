@@ -1,21 +1,31 @@
 from datetime import datetime, timedelta
 
-import boto3
-import bcrypt
 import os
 import json
 import secrets
+from passwords import hash_password, needs_rehash, verify_password
+from session_token import issue_token, signing_enabled
+from clients import get_resource
+import metrics
 
 # Expire time
 expire_time = timedelta(hours=5)
 
-# Hashear contraseña
-def verify_password(password, hashed):
-    return bcrypt.checkpw(password.encode(), hashed.encode())
-
 def generate_token():
     return secrets.token_urlsafe(32)
 
+def rehash_password(table_user, tenant_id, user_id, password, old_hash):
+    try:
+        table_user.update_item(
+            Key={'tenant_id': tenant_id, 'user_id': user_id},
+            UpdateExpression='SET password = :new',
+            # No pisar un cambio de contraseña concurrente
+            ConditionExpression='password = :old',
+            ExpressionAttributeValues={':new': hash_password(password), ':old': old_hash}
+        )
+    except Exception as e:
+        print('Could not rehash password:', tenant_id, user_id, str(e))
+
 def load_body(event):
     if 'body' not in event:
         return event
@@ -25,6 +35,7 @@ def load_body(event):
     else:
         return json.loads(event['body'])
 
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to handle user login.
@@ -44,17 +55,18 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Missing required parameters: user_id, tenant_id, or password.'})
         }
 
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_user = dynamodb.Table(table_user_name)
     table_auth = dynamodb.Table(table_auth_name)
 
     # Retrieve user information
-    response = table_user.get_item(
-        Key={
-            'tenant_id': tenant_id,
-            'user_id': user_id
-        }
-    )
+    with metrics.stage('db'):
+        response = table_user.get_item(
+            Key={
+                'tenant_id': tenant_id,
+                'user_id': user_id
+            }
+        )
     if 'Item' not in response:
         return {
             'statusCode': 404,
@@ -70,16 +82,25 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Wrong password.'})
         }
 
-    # Create an auth token
-    token = generate_token()
-    expiration_time = (datetime.now() + expire_time).isoformat()
+    # Hash con otro coste (BCRYPT_ROUNDS cambió): se actualiza ahora que tenemos la contraseña
+    if needs_rehash(db_password):
+        rehash_password(table_user, tenant_id, user_id, password, db_password)
+
+    # Create an auth token (firmado si hay claves configuradas)
+    expiration = datetime.now() + expire_time
+    expiration_time = expiration.isoformat()
+    if signing_enabled():
+        token = issue_token(tenant_id, user_id, expiration.timestamp())
+    else:
+        token = generate_token()
 
+    # expires_at en segundos epoch: es el atributo TTL de d_auth
     table_auth.put_item(
         Item={
             'token': token,
             'tenant_id': tenant_id,
             'user_id': user_id,
-            'expires_at': expiration_time
+            'expires_at': int(expiration.timestamp())
         }
     )
 
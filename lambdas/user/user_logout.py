@@ -1,6 +1,8 @@
 import json
-import boto3
 import os
+from session_token import REVOKED_PREFIX, InvalidToken, is_signed, revocation_key, verify_token
+from clients import get_resource
+import metrics
 
 def load_body(event):
     if 'body' not in event:
@@ -11,6 +13,7 @@ def load_body(event):
     else:
         return json.loads(event['body'])
 
+@metrics.instrument
 def lambda_handler(event, context):
     table_auth_name = os.environ['TABLE_AUTH']
 
@@ -26,7 +29,7 @@ def lambda_handler(event, context):
     body = load_body(event)
     tenant_id = body.get('tenant_id')
 
-    if not token or not tenant_id:
+    if not token or not tenant_id or token.startswith(REVOKED_PREFIX):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Missing required parameters: token (Authorization header), tenant_id.'}),
@@ -35,7 +38,7 @@ def lambda_handler(event, context):
             }
         }
 
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_auth = dynamodb.Table(table_auth_name)
 
     # Buscar si el token existe
@@ -64,6 +67,23 @@ def lambda_handler(event, context):
         }
     )
 
+    # Token firmado → registrar revocación (se valida sin leer la sesión)
+    if is_signed(token):
+        try:
+            claims = verify_token(token, tenant_id)
+        except InvalidToken:
+            claims = None
+        if claims:
+            table_auth.put_item(
+                Item={
+                    'token': revocation_key(claims),
+                    'tenant_id': tenant_id,
+                    'user_id': claims.get('uid'),
+                    # La marca desaparece por TTL cuando el token ya habría expirado
+                    'expires_at': int(claims['exp'])
+                }
+            )
+
     # Token válido → devolver Authorization
     return {
         'statusCode': 200,
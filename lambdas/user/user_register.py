@@ -1,9 +1,10 @@
 from datetime import timedelta
 
-import boto3
-import bcrypt
 import os
 import json
+from passwords import hash_password
+from clients import get_resource
+import metrics
 
 # Expire time
 expire_time = timedelta(hours=5)
@@ -17,9 +18,7 @@ def load_body(event):
     else:
         return json.loads(event['body'])
 
-def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
+@metrics.instrument
 def lambda_handler(event, context):
     table_auth_name = os.environ['TABLE_AUTH']
     table_user_name = os.environ['TABLE_USER']
@@ -35,17 +34,18 @@ def lambda_handler(event, context):
             'body': 'Missing required parameters: user_id, tenant_id, or password.'
         }
 
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_user = dynamodb.Table(table_user_name)
     table_auth = dynamodb.Table(table_auth_name)
 
     # Check if user already exists
-    response = table_user.get_item(
-        Key={
-            'tenant_id': tenant_id,
-            'user_id': user_id
-        }
-    )
+    with metrics.stage('db'):
+        response = table_user.get_item(
+            Key={
+                'tenant_id': tenant_id,
+                'user_id': user_id
+            }
+        )
     if 'Item' in response:
         return {
             'statusCode': 400,
@@ -0,0 +1,164 @@
+import os
+import json
+import random
+import time
+from passwords import hash_many
+from clients import get_client
+import user_validate
+import metrics
+
+USER_BULK_MAX_ITEMS = int(os.environ.get('USER_BULK_MAX_ITEMS', '200'))
+BATCH_GET_SIZE = 100    # máximo de batch_get_item
+BATCH_WRITE_SIZE = 25   # máximo de batch_write_item
+MAX_RETRIES = 8
+
+
+def load_body(event):
+    if 'body' not in event:
+        return event
+
+    if isinstance(event["body"], dict):
+        return event['body']
+    else:
+        return json.loads(event['body'])
+
+def _backoff(attempt):
+    time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+def existing_users(table_user_name, tenant_id, user_ids):
+    """
+    user_ids (of the given list) that already exist in the tenant, via batch_get_item.
+    """
+    dynamodb = get_client('dynamodb')
+    found = set()
+    for i in range(0, len(user_ids), BATCH_GET_SIZE):
+        pending = {table_user_name: {
+            'Keys': [{'tenant_id': {'S': tenant_id}, 'user_id': {'S': user_id}} for user_id in user_ids[i:i + BATCH_GET_SIZE]],
+            'ProjectionExpression': 'user_id'
+        }}
+        for attempt in range(MAX_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            found.update(item['user_id']['S'] for item in response.get('Responses', {}).get(table_user_name, []))
+            pending = response.get('UnprocessedKeys') or {}
+            if not pending:
+                break
+            _backoff(attempt)
+        else:
+            raise Exception('Could not check existing users (throttled).')
+    return found
+
+def write_users(table_user_name, items):
+    """
+    Put items with batch_write_item, retrying UnprocessedItems.
+    Returns {user_id: error} for the ones that could not be written.
+    """
+    dynamodb = get_client('dynamodb')
+    failed = {}
+    for i in range(0, len(items), BATCH_WRITE_SIZE):
+        pending = {table_user_name: [
+            {'PutRequest': {'Item': {k: {'S': v} for k, v in item.items()}}}
+            for item in items[i:i + BATCH_WRITE_SIZE]
+        ]}
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                response = dynamodb.batch_write_item(RequestItems=pending)
+                pending = response.get('UnprocessedItems') or {}
+                if not pending:
+                    break
+                _backoff(attempt)
+            reason = 'unprocessed after retries'
+        except Exception as e:
+            reason = str(e)
+        for request in pending.get(table_user_name, []):
+            failed[request['PutRequest']['Item']['user_id']['S']] = reason
+    return failed
+
+@metrics.instrument
+def lambda_handler(event, context):
+    """
+    Lambda function to register many users of a tenant in one call.
+    Requires a valid session token of that tenant.
+    """
+    table_user_name = os.environ['TABLE_USER']
+
+    body = load_body(event)
+
+    tenant_id = body.get('tenant_id')
+    users = body.get('users')
+    if not tenant_id or not isinstance(users, list) or not users:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing required parameters: tenant_id, users.'})
+        }
+    if len(users) > USER_BULK_MAX_ITEMS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Too many users. Maximum is {USER_BULK_MAX_ITEMS} per call.'})
+        }
+
+    # Leer token del header
+    headers = event.get('headers') or {}
+    auth_header = headers.get('Authorization') or headers.get('authorization') or ''
+    if not auth_header.startswith('Bearer '):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Missing or invalid Authorization header.'})
+        }
+    validation = user_validate.lambda_handler({'token': auth_header.split(' ')[1], 'tenant_id': tenant_id}, context)
+    if validation.get('statusCode') != 200:
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': 'Invalid or expired token.'})
+        }
+
+    # Validar cada usuario; resultados en el orden de la petición
+    results = []
+    positions = {}
+    candidates = []
+    for entry in users:
+        entry = entry if isinstance(entry, dict) else {}
+        user_id = entry.get('user_id')
+        password = entry.get('password')
+        if not user_id or not isinstance(user_id, str) or not password or not isinstance(password, str):
+            results.append({'user_id': user_id, 'status': 'error', 'error': 'Missing user_id or password.'})
+        elif user_id in positions:
+            results.append({'user_id': user_id, 'status': 'error', 'error': 'Duplicate user_id in request.'})
+        else:
+            positions[user_id] = len(results)
+            results.append({'user_id': user_id, 'status': 'registered'})
+            candidates.append(entry)
+
+    try:
+        existing = existing_users(table_user_name, tenant_id, [entry['user_id'] for entry in candidates])
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+    for user_id in existing:
+        results[positions[user_id]] = {'user_id': user_id, 'status': 'error', 'error': 'User already exists.'}
+    new_users = [entry for entry in candidates if entry['user_id'] not in existing]
+
+    # Hash en paralelo (la parte cara de la petición)
+    start = time.perf_counter()
+    hashes = hash_many([entry['password'] for entry in new_users])
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    items = [
+        {'tenant_id': tenant_id, 'user_id': entry['user_id'], 'password': hashed}
+        for entry, hashed in zip(new_users, hashes)
+    ]
+    for user_id, reason in write_users(table_user_name, items).items():
+        results[positions[user_id]] = {'user_id': user_id, 'status': 'error', 'error': reason}
+
+    registered = sum(1 for r in results if r['status'] == 'registered')
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': f'{registered} of {len(users)} users registered.',
+            'registered': registered,
+            'failed': len(users) - registered,
+            'hash_ms': round(hash_ms, 1),
+            'results': results
+        })
+    }
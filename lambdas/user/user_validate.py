@@ -1,7 +1,9 @@
-import boto3
-from datetime import datetime
 import json
 import os
+import time
+from session_token import REVOKED_PREFIX, InvalidToken, expires_epoch, is_signed, revocation_key, signing_enabled, verify_token
+from clients import get_resource
+import metrics
 
 def load_body(event):
     if 'body' not in event:
@@ -12,34 +14,72 @@ def load_body(event):
     else:
         return json.loads(event['body'])
 
+def validate_signed_token(table, token, tenant_id):
+    try:
+        claims = verify_token(token, tenant_id)
+    except InvalidToken as e:
+        print('Invalid signed token:', str(e))
+        return {
+            'statusCode': 403,
+            'body': json.dumps(str(e))
+        }
+
+    response = table.get_item(
+        Key={
+            'token': revocation_key(claims),
+            'tenant_id': tenant_id
+        }
+    )
+    if 'Item' in response:
+        print('Token revoked:', claims['jti'])
+        return {
+            'statusCode': 403,
+            'body': json.dumps('Token revocado')
+        }
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps('Token válido'),
+        'expires_at': int(claims['exp']),
+        'tenant_id': tenant_id,
+        'user_id': claims.get('uid')
+    }
+
+@metrics.instrument
 def lambda_handler(event, context):
     """
     Lambda function to validate token.
     """
 
-    print('Event:', event)
+    metrics.log_event(event)
 
     body = load_body(event)
 
     token = body.get('token')
     tenant_id = body.get('tenant_id')
 
-    if not token or not tenant_id:
+    # Las marcas de revocación comparten tabla, nunca son tokens válidos
+    if not token or not tenant_id or token.startswith(REVOKED_PREFIX):
         return {
             'statusCode': 403,
             'body': json.dumps('Missing token or tenant_id')
         }
 
-    dynamodb = boto3.resource('dynamodb')
+    dynamodb = get_resource('dynamodb')
     table_auth_name = os.environ.get('TABLE_AUTH')
     table = dynamodb.Table(table_auth_name)
 
-    response = table.get_item(
-        Key={
-            'token': token,
-            'tenant_id': tenant_id
-        }
-    )
+    # Token firmado → verificación local, solo se consulta la lista de revocación
+    if is_signed(token) and signing_enabled():
+        return validate_signed_token(table, token, tenant_id)
+
+    with metrics.stage('db'):
+        response = table.get_item(
+            Key={
+                'token': token,
+                'tenant_id': tenant_id
+            }
+        )
 
     if 'Item' not in response:
         print('Token not found:', token)
@@ -59,13 +99,13 @@ def lambda_handler(event, context):
             'body': json.dumps('Token no corresponde al tenant')
         }
 
-    expires = item.get('expires_at')
+    # Epoch numérico (atributo TTL); las filas antiguas guardan una cadena ISO
+    expires = expires_epoch(item.get('expires_at'))
     print('Token expires at:', expires)
 
-    # Current time in same format
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    if now > expires:
+    # TTL de DynamoDB puede tardar en borrar la fila: comprobar siempre
+    now = time.time()
+    if expires is None or now >= expires:
         print('Token expired:', now)
         return {
             'statusCode': 403,
@@ -75,5 +115,10 @@ def lambda_handler(event, context):
     print('Token válido')
     return {
         'statusCode': 200,
-        'body': json.dumps('Token válido')
+        'body': json.dumps('Token válido'),
+        # Permite a los clientes cachear la validación sin pasar la expiración
+        'expires_at': int(expires),
+        # Evita que el cliente vuelva a leer d_auth solo para obtener el usuario
+        'tenant_id': tenant_id,
+        'user_id': item.get('user_id')
     }